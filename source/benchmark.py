@@ -0,0 +1,354 @@
+'''
+読み込み・結合・会計の処理にかかる時間とメモリを測るベンチマークです。
+
+合成したExcelファイル（全商品一覧 'raw' と購入済み商品一覧 '会計録'）を行数ごとに作り、
+処理（ステージ）ごとの時間とメモリの最大使用量を1行1件のJSON（JSON Lines）で出力します。
+GUIは表示せず、Qtの offscreen プラットフォームで動きます。
+
+e.g. python benchmark.py --rows 1000 10000 100000 --output bench.jsonl
+     python benchmark.py --rows 1000000 --stages map_value_to_row refresh_map
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# QApplicationを作る前に指定する
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from columnar_model import ColumnarTableModel
+from excelio import (
+    convert_columns_to_qtmodel, convert_openpyxl_to_qtmodel, read_openpyxl_columns
+)
+from model import ItemCatalog, PurchasedItemModelWrapper
+from openpyxl import Workbook, load_workbook
+from PyQt5.QtCore import PYQT_VERSION_STR, QT_VERSION_STR, Qt
+from PyQt5.QtGui import QStandardItemModel
+from PyQt5.QtWidgets import QApplication
+from relation_proxy_model import RelationProxyModel, map_value_to_row
+
+try:
+    import resource
+except ImportError:
+    # Windowsにはresourceモジュールがない
+    resource = None
+
+ITEM_SHEET = 'raw'
+SALE_SHEET = '会計録'
+
+class Dataset:
+
+    '''
+    ベンチマークに使う合成データと、それを書き込んだExcelファイルです。
+
+    Parameters:
+    directory -- str型 Excelファイルを作るディレクトリ
+    number_of_rows -- int型 全商品一覧と購入済み商品一覧の行数
+    duplicate_rate -- float型 全商品一覧で、商品番号がほかの行と重複する行の割合
+    miss_rate -- float型 購入済み商品一覧で、商品番号が全商品一覧にない行の割合
+    seed -- int型 乱数の種
+    '''
+
+    def __init__(self, directory, number_of_rows, duplicate_rate, miss_rate, seed):
+        self.number_of_rows = number_of_rows
+        self.duplicate_rate = duplicate_rate
+        self.miss_rate = miss_rate
+
+        random_generator = random.Random(seed)
+        self.item_rows = generate_item_rows(number_of_rows, duplicate_rate, random_generator)
+        self.item_ids = [item_id for item_id, name, price in self.item_rows]
+        self.sale_rows = generate_sale_rows(
+            number_of_rows, self.item_ids, miss_rate, random_generator
+        )
+
+        self.file_name = os.path.join(directory, 'bench_{}.xlsx'.format(number_of_rows))
+        write_workbook(self.file_name, self.item_rows, self.sale_rows)
+
+        # {シート名: read_openpyxl_columns()の戻り値} からなる辞書
+        self.sheet_columns = {}
+
+    def read_sheet(self, name, model_type=QStandardItemModel):
+        '''
+        シートを読み取り専用モードで開き、Managerと同じ列の型でQtのモデルに変換します。
+        '''
+        column_types = {0: str, 1: str} if name == SALE_SHEET else {0: str}
+        px_workbook = load_workbook(self.file_name, read_only=True)
+        try:
+            return convert_openpyxl_to_qtmodel(
+                px_workbook[name], model_type=model_type, column_types=column_types
+            )
+        finally:
+            px_workbook.close()
+
+    def build_model(self, name, model_type=QStandardItemModel):
+        '''
+        read_sheet()と同じモデルを作ります。シートは最初の1回だけ読み込み、以後は読み込んだ値から作ります。
+
+        読み込みを測らないステージの準備に使います。
+        '''
+        if name not in self.sheet_columns:
+            column_types = {0: str, 1: str} if name == SALE_SHEET else {0: str}
+            px_workbook = load_workbook(self.file_name, read_only=True)
+            try:
+                self.sheet_columns[name] = read_openpyxl_columns(
+                    px_workbook[name], column_types=column_types
+                )
+            finally:
+                px_workbook.close()
+
+        header_strings, columns, number_of_rows = self.sheet_columns[name]
+        return convert_columns_to_qtmodel(
+            header_strings, [list(values) for values in columns], number_of_rows,
+            model_type=model_type
+        )
+
+def generate_item_rows(number_of_rows, duplicate_rate, random_generator):
+    '''
+    全商品一覧の (商品番号, 商品名, 値段) の行を作ります。
+
+    duplicate_rateの割合の行は、それより前の行の商品番号を使います。
+    '''
+    rows = []
+    for row in range(number_of_rows):
+        if rows and random_generator.random() < duplicate_rate:
+            item_id = rows[random_generator.randrange(len(rows))][0]
+        else:
+            item_id = str(10000 + row)
+        rows.append((item_id, '商品{}'.format(row), random_generator.randrange(10, 1000) * 10))
+    return rows
+
+def generate_sale_rows(number_of_rows, item_ids, miss_rate, random_generator):
+    '''
+    購入済み商品一覧の (顧客番号, 商品番号) の行を作ります。
+
+    miss_rateの割合の行は、全商品一覧にない商品番号を使います。
+    '''
+    rows = []
+    for row in range(number_of_rows):
+        if random_generator.random() < miss_rate:
+            item_id = 'X{}'.format(row)
+        else:
+            item_id = item_ids[random_generator.randrange(len(item_ids))]
+        rows.append((str(random_generator.randrange(1, number_of_rows // 10 + 2)), item_id))
+    return rows
+
+def write_workbook(file_name, item_rows, sale_rows):
+    '''
+    全商品一覧と購入済み商品一覧をExcelファイルに書き込みます。
+    '''
+    px_workbook = Workbook(write_only=True)
+    px_worksheet = px_workbook.create_sheet(ITEM_SHEET)
+    px_worksheet.append(['商品番号', '商品名', '初期価格'])
+    for item_id, name, price in item_rows:
+        px_worksheet.append([int(item_id), name, price])
+
+    px_worksheet = px_workbook.create_sheet(SALE_SHEET)
+    px_worksheet.append(['会計番号', '品目', '値段', '運び'])
+    for row in sale_rows:
+        px_worksheet.append(row)
+
+    px_workbook.save(file_name)
+
+# 各ステージは、Datasetを受け取って準備を済ませ、測る処理だけを行う関数を返す。
+# 戻り値の関数は、測った操作の回数を返す
+
+def prepare_convert_openpyxl_to_qtmodel(dataset):
+    return lambda: dataset.read_sheet(ITEM_SHEET).rowCount()
+
+def prepare_convert_openpyxl_to_columnar_model(dataset):
+    return lambda: dataset.read_sheet(ITEM_SHEET, ColumnarTableModel).rowCount()
+
+def prepare_map_value_to_row(dataset):
+    item_model = dataset.build_model(ITEM_SHEET, ColumnarTableModel)
+    return lambda: len(map_value_to_row(item_model, 0))
+
+def prepare_refresh_map(dataset):
+    item_model = dataset.build_model(ITEM_SHEET, ColumnarTableModel)
+    sale_model = dataset.build_model(SALE_SHEET)
+    proxy_model = RelationProxyModel(sale_model, 1, item_model, 0)
+
+    def run():
+        proxy_model.mapper.refresh_map()
+        return proxy_model.rowCount()
+    return run
+
+def prepare_relation_proxy_data(dataset):
+    item_model = dataset.build_model(ITEM_SHEET, ColumnarTableModel)
+    sale_model = dataset.build_model(SALE_SHEET)
+    proxy_model = RelationProxyModel(sale_model, 1, item_model, 0)
+
+    def run():
+        number_of_columns = proxy_model.columnCount()
+        for row in range(proxy_model.rowCount()):
+            for column in range(number_of_columns):
+                proxy_model.data(proxy_model.index(row, column), Qt.DisplayRole)
+        return proxy_model.rowCount() * number_of_columns
+    return run
+
+def prepare_add_item(dataset, number_of_adds=1000):
+    item_model = dataset.build_model(ITEM_SHEET, ColumnarTableModel)
+    sale_model = dataset.build_model(SALE_SHEET)
+    proxy_model = RelationProxyModel(sale_model, 1, item_model, 0)
+    wrapper = PurchasedItemModelWrapper(
+        proxy_model, 0, 1, catalog=ItemCatalog(item_model, 0, 1, 2)
+    )
+    item_ids = dataset.item_ids
+
+    def run():
+        for number in range(number_of_adds):
+            wrapper.add_item(str(number % 100), item_ids[number % len(item_ids)])
+        return number_of_adds
+    return run
+
+STAGES = {
+    'convert_openpyxl_to_qtmodel': prepare_convert_openpyxl_to_qtmodel,
+    'convert_openpyxl_to_columnar_model': prepare_convert_openpyxl_to_columnar_model,
+    'map_value_to_row': prepare_map_value_to_row,
+    'refresh_map': prepare_refresh_map,
+    'relation_proxy_data': prepare_relation_proxy_data,
+    'add_item': prepare_add_item,
+}
+
+def measure(prepare, dataset):
+    '''
+    ステージを2回実行し、1回目で時間を、2回目でPythonのメモリの最大使用量（tracemalloc）を測ります。
+
+    tracemallocは処理を遅くするため、時間を測るときには使いません。
+    QtのC++側で確保されたメモリはtracemallocに含まれないため、プロセスの最大常駐メモリも記録します。
+
+    Return: dict型 測定結果
+    '''
+    run = prepare(dataset)
+    start = time.perf_counter()
+    operations = run()
+    seconds = time.perf_counter() - start
+    del run
+
+    run = prepare(dataset)
+    tracemalloc.start()
+    try:
+        run()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': seconds,
+        'operations': operations,
+        'peak_traced_bytes': peak_bytes,
+        'max_rss_bytes': read_max_rss_bytes()
+    }
+
+def read_max_rss_bytes():
+    '''
+    プロセスの最大常駐メモリのバイト数を返します。測れない場合はNoneを返します。
+    '''
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxではキロバイト、macOSではバイト
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def read_environment():
+    '''
+    結果を版ごとに比べられるよう、実行環境とgitのコミットを返します。
+    '''
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'qt': QT_VERSION_STR,
+        'pyqt': PYQT_VERSION_STR,
+        'platform': platform.platform(),
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds')
+    }
+
+def run_benchmarks(rows_list, stages, duplicate_rate, miss_rate, seed, output):
+    '''
+    行数ごとにデータを作り、各ステージの測定結果をJSON Linesとしてoutputに書き込みます。
+
+    Return: list型 測定結果の辞書のリスト
+    '''
+    environment = read_environment()
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for number_of_rows in rows_list:
+            dataset = Dataset(directory, number_of_rows, duplicate_rate, miss_rate, seed)
+            for stage in stages:
+                result = {
+                    'stage': stage,
+                    'rows': number_of_rows,
+                    'duplicate_rate': duplicate_rate,
+                    'miss_rate': miss_rate,
+                    'seed': seed
+                }
+                result.update(measure(STAGES[stage], dataset))
+                result.update(environment)
+
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+                results.append(result)
+
+    return results
+
+def main(arguments=None):
+    '''
+    コマンドライン引数を読み、ベンチマークを実行します。
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=[1000, 10000, 100000],
+        help='全商品一覧と購入済み商品一覧の行数（複数指定可）'
+    )
+    parser.add_argument(
+        '--stages', nargs='+', choices=sorted(STAGES), default=list(STAGES),
+        help='測るステージ（未指定の場合すべて）'
+    )
+    parser.add_argument(
+        '--duplicate-rate', type=float, default=0.05,
+        help='全商品一覧で商品番号が重複する行の割合'
+    )
+    parser.add_argument(
+        '--miss-rate', type=float, default=0.05,
+        help='購入済み商品一覧で商品番号が全商品一覧にない行の割合'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='乱数の種')
+    parser.add_argument('--output', help='結果を書き込むファイル（未指定の場合は標準出力）')
+    options = parser.parse_args(arguments)
+
+    # GUIと同じくQApplicationがある状態で測る
+    application = QApplication.instance() or QApplication([sys.argv[0]])
+
+    if options.output is None:
+        return run_benchmarks(
+            options.rows, options.stages, options.duplicate_rate, options.miss_rate,
+            options.seed, sys.stdout
+        )
+    with open(options.output, 'w', encoding='utf-8') as output:
+        return run_benchmarks(
+            options.rows, options.stages, options.duplicate_rate, options.miss_rate,
+            options.seed, output
+        )
+
+if __name__ == '__main__':
+    main()
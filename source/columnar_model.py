@@ -0,0 +1,230 @@
+'''
+表データを列ごとに保持するPyQtのモデルのためのモジュールです。
+'''
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+# 型を保ったままの値を取り出すためのロールです。
+# DisplayRoleが文字列を返すのに対し、このロールでは int や str などの値そのものを返します。
+TYPED_VALUE_ROLE = Qt.UserRole
+
+class ColumnarTableModel(QAbstractTableModel):
+
+    '''
+    表の値を列ごとのリストとして保持し、data()が呼ばれたときに初めて応答を作るモデルです。
+
+    QStandardItemModelのようにセルごとにQStandardItemを作らないため、
+    メモリ使用量と読み込み時間は値そのものの量に比例します。
+
+    Parameters:
+    parent -- QObject型 親オブジェクト（未指定の場合None）
+    read_only -- bool型 Trueの場合、ビューやsetData()から値を変更できない（未指定の場合False）
+    '''
+
+    def __init__(self, parent=None, read_only=False):
+        super().__init__(parent)
+        self.read_only = read_only
+        self.header_labels = []
+        self.columns = []
+        self.number_of_rows = 0
+
+    def set_rows(self, header_labels, rows):
+        '''
+        モデルの内容を行単位のデータで置き換えます。
+
+        Parameters:
+        header_labels -- list型 ヘッダの文字列のリスト。ヘッダがない場合はNone
+        rows -- iterable型 各行の値のシーケンスを返すイテラブル。行ごとに長さが違ってもよい
+        '''
+        number_of_columns = len(header_labels) if header_labels is not None else 0
+        columns, number_of_rows = rows_to_columns(rows, number_of_columns)
+        self.set_columns(header_labels, columns, number_of_rows)
+
+    def set_columns(self, header_labels, columns, number_of_rows):
+        '''
+        モデルの内容を列単位のデータで置き換えます。
+
+        Parameters:
+        header_labels -- list型 ヘッダの文字列のリスト。ヘッダがない場合はNone
+        columns -- list型 列ごとの値のリストのリスト。すべての列の長さはnumber_of_rowsと等しいこと
+        number_of_rows -- int型 行数
+        '''
+        self.beginResetModel()
+        self.header_labels = list(header_labels) if header_labels is not None else []
+        self.columns = columns
+        self.number_of_rows = number_of_rows
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        '''
+        行単位のデータをモデルの末尾にまとめて追加します。rowsInserted シグナルは1回だけ放出されます。
+
+        列より長い行の余りは捨てられ、短い行の残りの列はNoneで埋められます。
+
+        Parameters:
+        rows -- list型 各行の値のシーケンスのリスト
+        '''
+        if not rows:
+            return
+
+        first_row = self.number_of_rows
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(rows) - 1)
+        for column_index, column in enumerate(self.columns):
+            column.extend(
+                values[column_index] if column_index < len(values) else None for values in rows
+            )
+        self.number_of_rows += len(rows)
+        self.endInsertRows()
+
+    def set_column(self, column, values):
+        '''
+        column列目の値をまとめて置き換えます。dataChanged シグナルは1回だけ放出されます。
+
+        Parameters:
+        column -- int型 列番号
+        values -- list型 行数と同じ長さの値のリスト。モデルがそのまま保持するため、渡した後は変更しないこと
+        '''
+        self.columns[column] = values
+        if self.number_of_rows:
+            self.dataChanged.emit(
+                self.index(0, column), self.index(self.number_of_rows - 1, column)
+            )
+
+    def setHorizontalHeaderLabels(self, labels):
+        '''
+        ヘッダを設定します。QStandardItemModel.setHorizontalHeaderLabels()と同じように使えます。
+        '''
+        self.header_labels = list(labels)
+        if len(self.header_labels) > len(self.columns):
+            self.beginInsertColumns(QModelIndex(), len(self.columns), len(self.header_labels) - 1)
+            self.columns.extend(
+                [None] * self.number_of_rows
+                for _ in range(len(self.header_labels) - len(self.columns))
+            )
+            self.endInsertColumns()
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(self.header_labels) - 1)
+
+    def rowCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.rowCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return self.number_of_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.columnCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.data()の実装です。
+
+        DisplayRoleでは値を文字列にして返し、EditRoleとTYPED_VALUE_ROLEでは値をそのまま返します。
+        空のセルにはNoneを返します。
+        '''
+        if not index.isValid():
+            return None
+
+        value = self.columns[index.column()][index.row()]
+
+        if role == Qt.DisplayRole:
+            return None if value is None else str(value)
+        if role == Qt.EditRole or role == TYPED_VALUE_ROLE:
+            return value
+        return None
+
+    def column_values(self, column, role=Qt.DisplayRole):
+        '''
+        column列目の値を、data()と同じ形でまとめてリストにして返します。
+
+        data()を行の数だけ呼ぶ代わりに使うと、列全体を一度に取り出せます。
+
+        Parameters:
+        column -- int型 列番号
+        role -- Qt.ItemDataRole型 data()のroleと同じ（未指定の場合Qt.DisplayRole）
+
+        Return: list型
+            e.g. ['Apple', 'Berry']
+        '''
+        # ない列の値は、data()に無効なindexを渡した場合と同じくNoneとする
+        if not 0 <= column < len(self.columns):
+            return [None] * self.number_of_rows
+
+        values = self.columns[column]
+        if role == Qt.DisplayRole:
+            return [None if value is None else str(value) for value in values]
+        if role == Qt.EditRole or role == TYPED_VALUE_ROLE:
+            return list(values)
+        return [None] * self.number_of_rows
+
+    def setData(self, index, value, role=Qt.EditRole):
+        '''
+        QAbstractItemModel.setData()の実装です。
+        '''
+        if self.read_only:
+            return False
+        if not index.isValid() or role not in (Qt.EditRole, Qt.DisplayRole, TYPED_VALUE_ROLE):
+            return False
+
+        self.columns[index.column()][index.row()] = value
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        '''
+        QAbstractItemModel.flags()の実装です。
+        '''
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if self.read_only:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.headerData()の実装です。
+        '''
+        if (orientation == Qt.Horizontal and role == Qt.DisplayRole
+                and section < len(self.header_labels)):
+            return self.header_labels[section]
+        return super().headerData(section, orientation, role)
+
+def rows_to_columns(rows, number_of_columns=0):
+    '''
+    行ごとの値のシーケンスを、列ごとの値のリストに並べ替えます。
+
+    長さの違う行が混ざっている場合、足りない部分はNoneで埋められます。
+
+    Parameters:
+    rows -- iterable型 各行の値のシーケンスを返すイテラブル
+    number_of_columns -- int型 最低限用意する列の数（未指定の場合0）
+
+    Return: (列ごとの値のリストのリスト, 行数) のタプル
+        e.g. rows_to_columns([('Apple', 300), ('Berry',)])
+             -> ([['Apple', 'Berry'], [300, None]], 2)
+    '''
+    columns = [[] for _ in range(number_of_columns)]
+    number_of_rows = 0
+
+    for values in rows:
+        # これまでより長い行が来た場合は、既存の行をNoneで埋めた列を追加する
+        if len(values) > len(columns):
+            columns.extend(
+                [None] * number_of_rows for _ in range(len(values) - len(columns))
+            )
+
+        for column, value in zip(columns, values):
+            column.append(value)
+
+        # 短い行の残りの列はNoneで埋める
+        for column in columns[len(values):]:
+            column.append(None)
+
+        number_of_rows += 1
+
+    return columns, number_of_rows
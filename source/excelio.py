@@ -2,8 +2,18 @@
 Excel シートをPyQtのモデルとして使うためのモジュールです。
 '''
 
-from openpyxl import load_workbook
+import os
+import zipfile
+from columnar_model import TYPED_VALUE_ROLE, ColumnarTableModel, rows_to_columns
+from openpyxl import Workbook, load_workbook
+from PyQt5.QtCore import QCoreApplication, Qt, QTimer
 from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from sheet_cache import SheetCache, read_stat
+from xml.etree import ElementTree
+
+# ワークブックのシートの一覧を格納したxlsxファイル内のパスと、その要素の名前空間
+WORKBOOK_PART_NAME = 'xl/workbook.xml'
+SPREADSHEET_NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
 
 class ExcelIOException(Exception):
     pass
@@ -15,18 +25,74 @@ class ExcelQtConverter:
 
     Parameters:
     file_name -- Excelファイルのファイル名
+    read_only -- bool型 Trueの場合、シートを読み取り専用のストリーミングモードで読み込む
+                 （未指定の場合False）
+    save_interval -- int型 from_model()の後、ファイルに保存するまで待つミリ秒数。
+                     この間の書き戻しはまとめて1回の保存になる（未指定の場合1000）
+    cache_file_name -- str型 読み込んだシートを保存しておくキャッシュファイルのファイル名。
+                       Excelファイルが変わっていなければ、to_model()はシートを読まずにキャッシュを使う。
+                       Noneの場合はキャッシュを使わない（未指定の場合None）
     '''
     # IO は Input/Output の略
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, read_only=False, save_interval=1000, cache_file_name=None):
 
         # 特定のシートの書き込む方法は下記を参照。
         # https://stackoverflow.com/a/20221655
 
         self.file_name = file_name
-        self.px_workbook = load_workbook(file_name)
+        self.read_only = read_only
+        self.save_interval = save_interval
+        self._px_workbook = None
+
+        self.sheet_cache = None
+        if cache_file_name is not None:
+            self.sheet_cache = SheetCache(file_name, cache_file_name)
+
+        # {シート名: ModelChangeTracker} からなる辞書。書き戻しの対象となるモデルの変更を記録する
+        self.trackers = {}
+        self.save_timer = None
+
+        # flush()による保存が終わった後に呼び出される関数のリスト
+        self.save_listeners = []
+
+        # 書き込み用のワークブックを読み込んだときのファイルの (大きさ, 更新日時)。読み込むまではNone
+        self.opened_stat = None
+
+        # 読み取り専用モードでは、書き込みが必要になるまでワークブック全体を読み込まない
+        if not read_only:
+            self._px_workbook = self.load_workbook()
+
+    @property
+    def px_workbook(self):
+        '''
+        書き込み用のワークブックを返します。
+
+        読み取り専用モードの場合は、初めて必要になったときにファイルを別途開きます。
+        ファイルがまだない場合は、シートのない新しいワークブックを作ります。
+        '''
+        if self._px_workbook is None:
+            if os.path.exists(self.file_name):
+                self._px_workbook = self.load_workbook()
+            else:
+                # シートはfrom_model()の書き戻しで作られるため、最初からあるシートは取り除いておく
+                self._px_workbook = Workbook()
+                self._px_workbook.remove(self._px_workbook.active)
+        return self._px_workbook
+
+    def load_workbook(self):
+        '''
+        書き込み用にワークブック全体を読み込みます。
+
+        キャッシュを使う場合は、先にキャッシュがファイルと同じ内容であることを確かめておきます。
+        以後このワークブックを保存したとき、書き込まなかったシートのキャッシュはそのまま使えます（save()）。
+        '''
+        if self.sheet_cache is not None:
+            self.sheet_cache.validate()
+        self.opened_stat = read_stat(self.file_name)
+        return load_workbook(self.file_name)
 
-    def to_model(self, name, model_type=QStandardItemModel, header=True):
+    def to_model(self, name, model_type=QStandardItemModel, header=True, column_types=None):
         '''
         ExcelのシートをQtのモデルに変換します。
 
@@ -34,60 +100,666 @@ class ExcelQtConverter:
         name -- str型 Excelのシート名
         model_type -- type型 変換後に生成されるQtモデルの型を指定
                       （未指定の場合QStandardItemModel）
+                      ColumnarTableModelを指定すると、セルごとのQtのアイテムを作らずに
+                      値を列ごとに保持するモデルになります。
         header -- bool型 Trueの場合エクセルの1行目をヘッダとして扱う
                   （未指定の場合True）
+        column_types -- dict型 {列番号またはヘッダの文字列: 型} からなる辞書。
+                        指定しなかった列の型はセルの値から推定される（未指定の場合None）
         '''
-        return convert_openpyxl_to_qtmodel(
-            self.px_workbook.get_sheet_by_name(name),
-            model_type=model_type,
-            header=True
+        header_strings, columns, number_of_rows = self.read_columns(
+            name, header=header, column_types=column_types
         )
+        qt_model = convert_columns_to_qtmodel(
+            header_strings, columns, number_of_rows, model_type=model_type
+        )
+
+        self.track_model(qt_model, name, header=header)
+
+        return qt_model
+
+    def track_model(self, qt_model, name, header=True, synced=True):
+        '''
+        シートと同じ内容のモデルを登録し、以後の変更だけを記録するようにします。
+
+        to_model()で読み込んだモデルは自動的に登録されます。ほかの方法でシートを読み込んだモデルは、
+        読み込みが終わった後にこのメソッドで登録してください。
+
+        Parameters:
+        qt_model -- QAbstractItemModel型 シートと同じ内容のモデル
+        name -- str型 Excelのシート名
+        header -- bool型 Trueの場合シートの1行目をヘッダとして扱う（未指定の場合True）
+        synced -- bool型 Falseの場合、まだシートに書き込んでいないモデルとして登録し、
+                  次の書き戻しでヘッダを含むすべての行を書き込む（未指定の場合True）
+        '''
+        self.set_tracker(name, ModelChangeTracker(qt_model, header=header, synced=synced))
+
+    def set_tracker(self, name, tracker):
+        '''
+        シートの変更を記録するModelChangeTrackerを登録します。
+
+        そのシートにほかのモデルのModelChangeTrackerが登録されていた場合は、古いモデルのシグナルから切断して破棄します。
+        '''
+        old_tracker = self.trackers.get(name)
+        if old_tracker is not None and old_tracker is not tracker:
+            old_tracker.close()
+        self.trackers[name] = tracker
+
+    def read_columns(self, name, header=True, column_types=None):
+        '''
+        シートを読み込み、型を揃えた列ごとの値のリストにします。
+
+        キャッシュファイルが指定されていて、Excelファイルがキャッシュを作ったときから変わっていなければ、
+        シートは読まずにキャッシュを使います。
+
+        Parameters:
+        name -- str型 Excelのシート名
+        header -- bool型 Trueの場合エクセルの1行目をヘッダとして扱う（未指定の場合True）
+        column_types -- dict型 {列番号またはヘッダの文字列: 型} からなる辞書（未指定の場合None）
+
+        Return: read_openpyxl_columns()と同じ
+        '''
+        def read():
+            return self._read_columns(name, header=header, column_types=column_types)
+
+        if self.sheet_cache is None:
+            return read()
+        return self.sheet_cache.read_columns(name, header, column_types, read)
+
+    def _read_columns(self, name, header=True, column_types=None):
+        '''
+        キャッシュを使わずにシートを読み込みます。
+
+        書き込み用のワークブックを開いていない読み取り専用モードでは、指定されたシートだけを
+        読み取り専用モードで開き、行を順に読みます。ほかのシートやスタイルは読み込まれず、
+        読み終えるとファイルは閉じられます。
+        '''
+        if self._px_workbook is not None:
+            return read_openpyxl_columns(
+                self._px_workbook[name], header=header, column_types=column_types
+            )
+
+        px_workbook = load_workbook(self.file_name, read_only=True)
+        try:
+            return read_openpyxl_columns(
+                px_workbook[name], header=header, column_types=column_types
+            )
+        finally:
+            px_workbook.close()
+
+    def sheet_names(self):
+        '''
+        Excelファイルのシート名のリストを返します。
+
+        書き込み用のワークブックを開いていない場合は、ワークブックを読み込まずにシートの一覧だけを読みます。
+        まだ一度も書き戻していないシートは含まれません。ファイルがない場合は空のリストを返します。
+
+        Return: list型 シート名のリスト
+        '''
+        if self._px_workbook is not None:
+            return list(self._px_workbook.sheetnames)
+        if not os.path.exists(self.file_name):
+            return []
+        return read_sheet_names(self.file_name)
+
+    def read_header(self, name):
+        '''
+        シートの1行目だけを読み込みます。
+
+        Parameters:
+        name -- str型 Excelのシート名
+
+        Return: list型 1行目の値のリスト
+        '''
+        if self._px_workbook is not None:
+            px_workbook = self._px_workbook
+        else:
+            px_workbook = load_workbook(self.file_name, read_only=True)
+        try:
+            for values in px_workbook[name].iter_rows(max_row=1, values_only=True):
+                return list(values)
+            return []
+        finally:
+            if px_workbook is not self._px_workbook:
+                px_workbook.close()
+
+    def from_model(self, qt_model, name, header=True):
+        '''
+        Qtのモデルの内容をExcelのシートに書き戻します。
+
+        前回の書き込み以降に変更・追加された行だけがシートに書き込まれます。
+        ファイルへの保存はsave_intervalミリ秒の間まとめられ、タイマーで1回だけ行われます。
+        to_model()で読み込んでいないモデルの場合、初回はすべての行が書き込まれます。
+
+        Parameters:
+        qt_model -- QAbstractItemModel型 書き戻すモデル
+        name -- str型 Excelのシート名
+        header -- bool型 Trueの場合モデルのヘッダをエクセルの1行目に書き込む
+                  （未指定の場合True）
+        '''
+        tracker = self.trackers.get(name)
+        if tracker is None or tracker.qt_model is not qt_model:
+            self.set_tracker(name, ModelChangeTracker(qt_model, header=header, synced=False))
+
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        '''
+        flush()をタイマーで予約します。すでに予約されている場合は何もしません。
+
+        イベントループがない（QCoreApplicationが存在しない）場合は、その場でflush()します。
+        '''
+        application = QCoreApplication.instance()
+        if application is None:
+            self.flush()
+            return
+
+        if self.save_timer is None:
+            self.save_timer = QTimer()
+            self.save_timer.setSingleShot(True)
+            self.save_timer.setInterval(self.save_interval)
+            # enable()で差し込んだ計測用の関数も呼び出されるよう、呼び出すたびにflushを取り出し直す
+            self.save_timer.timeout.connect(lambda: self.flush())
+            # 終了時に予約済みの書き戻しが失われないようにする
+            application.aboutToQuit.connect(lambda: self.flush())
+
+        if not self.save_timer.isActive():
+            self.save_timer.start()
+
+    def flush(self):
+        '''
+        記録された変更をシートに書き込み、ファイルに保存します。
+
+        Return: int型 書き込んだ行数
+        '''
+        if self.save_timer is not None:
+            self.save_timer.stop()
+
+        number_of_written_rows = 0
+        written_names = []
+        for name, tracker in self.trackers.items():
+            if not tracker.has_changes():
+                continue
+            if name in self.px_workbook.sheetnames:
+                px_worksheet = self.px_workbook[name]
+            else:
+                px_worksheet = self.px_workbook.create_sheet(name)
+            number_of_written_rows += tracker.write_changes(px_worksheet)
+            written_names.append(name)
+
+        if number_of_written_rows:
+            self.save(written_names)
+            for listener in self.save_listeners:
+                listener()
+
+        return number_of_written_rows
+
+    def add_save_listener(self, listener):
+        '''
+        flush()でファイルに保存した後に呼び出される関数を登録します。
+
+        Parameters:
+        listener -- 引数をとらない呼び出し可能オブジェクト
+        '''
+        self.save_listeners.append(listener)
+
+    def save(self, written_names=None):
+        '''
+        ワークブックをファイルに保存します。
+
+        読み取り専用モードで書き込み用のワークブックを一度も開いていない場合、保存するものはありません。
+        キャッシュを使う場合、書き込んだシートのキャッシュだけが捨てられ、ほかのシートのキャッシュは
+        保存後のファイルのものとして残るため、次の起動でも読み直されません。
+
+        Parameters:
+        written_names -- list型 書き込んだシートの名前のリスト。Noneの場合はすべてのシート（未指定の場合None）
+        '''
+        if self._px_workbook is None:
+            return
+        self._px_workbook.save(self.file_name)
+
+        if self.sheet_cache is not None:
+            if written_names is None:
+                written_names = self._px_workbook.sheetnames
+            self.sheet_cache.refresh(written_names)
+
+class ModelChangeTracker:
+
+    '''
+    Qtのモデルのシグナルを監視し、シートに書き戻す必要のある行を記録します。
+
+    Parameters:
+    qt_model -- QAbstractItemModel型 監視するモデル
+    header -- bool型 Trueの場合シートの1行目をヘッダとして扱う
+    synced -- bool型 Trueの場合、現在のモデルの内容はシートに書き込み済みとみなす。
+              Falseの場合、初回の書き込みですべての行を書き込む
+    '''
+
+    def __init__(self, qt_model, header=True, synced=True):
+        self.qt_model = qt_model
+        self.header = header
+        self.dirty_rows = set()
+        self.needs_full_sync = not synced
+
+        # close()で切断できるよう、(シグナル, スロット) の組を覚えておく
+        self.connections = [
+            (self.qt_model.dataChanged, self.on_data_changed),
+            (self.qt_model.rowsInserted, self.on_rows_inserted),
+
+            # 行の削除・移動などが起きた場合は、シート全体を書き直す
+            (self.qt_model.rowsRemoved, self.on_layout_changed),
+            (self.qt_model.rowsMoved, self.on_layout_changed),
+            (self.qt_model.columnsInserted, self.on_layout_changed),
+            (self.qt_model.columnsRemoved, self.on_layout_changed),
+            (self.qt_model.modelReset, self.on_layout_changed),
+            # layoutChangedはQStandardItemModel.setItem()で行を追加しただけでも放出されるため監視しない
+        ]
+        for signal, slot in self.connections:
+            signal.connect(slot)
+
+    def close(self):
+        '''
+        qt_modelのシグナルから切断し、以後は変更を記録しないようにします。
+
+        シートに別のモデルを登録し直すときに、ExcelQtConverterから呼び出されます。
+        '''
+        for signal, slot in self.connections:
+            signal.disconnect(slot)
+        self.connections = []
+
+    def on_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        qt_modelのdataChangedシグナルにconnectされます。
+        '''
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+        self.dirty_rows.update(range(topleft.row(), bottomright.row() + 1))
+
+    def on_rows_inserted(self, parent, first, last):
+        '''
+        qt_modelのrowsInsertedシグナルにconnectされます。
 
-    def from_model(self, qt_model, name):
-        raise ExcelIOException('未実装です')
+        末尾への追加以外は後ろの行がずれるため、シート全体を書き直します。
+        '''
+        if last + 1 < self.qt_model.rowCount():
+            self.needs_full_sync = True
+            return
+        self.dirty_rows.update(range(first, last + 1))
+
+    def on_layout_changed(self, *args):
+        '''
+        行・列の構造が変わるシグナルにconnectされます。
+        '''
+        self.needs_full_sync = True
+
+    def has_changes(self):
+        '''
+        書き戻す必要のある変更があればTrueを返します。
+        '''
+        return self.needs_full_sync or bool(self.dirty_rows)
+
+    def write_changes(self, px_worksheet):
+        '''
+        記録された行をopenpyxlのワークシートに書き込み、記録を消去します。
+
+        Parameters:
+        px_worksheet -- openpyxlのワークシート
+
+        Return: int型 書き込んだ行数
+        '''
+        first_row = 2 if self.header else 1
+        number_of_rows = self.qt_model.rowCount()
+        number_of_columns = self.qt_model.columnCount()
+
+        if self.needs_full_sync:
+            rows = range(number_of_rows)
 
-    def save(self):
-        self.px_workbook.save(self.file_name)
+            if self.header:
+                for column in range(number_of_columns):
+                    px_worksheet.cell(
+                        row=1,
+                        column=column + 1,
+                        value=self.qt_model.headerData(column, Qt.Horizontal)
+                    )
+
+            # モデルより長い部分はシートから削除する
+            surplus = px_worksheet.max_row - (number_of_rows + first_row - 1)
+            if surplus > 0:
+                px_worksheet.delete_rows(number_of_rows + first_row, surplus)
+        else:
+            rows = sorted(row for row in self.dirty_rows if row < number_of_rows)
+
+        for row in rows:
+            for column in range(number_of_columns):
+                px_worksheet.cell(
+                    row=row + first_row,
+                    column=column + 1,
+                    value=get_typed_value(self.qt_model, row, column)
+                )
+
+        self.dirty_rows.clear()
+        self.needs_full_sync = False
+
+        return len(rows)
+
+def read_sheet_names(file_name):
+    '''
+    xlsxファイルのシート名のリストを、ワークブックを読み込まずに返します。
+
+    openpyxlのload_workbook()は読み取り専用モードでも共有文字列などを読み込むため、
+    シートの一覧だけが必要な場合はxlsxファイル内のworkbook.xmlだけを読みます。
+
+    Parameters:
+    file_name -- str型 エクセルファイルのファイル名
+
+    Return: list型 シート名のリスト（ワークブックでの順）
+    '''
+    with zipfile.ZipFile(file_name) as px_archive:
+        root = ElementTree.fromstring(px_archive.read(WORKBOOK_PART_NAME))
+    return [
+        sheet.get('name')
+        for sheet in root.iter('{{{}}}sheet'.format(SPREADSHEET_NAMESPACE))
+    ]
+
+def get_typed_value(qt_model, row, column):
+    '''
+    qt_modelのセルの値を、型を保ったまま取り出します。
 
-def convert_openpyxl_to_qtmodel(px_worksheet, model_type=QStandardItemModel, header=True):
+    TYPED_VALUE_ROLEの値が現在のEditRoleの値と一致する場合はそれを返し、
+    ビューでの編集などで一致しなくなった場合はEditRoleの値を返します。
+    '''
+    index = qt_model.index(row, column)
+    value = qt_model.data(index, Qt.EditRole)
+    typed_value = qt_model.data(index, TYPED_VALUE_ROLE)
+    if typed_value is not None and str(typed_value) == value:
+        return typed_value
+    return value
+
+def convert_openpyxl_to_qtmodel(px_worksheet, model_type=QStandardItemModel, header=True,
+                                column_types=None):
     '''
     openpyxl の worksheet を、Qt のモデルに変換します。
 
+    各列の型は読み込み時に一度だけ推定され、値はその型に揃えられます。
+    型を保った値は TYPED_VALUE_ROLE で取り出せます。空のセルは 'None' という文字列ではなく
+    値のないセルになります。
+
     Parameters:
     name -- str型 Excelのシート名
     model_type -- type型 変換後に生成されるQtモデルの型を指定
                     （未指定の場合QStandardItemModel）
     header -- bool型 Trueの場合エクセルの1行目をヘッダとして扱う
                 （未指定の場合True）
+    column_types -- dict型 {列番号またはヘッダの文字列: 型} からなる辞書。
+                    指定された列は推定の代わりにその型に揃えられる（未指定の場合None）
+    '''
+    header_strings, columns, number_of_rows = read_openpyxl_columns(
+        px_worksheet, header=header, column_types=column_types
+    )
+    return convert_columns_to_qtmodel(
+        header_strings, columns, number_of_rows, model_type=model_type
+    )
+
+def convert_columns_to_qtmodel(header_strings, columns, number_of_rows,
+                               model_type=QStandardItemModel):
+    '''
+    read_openpyxl_columns()で読み込んだ列ごとの値のリストを、Qt のモデルに変換します。
+
+    Parameters:
+    header_strings -- list型 ヘッダの値のリスト。ヘッダがない場合はNone
+    columns -- list型 列ごとの値のリストのリスト
+    number_of_rows -- int型 行数
+    model_type -- type型 変換後に生成されるQtモデルの型を指定
+                    （未指定の場合QStandardItemModel）
     '''
     qt_model = model_type()
 
+    # 列ごとに値を保持するモデルには、Qtのアイテムを作らずに値をそのまま渡す
+    if isinstance(qt_model, ColumnarTableModel):
+        qt_model.set_columns(header_strings, columns, number_of_rows)
+        return qt_model
+
+    qt_model.setRowCount(number_of_rows)
+    qt_model.setColumnCount(len(columns))
+
+    # 取り出した値をqtのモデルのヘッダにする
+    if header_strings is not None:
+        set_header_labels(qt_model, header_strings)
+
+    # すべての値を反復してqtのモデルに格納
+    for column_index, values in enumerate(columns):
+        for row_index, value in enumerate(values):
+            # 空のセルにはアイテムを作らない
+            if value is None:
+                continue
+
+            # 値を qt の model の item に変換し、model に登録
+            # (qt の model の item = エクセルで言うところのセル)
+            qt_model.setItem(row_index, column_index, create_item(value))
+
+    return qt_model
+
+def read_openpyxl_columns(px_worksheet, header=True, column_types=None):
+    '''
+    openpyxl の worksheet を読み込み、型を揃えた列ごとの値のリストにします。
+
+    Parameters:
+    px_worksheet -- openpyxlのワークシート
+    header -- bool型 Trueの場合エクセルの1行目をヘッダとして扱う
+                （未指定の場合True）
+    column_types -- dict型 {列番号またはヘッダの文字列: 型} からなる辞書（未指定の場合None）
+
+    Return: (ヘッダの値のリスト, 列ごとの値のリストのリスト, 行数) のタプル。
+            ヘッダがない場合、ヘッダの値のリストはNone
+    '''
     rows = px_worksheet.rows
+    header_strings = None
 
     # 1行目をheaderとして扱う場合の処理
     if header:
 
         # 1行目のセルたちのタプルを取得
-        header_cells = next(rows)
+        header_cells = next(rows, ())
 
         # セルたちの値を取り出しリストに格納（リスト内包表記を使う）
         header_strings = [header_cell.value for header_cell in header_cells]
 
-        # 取り出した値をqtのモデルのヘッダにする
-        qt_model.setHorizontalHeaderLabels(header_strings)
+    # すべてのセルの値を列ごとのリストに格納
+    columns, number_of_rows = rows_to_columns(
+        ([cell.value for cell in cells] for cells in rows),
+        len(header_strings) if header_strings is not None else 0
+    )
 
-    # すべてのセルを反復して値をqtのモデルに格納
-    for row_index, cells in enumerate(rows):
-        for column_index, cell in enumerate(cells):
-            # cell は openpyxl の worksheet のセル
-            # cell.valueはそのセルの値を格納
+    # 列ごとに型を決めて値を揃える
+    explicit_types = resolve_column_types(column_types, header_strings)
+    for column_index, values in enumerate(columns):
+        column_type = explicit_types.get(column_index)
+        if column_type is None:
+            column_type = infer_column_type(values)
+        coerce_column(values, column_type)
 
-            # cell を qt の model の item に変換
-            # (qt の model の item = エクセルで言うところのセル)
-            qt_item = QStandardItem()
-            qt_item.setText(str(cell.value))
+    return header_strings, columns, number_of_rows
 
-            # 作成した item を model に登録
-            qt_model.setItem(row_index, column_index, qt_item)
+def append_rows_to_qtmodel(qt_model, rows):
+    '''
+    Qtのモデルの末尾に、値のリストの行をまとめて追加します。rowsInserted シグナルは1回だけ放出されます。
 
-    return qt_model
+    append_rows()をもつモデル（ColumnarTableModel, SqliteTableModel）ではそれを使います。
+    QStandardItemModelでは、空の行を1回で挿入してからシグナルを止めてアイテムを入れ、
+    最後にそれらの行全体の dataChanged シグナルを1回だけ放出します。
+
+    Parameters:
+    qt_model -- QAbstractItemModel型 追加先のモデル
+    rows -- list型 列の順に並んだ値のリストのリスト。Noneのセルにはアイテムを作らない
+    '''
+    if not rows:
+        return
+
+    if hasattr(qt_model, 'append_rows'):
+        qt_model.append_rows(rows)
+        return
+
+    first_row = qt_model.rowCount()
+    number_of_columns = max(len(values) for values in rows)
+
+    # 列が足りない場合は、シグナルを止める前に増やしておく
+    if qt_model.columnCount() < number_of_columns:
+        qt_model.setColumnCount(number_of_columns)
+
+    qt_model.insertRows(first_row, len(rows))
+
+    qt_model.blockSignals(True)
+    try:
+        for row_index, values in enumerate(rows, first_row):
+            for column_index, value in enumerate(values):
+                if value is not None:
+                    qt_model.setItem(row_index, column_index, create_item(value))
+    finally:
+        qt_model.blockSignals(False)
+
+    qt_model.dataChanged.emit(
+        qt_model.index(first_row, 0),
+        qt_model.index(first_row + len(rows) - 1, number_of_columns - 1)
+    )
+
+def replace_column_in_qtmodel(qt_model, column, values):
+    '''
+    Qtのモデルのcolumn列目の値を、行の数と同じ長さの値のリストで置き換えます。dataChanged シグナルは1回だけ放出されます。
+
+    set_column()をもつモデル（ColumnarTableModel）ではそれを使います。
+    QStandardItemModelでは、シグナルを止めてアイテムを入れ直し、最後に列全体の dataChanged シグナルを放出します。
+
+    Parameters:
+    qt_model -- QAbstractItemModel型 値を置き換えるモデル
+    column -- int型 列番号
+    values -- list型 行の順に並んだ値のリスト。Noneのセルにはアイテムを作らない
+    '''
+    if not values:
+        return
+
+    if hasattr(qt_model, 'set_column'):
+        qt_model.set_column(column, values)
+        return
+
+    qt_model.blockSignals(True)
+    try:
+        for row_index, value in enumerate(values):
+            if value is None:
+                qt_model.setItem(row_index, column, None)
+            else:
+                qt_model.setItem(row_index, column, create_item(value))
+    finally:
+        qt_model.blockSignals(False)
+
+    qt_model.dataChanged.emit(qt_model.index(0, column), qt_model.index(len(values) - 1, column))
+
+def set_header_labels(qt_model, header_strings):
+    '''
+    ヘッダの値をQtのモデルのヘッダにします。Noneは空の文字列になります。
+    '''
+    qt_model.setHorizontalHeaderLabels([
+        '' if header_string is None else str(header_string)
+        for header_string in header_strings
+    ])
+
+def create_item(value):
+    '''
+    セルの値から、文字列とTYPED_VALUE_ROLEの値をもつQStandardItemを作ります。
+    '''
+    qt_item = QStandardItem(str(value))
+    qt_item.setData(value, TYPED_VALUE_ROLE)
+    return qt_item
+
+def infer_column_type(values):
+    '''
+    列の値から、その列の型を推定します。
+
+    空のセル（None）は無視されます。セルの型だけを見て推定し、文字列の中身は解釈しません。
+
+    Parameters:
+    values -- list型 列の値のリスト
+
+    Return: int, float, str のいずれか。空の列や日付などそれ以外の値を含む列ではNone
+        e.g. [300, None, 400] -> int
+             [28, 37.6] -> float
+             [22072, 'A-1'] -> str
+    '''
+    column_type = None
+
+    for value in values:
+        if value is None:
+            continue
+
+        # bool は int のサブクラスなので先に除外する
+        if isinstance(value, bool):
+            return None
+        elif isinstance(value, int):
+            value_type = int
+        elif isinstance(value, float):
+            value_type = float
+        elif isinstance(value, str):
+            value_type = str
+        else:
+            return None
+
+        if column_type is None or column_type is value_type:
+            column_type = value_type
+        elif {column_type, value_type} == {int, float}:
+            column_type = float
+        else:
+            column_type = str
+
+    return column_type
+
+def coerce_column(values, column_type, first_row=0):
+    '''
+    列の値をcolumn_type型に揃えます。valuesはその場で書き換えられます。
+
+    Noneはそのまま残ります。float型の列では、int型の値もそのまま残ります。
+    変換する必要のない値は、同じオブジェクトのまま残ります。
+
+    Parameters:
+    values -- list型 列の値のリスト
+    column_type -- type型 揃える型。Noneの場合は何もしない
+    first_row -- int型 valuesが列の途中から始まる場合の、最初の値の行番号。例外の文言に使う（未指定の場合0）
+    '''
+    if column_type is None:
+        return
+
+    for row, value in enumerate(values):
+        if value is None or isinstance(value, column_type):
+            continue
+        if column_type is float and isinstance(value, int):
+            continue
+
+        try:
+            values[row] = column_type(value)
+        except (TypeError, ValueError):
+            raise ExcelIOException(
+                '{}行目の値 {!r} を {} 型に変換できません'.format(
+                    first_row + row, value, column_type.__name__
+                )
+            )
+
+def resolve_column_types(column_types, header_strings):
+    '''
+    {列番号またはヘッダの文字列: 型} からなる辞書を、{列番号: 型} からなる辞書に変換します。
+
+    Parameters:
+    column_types -- dict型 またはNone
+    header_strings -- list型 ヘッダの文字列のリスト。ヘッダがない場合はNone
+
+    Return: dict型
+    '''
+    if not column_types:
+        return {}
+
+    resolved = {}
+    for key, column_type in column_types.items():
+        if isinstance(key, str):
+            if header_strings is None or key not in header_strings:
+                raise ExcelIOException('列 {} がヘッダに見つかりません'.format(key))
+            key = header_strings.index(key)
+        resolved[key] = column_type
+
+    return resolved
@@ -0,0 +1,343 @@
+'''
+処理の呼び出し回数・所要時間と、シグナルによる作り直しの回数を記録するためのモジュールです。
+
+記録は実行中にenable()とdisable()で切り替えられます。無効な間は計測用の関数を差し込まないため、
+HOT_PATHSの関数は元のまま呼び出されます。
+'''
+
+import cProfile
+import collections
+import functools
+import importlib
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import weakref
+
+# 計測する関数の (モジュール名, モジュール内の名前) のリスト
+HOT_PATHS = [
+    ('excelio', 'load_workbook'),
+    ('excelio', 'read_openpyxl_columns'),
+    ('excelio', 'convert_openpyxl_to_qtmodel'),
+    ('excelio', 'convert_columns_to_qtmodel'),
+    ('excelio', 'ExcelQtConverter.flush'),
+    ('loader', 'WorkbookLoader.load_sheet'),
+    ('relation_proxy_model', 'map_value_to_row'),
+    ('relation_proxy_model', 'Mapper.refresh_map'),
+    ('relation_proxy_model', 'RelationProxyModel.data'),
+    ('model', 'ItemCatalog.refresh'),
+    ('model', 'ItemCatalog.lookup'),
+    ('model', 'PurchasedItemModelWrapper.add_items'),
+    ('totals', 'SalesTotals.refresh'),
+    ('search_index', 'SearchIndex.search'),
+    ('search_index', 'SearchIndex.refresh'),
+]
+
+# ヒストグラムの区間の数。i番目の区間は 2**(i-1) 以上 2**i 未満のマイクロ秒数
+NUMBER_OF_BUCKETS = 32
+
+# Trueの間だけ記録する
+enabled = False
+
+# {関数の名前: FunctionStatistics}
+function_statistics = {}
+
+# {'作り直す関数 <- シグナル名': 回数}
+refresh_counts = collections.Counter()
+
+# enable(profile=True)の場合に使うcProfile.Profile
+profiler = None
+
+# 差し込んだ計測用の関数を元に戻すための (オブジェクト, 属性名, 元の値) のリスト
+patches = []
+
+class FunctionStatistics:
+
+    '''
+    1つの関数の呼び出し回数・合計時間・最大時間と、所要時間のヒストグラムです。
+
+    Parameters:
+    name -- str型 関数の名前
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.clear()
+
+    def clear(self):
+        '''
+        記録を消去します。
+        '''
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * NUMBER_OF_BUCKETS
+
+    def record(self, seconds):
+        '''
+        1回分の所要時間を記録します。
+        '''
+        self.calls += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        bucket = min(int(seconds * 1000000).bit_length(), NUMBER_OF_BUCKETS - 1)
+        self.buckets[bucket] += 1
+
+    def percentile(self, ratio):
+        '''
+        所要時間のratio（0～1）分位点の上限の秒数を、ヒストグラムから概算して返します。
+        '''
+        if not self.calls:
+            return 0.0
+        threshold = ratio * self.calls
+        accumulated = 0
+        for bucket, count in enumerate(self.buckets):
+            accumulated += count
+            if accumulated >= threshold:
+                return (1 << bucket) / 1000000
+        return self.max_seconds
+
+    def to_dict(self):
+        '''
+        JSONに書き出せる辞書を返します。ヒストグラムは {'<Nus': 回数} の形で、呼び出しのある区間だけを含みます。
+        '''
+        return {
+            'calls': self.calls,
+            'total_seconds': self.total_seconds,
+            'max_seconds': self.max_seconds,
+            'histogram': {
+                '<{}us'.format(1 << bucket): count
+                for bucket, count in enumerate(self.buckets) if count
+            }
+        }
+
+def enable(profile=False):
+    '''
+    記録を始めます。HOT_PATHSの関数に計測用の関数を差し込みます。
+
+    Parameters:
+    profile -- bool型 Trueの場合、cProfileによるプロファイリングも行う（未指定の場合False）
+    '''
+    global enabled, profiler
+    if enabled:
+        return
+    enabled = True
+
+    for module_name, name in HOT_PATHS:
+        instrument(module_name, name)
+
+    # 一度プロファイリングを始めた後は、enable()のたびに続きから記録する
+    if profile and profiler is None:
+        profiler = cProfile.Profile()
+    if profiler is not None:
+        profiler.enable()
+
+def disable():
+    '''
+    記録を止め、差し込んだ計測用の関数を元に戻します。それまでの記録は残ります。
+    '''
+    global enabled
+    if not enabled:
+        return
+    enabled = False
+
+    while patches:
+        owner, name, original = patches.pop()
+        setattr(owner, name, original)
+
+    if profiler is not None:
+        profiler.disable()
+
+def reset():
+    '''
+    それまでの記録を消去します。
+    '''
+    global profiler
+    # 差し込んだ計測用の関数はFunctionStatisticsを保持しているため、辞書からは除かずに消去する
+    for statistics in function_statistics.values():
+        statistics.clear()
+    refresh_counts.clear()
+    if profiler is not None:
+        profiler.disable()
+        profiler = cProfile.Profile()
+        if enabled:
+            profiler.enable()
+
+def instrument(module_name, name):
+    '''
+    module_nameモジュールのname（'クラス名.メソッド名' でもよい）に、計測用の関数を差し込みます。
+
+    モジュールレベルの関数は、ほかのモジュールが from ... import で取り込んだものも置き換えます。
+    '''
+    module = importlib.import_module(module_name)
+    owner_name, _, attribute = name.rpartition('.')
+    owner = getattr(module, owner_name) if owner_name else module
+    original = owner.__dict__[attribute] if owner_name else getattr(module, attribute)
+    timed = timed_function(name, original)
+
+    if owner_name:
+        patches.append((owner, attribute, original))
+        setattr(owner, attribute, timed)
+        return
+
+    for loaded_module in list(sys.modules.values()):
+        if getattr(loaded_module, attribute, None) is original:
+            patches.append((loaded_module, attribute, original))
+            setattr(loaded_module, attribute, timed)
+
+def get_statistics(name):
+    '''
+    function_statistics[name]を返します。まだない場合は作ります。
+    '''
+    statistics = function_statistics.get(name)
+    if statistics is None:
+        statistics = function_statistics[name] = FunctionStatistics(name)
+    return statistics
+
+def record(name, seconds):
+    '''
+    関数の呼び出し以外で測った所要時間（スキャンから表示までの時間など）を、nameの記録に加えます。
+
+    記録が有効な間だけ記録します。
+    '''
+    if enabled:
+        get_statistics(name).record(seconds)
+
+def timed_function(name, function):
+    '''
+    functionを呼び出し、その所要時間をfunction_statistics[name]に記録する関数を返します。
+    '''
+    statistics = get_statistics(name)
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            statistics.record(time.perf_counter() - start)
+
+    return timed
+
+def count_refresh(refresh_name, signal_name):
+    '''
+    signal_nameのシグナルを受けて、refresh_nameの作り直しが行われたことを記録します。
+    '''
+    if enabled:
+        refresh_counts['{} <- {}'.format(refresh_name, signal_name)] += 1
+
+def counting_slot(signal_name, slot):
+    '''
+    呼び出されるたびに count_refresh() で記録してからslotを呼び出す関数を返します。
+
+    作り直し（全体の再計算）を行うslotをシグナルにconnectするときに使います。
+
+    slotがメソッドの場合は呼び出すたびにオブジェクトから取り出し直すため、connectした後に
+    enable()で差し込んだ計測用の関数も呼び出されます。
+    オブジェクトは弱参照で持つため、シグナルを放出するモデルより先にオブジェクトが不要になれば破棄され、
+    その後は何もしません。
+
+    e.g. qt_model.modelReset.connect(counting_slot('modelReset', self.refresh))
+    '''
+    refresh_name = slot.__qualname__
+    if getattr(slot, '__self__', None) is None:
+        def counted_function(*args):
+            count_refresh(refresh_name, signal_name)
+            return slot(*args)
+
+        return counted_function
+
+    slot_reference = weakref.WeakMethod(slot)
+
+    def counted_slot(*args):
+        method = slot_reference()
+        if method is None:
+            return None
+        count_refresh(refresh_name, signal_name)
+        return getattr(method.__self__, method.__name__)(*args)
+
+    return counted_slot
+
+def report():
+    '''
+    記録をJSONに書き出せる辞書として返します。
+    '''
+    return {
+        'enabled': enabled,
+        'functions': {
+            name: statistics.to_dict()
+            for name, statistics in sorted(function_statistics.items()) if statistics.calls
+        },
+        'refreshes': dict(sorted(refresh_counts.items()))
+    }
+
+def format_report(number_of_profile_lines=30):
+    '''
+    記録を人が読める文字列にして返します。デバッグ用のウィンドウに表示されます。
+    '''
+    lines = ['計測: {}'.format('有効' if enabled else '無効'), '']
+
+    lines.append('{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+        '関数', '回数', '合計ms', '平均us', 'p90 us', '最大us'
+    ))
+    for name, statistics in sorted(function_statistics.items()):
+        if not statistics.calls:
+            continue
+        lines.append('{:<40} {:>8} {:>10.1f} {:>10.1f} {:>10.0f} {:>10.0f}'.format(
+            name,
+            statistics.calls,
+            statistics.total_seconds * 1000,
+            statistics.total_seconds / statistics.calls * 1000000,
+            statistics.percentile(0.9) * 1000000,
+            statistics.max_seconds * 1000000
+        ))
+
+    lines.extend(['', '作り直しの回数（関数 <- シグナル）'])
+    for name, count in sorted(refresh_counts.items()):
+        lines.append('{:<60} {:>8}'.format(name, count))
+
+    if profiler is not None:
+        lines.extend(['', format_profile(number_of_profile_lines)])
+
+    return '\n'.join(lines)
+
+def format_profile(number_of_lines=30):
+    '''
+    cProfileの記録を、累積時間の長い順にnumber_of_lines行の文字列にして返します。
+    '''
+    if profiler is None:
+        return ''
+    stream = io.StringIO()
+    try:
+        read_profile(stream).sort_stats('cumulative').print_stats(number_of_lines)
+    except TypeError:
+        # まだ何も記録されていない
+        return ''
+    return stream.getvalue()
+
+def read_profile(stream=None):
+    '''
+    cProfileのそれまでの記録をpstats.Statsとして取り出します。記録している途中であれば、取り出した後も記録を続けます。
+    '''
+    # pstats.Statsは記録を取り出すときにプロファイリングを止める
+    stats = pstats.Stats(profiler, stream=stream)
+    if enabled:
+        profiler.enable()
+    return stats
+
+def write_report(file_name):
+    '''
+    記録をJSONファイルに書き出します。
+
+    プロファイリングしている場合は、cProfileの記録を拡張子 .prof のファイルにも書き出します
+    （python -m pstats で読めます）。
+    '''
+    with open(file_name, 'w', encoding='utf-8') as report_file:
+        json.dump(report(), report_file, ensure_ascii=False, indent=2)
+
+    if profiler is not None:
+        read_profile().dump_stats(os.path.splitext(file_name)[0] + '.prof')
@@ -0,0 +1,131 @@
+'''
+購入済み商品の追加を、追記専用のファイルに先行して記録するためのモジュールです。
+'''
+
+import json
+import os
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+class JournalException(Exception):
+    pass
+
+class SalesJournal:
+
+    '''
+    購入済み商品の追加を1行1件のJSON（JSON Lines）として追記します。
+
+    書き込みはその都度OSに渡されるため、プログラムが異常終了しても記録は失われません。
+    電源断に備えたfsyncは、sync_intervalミリ秒の間の書き込みをまとめて1回だけ行います。
+
+    Parameters:
+    file_name -- str型 ジャーナルファイルのファイル名
+    sync_interval -- int型 fsyncをまとめるミリ秒数（未指定の場合100）
+    '''
+
+    def __init__(self, file_name, sync_interval=100):
+        self.file_name = file_name
+        self.sync_interval = sync_interval
+        self.journal_file = open(file_name, 'a', encoding='utf-8')
+        self.sync_timer = None
+
+    def append(self, row, customer_id, item_id):
+        '''
+        購入済み商品の追加を1件記録します。
+
+        Parameters:
+        row -- int型 商品が追加される行の番号
+        customer_id -- str型 購入者の顧客番号
+        item_id -- str型 商品番号
+        '''
+        self.extend([(row, customer_id, item_id)])
+
+    def extend(self, entries):
+        '''
+        購入済み商品の追加をまとめて記録します。書き込みとfsyncの予約は1回だけ行われます。
+
+        Parameters:
+        entries -- iterable型 (row, customer_id, item_id) のタプルを返すイテラブル
+        '''
+        self.journal_file.write(''.join(
+            json.dumps(
+                {'row': row, 'customer_id': customer_id, 'item_id': item_id},
+                ensure_ascii=False
+            ) + '\n'
+            for row, customer_id, item_id in entries
+        ))
+        self.journal_file.flush()
+        self.schedule_sync()
+
+    def read(self):
+        '''
+        記録されている追加をすべて読み出します。
+
+        書き込みの途中で異常終了したために壊れている最後の行は無視されます。
+
+        Return: list型 (row, customer_id, item_id) のタプルのリスト
+        '''
+        entries = []
+        with open(self.file_name, encoding='utf-8') as journal_file:
+            lines = journal_file.readlines()
+
+        for line_number, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                if line_number == len(lines) - 1:
+                    break
+                raise JournalException(
+                    '{}の{}行目を読み込めません'.format(self.file_name, line_number + 1)
+                )
+            entries.append((entry['row'], entry['customer_id'], entry['item_id']))
+
+        return entries
+
+    def schedule_sync(self):
+        '''
+        sync()をタイマーで予約します。すでに予約されている場合は何もしません。
+
+        イベントループがない（QCoreApplicationが存在しない）場合は、その場でsync()します。
+        '''
+        application = QCoreApplication.instance()
+        if application is None:
+            self.sync()
+            return
+
+        if self.sync_timer is None:
+            self.sync_timer = QTimer()
+            self.sync_timer.setSingleShot(True)
+            self.sync_timer.setInterval(self.sync_interval)
+            self.sync_timer.timeout.connect(self.sync)
+            application.aboutToQuit.connect(self.sync)
+
+        if not self.sync_timer.isActive():
+            self.sync_timer.start()
+
+    def sync(self):
+        '''
+        記録をディスクに書き込みます（fsync）。
+        '''
+        if self.sync_timer is not None:
+            self.sync_timer.stop()
+        if self.journal_file.closed:
+            return
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def truncate(self):
+        '''
+        記録をすべて消去します。
+
+        記録された追加がすべてExcelファイルに保存された後に呼び出してください。
+        '''
+        self.journal_file.flush()
+        self.journal_file.truncate(0)
+        self.sync()
+
+    def close(self):
+        '''
+        ジャーナルファイルを閉じます。
+        '''
+        self.sync()
+        self.journal_file.close()
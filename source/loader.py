@@ -0,0 +1,271 @@
+'''
+Excelファイルの読み込みを別のスレッドで行い、読み込んだ行を少しずつQtのモデルに入れるためのモジュールです。
+'''
+
+from columnar_model import rows_to_columns
+from excelio import (
+    append_rows_to_qtmodel, coerce_column, infer_column_type, replace_column_in_qtmodel,
+    resolve_column_types, set_header_labels
+)
+from itertools import islice
+from openpyxl import load_workbook
+from PyQt5.QtCore import (
+    QCoreApplication, QObject, Qt, QThread, pyqtSignal, pyqtSlot
+)
+
+# 1回のシグナルでモデルに入れる行数
+CHUNK_SIZE = 500
+
+class WorkbookLoader(QObject):
+
+    '''
+    Excelファイルのシートを読み取り専用モードで読み込み、行をCHUNK_SIZE行ずつシグナルで送ります。
+
+    start()で作業用のスレッドに移って読み込みを始めます。シグナルはキュー経由で受け取り側のスレッドに
+    届くため、受け取り側（ModelFeeder）はGUIのスレッドでモデルを変更できます。
+    行は読み進めながら送られるため、モデルにはシートを読み終える前から行が入り始めます。
+    列の型の推定はシート全体の値で行うため、推定した型に揃えると送った値が変わる列は、
+    シートを読み終えた後に column_retyped シグナルで送り直されます。
+
+    Parameters:
+    file_name -- str型 エクセルファイルのファイル名
+    sheets -- list型 (シート名, column_types) のタプルのリスト。この順に読み込まれる。
+              column_typesはexcelio.convert_openpyxl_to_qtmodel()と同じ
+    chunk_size -- int型 1回のシグナルで送る行数（未指定の場合CHUNK_SIZE）
+    sheet_cache -- sheet_cache.SheetCache型 読み込んだシートのキャッシュ。
+                   読み込み中はほかのスレッドから使わないこと（未指定の場合None）
+    '''
+
+    # (シート名, ヘッダの値のリスト)
+    sheet_started = pyqtSignal(str, list)
+    # (シート名, 行の値のリストのリスト)
+    rows_loaded = pyqtSignal(str, list)
+    # (シート名, 列番号, 型を揃えた列全体の値のリスト)
+    column_retyped = pyqtSignal(str, int, list)
+    # シート名
+    sheet_finished = pyqtSignal(str)
+    finished = pyqtSignal()
+    # 読み込み中に送出された例外
+    failed = pyqtSignal(object)
+
+    def __init__(self, file_name, sheets, chunk_size=CHUNK_SIZE, sheet_cache=None):
+        super().__init__()
+        self.file_name = file_name
+        self.sheets = sheets
+        self.chunk_size = chunk_size
+        self.sheet_cache = sheet_cache
+        self.thread = None
+
+        # 読み取り専用モードで開いたワークブック。キャッシュを使えないシートがあるときだけ開く
+        self.px_workbook = None
+
+    def start(self):
+        '''
+        作業用のスレッドを作って読み込みを始めます。
+
+        イベントループがない（QCoreApplicationが存在しない）場合は、その場で読み込みます。
+        この場合も、読み込み中の例外はfailedシグナルで通知されます。
+        '''
+        if QCoreApplication.instance() is None:
+            self.run()
+            return
+
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+        # 受け取り側がwait()できるよう、キューを通さずに作業用のスレッドで終了させる
+        self.finished.connect(self.thread.quit, Qt.DirectConnection)
+        self.failed.connect(self.thread.quit, Qt.DirectConnection)
+        self.thread.start()
+
+    def wait(self):
+        '''
+        作業用のスレッドが終わるまで待ちます。
+        '''
+        if self.thread is not None:
+            self.thread.wait()
+
+    @pyqtSlot()
+    def run(self):
+        '''
+        作業用のスレッドで呼び出されます。すべてのシートを読み込み、finishedかfailedシグナルを放出します。
+        '''
+        try:
+            self.load()
+        except Exception as exception:
+            self.failed.emit(exception)
+            return
+
+        self.finished.emit()
+
+    def load(self):
+        '''
+        すべてのシートを順に読み込みます。
+        '''
+        try:
+            for name, column_types in self.sheets:
+                self.load_sheet(name, column_types)
+        finally:
+            if self.px_workbook is not None:
+                self.px_workbook.close()
+                self.px_workbook = None
+
+    def load_sheet(self, name, column_types):
+        '''
+        1つのシートを読み込み、ヘッダと行をシグナルで送ります。
+
+        キャッシュを使えない場合は、シートをchunk_size行読むごとにその行を送ります。
+        column_typesで型を指定した列の値は、送る前にその型に揃えます。型を推定する列の値はそのまま送り、
+        シートを読み終えてから推定した型に揃えて、値が変わる列だけをcolumn_retypedシグナルで送り直します。
+        '''
+        if self.sheet_cache is not None:
+            entry = self.sheet_cache.get(name, True, column_types)
+            if entry is not None:
+                self.send_columns(name, *entry)
+                return
+
+        if self.px_workbook is None:
+            self.px_workbook = load_workbook(self.file_name, read_only=True)
+        rows = self.px_workbook[name].iter_rows(values_only=True)
+
+        header_strings = list(next(rows, ()))
+        self.sheet_started.emit(name, header_strings)
+
+        explicit_types = resolve_column_types(column_types, header_strings)
+        columns = [[] for _ in header_strings]
+        number_of_rows = 0
+        while True:
+            chunk_columns, number_of_chunk_rows = rows_to_columns(
+                islice(rows, self.chunk_size), len(columns)
+            )
+            if not number_of_chunk_rows:
+                break
+
+            for column_index, column_type in explicit_types.items():
+                if column_index < len(chunk_columns):
+                    coerce_column(chunk_columns[column_index], column_type, number_of_rows)
+            self.rows_loaded.emit(name, [list(values) for values in zip(*chunk_columns)])
+
+            # これまでより長い行があった場合は、既存の行をNoneで埋めた列を追加する
+            columns.extend([None] * number_of_rows for _ in range(len(chunk_columns) - len(columns)))
+            for column, chunk_column in zip(columns, chunk_columns):
+                column.extend(chunk_column)
+            number_of_rows += number_of_chunk_rows
+
+        # 型を推定する列を揃え、送った値から変わった列だけを送り直す
+        for column_index, values in enumerate(columns):
+            if column_index in explicit_types:
+                continue
+            sent_values = list(values)
+            coerce_column(values, infer_column_type(values))
+            if any(value is not sent_value for value, sent_value in zip(values, sent_values)):
+                self.column_retyped.emit(name, column_index, list(values))
+
+        if self.sheet_cache is not None:
+            self.sheet_cache.put(name, True, column_types, (header_strings, columns, number_of_rows))
+
+        self.sheet_finished.emit(name)
+
+    def send_columns(self, name, header_strings, columns, number_of_rows):
+        '''
+        キャッシュから読み込んだ型の揃ったシートを、ヘッダとchunk_size行ずつの行としてシグナルで送ります。
+        '''
+        self.sheet_started.emit(name, header_strings)
+
+        for first_row in range(0, number_of_rows, self.chunk_size):
+            last_row = min(first_row + self.chunk_size, number_of_rows)
+            self.rows_loaded.emit(
+                name, [list(values) for values in zip(*(
+                    column[first_row:last_row] for column in columns
+                ))]
+            )
+
+        self.sheet_finished.emit(name)
+
+class ModelFeeder(QObject):
+
+    '''
+    WorkbookLoaderのシグナルを受け取り、シートごとのQtのモデルに行を入れます。
+
+    GUIのスレッドで作ってください。WorkbookLoaderのシグナルはこのオブジェクトのスレッドで処理されます。
+    シートを読み終えるたびに sheet_loaded シグナルを、すべて読み終えると loaded シグナルを放出します。
+    読み込みに失敗した場合は、loaded の代わりに failed シグナルを放出します。
+    キュー経由で呼び出されるスロットから例外を送出するとアプリケーション全体が終了するため、
+    例外は送出し直さずに exception に保持します。
+
+    Parameters:
+    loader -- WorkbookLoader型 シートを読み込むオブジェクト
+    qt_models -- dict型 {シート名: 行を入れる空のQtモデル} からなる辞書
+    '''
+
+    # シート名
+    sheet_loaded = pyqtSignal(str)
+    loaded = pyqtSignal()
+    # 読み込み中に送出された例外
+    failed = pyqtSignal(object)
+
+    def __init__(self, loader, qt_models):
+        super().__init__()
+        self.loader = loader
+        self.qt_models = qt_models
+
+        # 読み込みに失敗した場合の例外。失敗していなければNone
+        self.exception = None
+
+        loader.sheet_started.connect(self.on_sheet_started)
+        loader.rows_loaded.connect(self.on_rows_loaded)
+        loader.column_retyped.connect(self.on_column_retyped)
+        loader.sheet_finished.connect(self.on_sheet_finished)
+        loader.finished.connect(self.on_finished)
+        loader.failed.connect(self.on_failed)
+
+    def start(self):
+        '''
+        読み込みを始めます。
+        '''
+        self.loader.start()
+
+    @pyqtSlot(str, list)
+    def on_sheet_started(self, name, header_strings):
+        '''
+        WorkbookLoader.sheet_started シグナルを受け取り、モデルのヘッダを設定します。
+        '''
+        set_header_labels(self.qt_models[name], header_strings)
+
+    @pyqtSlot(str, list)
+    def on_rows_loaded(self, name, rows):
+        '''
+        WorkbookLoader.rows_loaded シグナルを受け取り、モデルの末尾に行を追加します。
+        '''
+        append_rows_to_qtmodel(self.qt_models[name], rows)
+
+    @pyqtSlot(str, int, list)
+    def on_column_retyped(self, name, column, values):
+        '''
+        WorkbookLoader.column_retyped シグナルを受け取り、モデルの列の値を型を揃えた値で置き換えます。
+        '''
+        replace_column_in_qtmodel(self.qt_models[name], column, values)
+
+    @pyqtSlot(str)
+    def on_sheet_finished(self, name):
+        '''
+        WorkbookLoader.sheet_finished シグナルを受け取ります。
+        '''
+        self.sheet_loaded.emit(name)
+
+    @pyqtSlot()
+    def on_finished(self):
+        '''
+        WorkbookLoader.finished シグナルを受け取ります。
+        '''
+        self.loader.wait()
+        self.loaded.emit()
+
+    @pyqtSlot(object)
+    def on_failed(self, exception):
+        '''
+        WorkbookLoader.failed シグナルを受け取り、読み込み中の例外を保持して failed シグナルを放出します。
+        '''
+        self.loader.wait()
+        self.exception = exception
+        self.failed.emit(exception)
@@ -1,27 +1,66 @@
 '''
 プログラムへのエントリポイント。
 '''
+import instrumentation
+import os
+import sys
 import model
 import view
+from storage import ExcelStorage
+
+# 計測結果を書き出すファイル
+INSTRUMENTATION_REPORT_FILE_NAME = 'instrumentation.json'
 
 def main():
     '''
     エクセルからデータを読み込みGUIを起動します。
     '''
 
+    # 環境変数 GOMIPY_INSTRUMENTATION を設定すると、起動時から計測する。
+    # 値が profile の場合は cProfile でのプロファイリングも行う。
+    instrumentation_mode = os.environ.get('GOMIPY_INSTRUMENTATION')
+    if instrumentation_mode:
+        instrumentation.enable(profile=(instrumentation_mode == 'profile'))
+
+    # 別のスレッドで読み込む前に、イベントループを作っておく。
+    app = view.create_application()
+
+    # 計測していた場合は、終了時に結果をファイルに書き出す。
+    def write_instrumentation_report():
+        if instrumentation.enabled:
+            instrumentation.write_report(INSTRUMENTATION_REPORT_FILE_NAME)
+    app.aboutToQuit.connect(write_instrumentation_report)
+
     # エクセルファイルを開く。
-    manager = model.Manager('Python リサイクル市 会計用.xlsx', 'raw', '会計録')
+    # 全商品一覧はスナップショットにしておき、同じマシンのレジどうしで共有する。
+    file_name = 'Python リサイクル市 会計用.xlsx'
+    storage = ExcelStorage(
+        file_name, 'raw', '会計録',
+        item_snapshot_file_name=os.path.splitext(file_name)[0] + '.snapshot'
+    )
+    manager = model.Manager(file_name, 'raw', '会計録', storage=storage)
 
-    # 商品情報のシートを取得。
-    # qtのmodelが得られる。
-    items_model = manager.init_all_item_model()
+    # 商品情報と会計録のシートを別のスレッドで読み込み始める。
+    # qtのmodelはすぐに得られ、読み込んだ行が少しずつ追加される。
+    # 追加した商品の値段は会計録の「値段」列（2列目）に書き込む。
+    manager.init_models_in_background(0, 1, column_for_sale_price=2)
     items_model = manager.get_all_item_model()
 
-    # カートとして使うためのモデルを作る。
-    manager.init_purchased_item_model(0,1)
+    # 全商品一覧を商品番号・商品名で検索するためのモデル。
+    item_search_model = manager.get_item_search_model()
+
+    # カートとして使うためのモデル。
     cart_model = manager.get_purchased_item_model()
 
-    # GUIを起動。
-    view.main(items_model, cart_model)
+    # 顧客ごとの合計を表示するためのモデル。
+    totals_model = manager.get_sales_totals().by_customer
+
+    # 読み込みを待たずにGUIを表示する。
+    main_window = view.MainWindow(items_model, cart_model, totals_model, item_search_model)
+
+    # 読み込みに失敗した場合は、アプリを終了させずにメッセージを表示する。
+    if manager.model_feeder is not None:
+        manager.model_feeder.failed.connect(main_window.show_load_error)
+    sys.exit(app.exec_())
 
 main()
\ No newline at end of file
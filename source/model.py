@@ -1,6 +1,13 @@
-from excelio import ExcelQtConverter
-from PyQt5.QtGui import QStandardItem, QStandardItemModel
-from relation_proxy_model import RelationProxyModel
+import bisect
+import instrumentation
+import os
+from columnar_model import TYPED_VALUE_ROLE
+from excelio import create_item
+from journal import SalesJournal
+from relation_proxy_model import RelationProxyModel, group_rows_by_value, read_column
+from search_index import ItemSearchProxyModel
+from storage import is_partition, open_storage
+from totals import SalesTotals
 
 class ModelException(Exception):
     '''
@@ -8,6 +15,125 @@ class ModelException(Exception):
     '''
     pass
 
+class UnknownItemException(ModelException):
+    '''
+    全商品一覧にない商品番号が指定された場合に送出されます。
+    '''
+    pass
+
+class ItemCatalog:
+
+    '''
+    全商品一覧のモデルに、商品番号から行を引く索引を付けます。
+
+    索引は辞書で、作るのは最初の1回だけです。以後はモデルのシグナルを受けて更新されるため、
+    lookup()はモデルの大きさによらず一定の時間で済みます。
+    同じ商品番号の行が複数ある場合は、最初の行が使われます。
+
+    Parameters:
+    qt_model -- QAbstractItemModel型 全商品一覧のモデル
+    column_for_item_id -- int型 商品番号を格納する列
+    column_for_item_name -- int型 商品名を格納する列
+    column_for_item_price -- int型 値段を格納する列
+    '''
+
+    def __init__(self, qt_model, column_for_item_id, column_for_item_name, column_for_item_price):
+        self.qt_model = qt_model
+        self.column_for_item_id = column_for_item_id
+        self.column_for_item_name = column_for_item_name
+        self.column_for_item_price = column_for_item_price
+
+        # 行ごとの商品番号のリストと、{商品番号: 行のリスト} からなる辞書
+        self.item_ids = []
+        self.item_id_rows = {}
+        self.refresh()
+
+        self.qt_model.dataChanged.connect(self.on_data_changed)
+        self.qt_model.rowsInserted.connect(self.on_rows_inserted)
+        self.qt_model.rowsRemoved.connect(instrumentation.counting_slot('rowsRemoved', self.refresh))
+        self.qt_model.rowsMoved.connect(instrumentation.counting_slot('rowsMoved', self.refresh))
+        self.qt_model.modelReset.connect(instrumentation.counting_slot('modelReset', self.refresh))
+
+    def refresh(self, *args):
+        '''
+        索引を作り直します。行の構造が変わるシグナルにconnectされます。
+        '''
+        self.item_ids = read_column(self.qt_model, self.column_for_item_id)
+        self.item_id_rows = group_rows_by_value(self.item_ids, list)
+
+    def on_rows_inserted(self, parent, first, last):
+        '''
+        qt_modelのrowsInsertedシグナルにconnectされます。末尾に追加された行だけ索引に加えます。
+
+        末尾以外への挿入では、後ろの行の番号がずれるため索引を作り直します。
+        '''
+        if first != len(self.item_ids):
+            instrumentation.count_refresh('ItemCatalog.refresh', 'rowsInserted')
+            self.refresh()
+            return
+
+        for row in range(first, last + 1):
+            item_id = self.qt_model.data(self.qt_model.index(row, self.column_for_item_id))
+            self.item_ids.append(item_id)
+            self.item_id_rows.setdefault(item_id, []).append(row)
+
+    def on_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        qt_modelのdataChangedシグナルにconnectされます。商品番号が変わった行だけ索引を更新します。
+        '''
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+        if not topleft.column() <= self.column_for_item_id <= bottomright.column():
+            return
+
+        for row in range(topleft.row(), bottomright.row() + 1):
+            old_item_id = self.item_ids[row]
+            new_item_id = self.qt_model.data(self.qt_model.index(row, self.column_for_item_id))
+            if new_item_id == old_item_id:
+                continue
+
+            rows = self.item_id_rows[old_item_id]
+            rows.remove(row)
+            if not rows:
+                del self.item_id_rows[old_item_id]
+
+            rows = self.item_id_rows.setdefault(new_item_id, [])
+            bisect.insort(rows, row)
+            self.item_ids[row] = new_item_id
+
+    def find_row(self, item_id):
+        '''
+        商品番号がitem_idである行の番号を返します。ない場合はNoneを返します。
+        '''
+        rows = self.item_id_rows.get(item_id)
+        if not item_id or not rows:
+            return None
+        return rows[0]
+
+    def lookup(self, item_id):
+        '''
+        商品番号から商品名と値段を引きます。
+
+        Parameters:
+        item_id -- str型 商品番号
+
+        Return: (商品名, 値段) のタプル
+            e.g. ('衣装ケース08', 200)
+
+        Raises:
+        UnknownItemException -- 全商品一覧にない商品番号の場合
+        '''
+        row = self.find_row(item_id)
+        if row is None:
+            raise UnknownItemException('商品番号{}の商品はありません'.format(item_id))
+
+        return (
+            self.qt_model.data(self.qt_model.index(row, self.column_for_item_name)),
+            self.qt_model.data(
+                self.qt_model.index(row, self.column_for_item_price), TYPED_VALUE_ROLE
+            )
+        )
+
 class PurchasedItemModelWrapper:
 
     '''
@@ -17,75 +143,421 @@ class PurchasedItemModelWrapper:
     qt_model -- QAbstractItemModel型 購入済み商品のモデル
     column_for_customer_id -- int型 顧客番号を格納する列
     column_for_item_id -- int型 商品番号を格納する列
+    journal -- journal.SalesJournal型 追加を先行して記録するジャーナル（未指定の場合None）
+    catalog -- ItemCatalog型 追加する商品番号を確かめる全商品一覧の索引（未指定の場合None）
+    column_for_sale_price -- int型 catalogから引いた値段を格納する列。Noneの場合は格納しない
+                             （未指定の場合None）
+
+    追加する顧客番号と商品番号は、その列にすでにある値と同じ型（シートから推定された型）のセルになります。
+    int型の列では '22072' は 22072 として格納されるため、書き戻してもシートの列の型は変わりません。
     '''
 
-    def __init__(self, qt_model, column_for_customer_id, column_for_item_id):
+    def __init__(self, qt_model, column_for_customer_id, column_for_item_id, journal=None,
+                 catalog=None, column_for_sale_price=None):
         self.qt_model = qt_model
         self.column_for_customer_id = column_for_customer_id
         self.column_for_item_id = column_for_item_id
-    
+        self.journal = journal
+        self.catalog = catalog
+        self.column_for_sale_price = column_for_sale_price
+
+        # Trueの間は購入済み商品一覧を読み込み中で、商品を追加できない
+        self.loading = False
+        # 購入済み商品一覧の読み込みに失敗した場合の例外。この場合も商品を追加できない
+        self.load_error = None
+
     def add_item(self, customer_id, item_id):
         '''
         購入済み商品一覧に商品を追加します。
 
+        catalogが指定されている場合、全商品一覧にない商品番号は追加されません。
+
         Parameters:
         customer_id -- str型 購入者の顧客番号
         item_id -- str型 商品番号
+
+        Return: catalogが指定されている場合は (商品名, 値段) のタプル、それ以外の場合はNone
+
+        Raises:
+        UnknownItemException -- 全商品一覧にない商品番号の場合
+        ModelException -- 購入済み商品一覧を読み込み中か、読み込みに失敗した場合
         '''
+        return self.add_items([(customer_id, item_id)])[0]
 
-        # 型チェック
-        if not isinstance(customer_id, str):
-            raise TypeError(
-                'Customer ID must be in str, not' + str(type(customer_id))
-            )
+    def add_items(self, sales):
+        '''
+        購入済み商品一覧に複数の商品をまとめて追加します。
+
+        モデルへの行の追加は1回の rowsInserted シグナルとして通知され、ジャーナルへの記録も1回で行われます。
+        1つでも追加できない商品があれば、どの商品も追加されません。
 
-        # 型チェック
-        if not isinstance(item_id, str):
-            raise TypeError(
-                'Item ID must be in str, not' + str(type(item_id))
+        Parameters:
+        sales -- iterable型 (顧客番号, 商品番号) のタプルを返すイテラブル。どちらもstr型
+
+        Return: list型 商品ごとのadd_item()の戻り値のリスト
+
+        Raises:
+        UnknownItemException -- 全商品一覧にない商品番号がある場合
+        ModelException -- 購入済み商品一覧を読み込み中か、読み込みに失敗した場合
+        '''
+        if self.load_error is not None:
+            raise ModelException(
+                '購入済み商品一覧を読み込めなかったため追加できません（{}）'.format(self.load_error)
             )
+        if self.loading:
+            raise ModelException('購入済み商品一覧を読み込み中です')
+
+        sales = list(sales)
+
+        for customer_id, item_id in sales:
+            # 型チェック
+            if not isinstance(customer_id, str):
+                raise TypeError(
+                    'Customer ID must be in str, not' + str(type(customer_id))
+                )
+
+            # 型チェック
+            if not isinstance(item_id, str):
+                raise TypeError(
+                    'Item ID must be in str, not' + str(type(item_id))
+                )
+
+        # 全商品一覧にない商品は、ジャーナルにもモデルにも入れない
+        items = [None] * len(sales)
+        if self.catalog is not None:
+            items = [self.catalog.lookup(item_id) for customer_id, item_id in sales]
 
         # モデルの行数を取得
-        row_at_end = self.qt_model.rowCount()
+        row_at_end = self._source_model().rowCount()
+
+        # モデルを変更する前にジャーナルに記録する
+        if self.journal is not None:
+            self.journal.extend(
+                (row_at_end + offset, customer_id, item_id)
+                for offset, (customer_id, item_id) in enumerate(sales)
+            )
+
+        self._append_rows(row_at_end, sales, items)
+
+        return items
+
+    def replay_journal(self):
+        '''
+        ジャーナルに記録された追加のうち、まだモデルにない行を追加し直します。
+
+        ジャーナルの各記録は追加された行の番号を持っているため、
+        すでにモデルに含まれている（Excelファイルに保存済みの）行は読み飛ばされます。
+        追加し直す行は、add_items()と同じく1回でモデルに追加されます。
+
+        Return: int型 追加し直した行数
+        '''
+        if self.journal is None:
+            return 0
+
+        row_at_end = self._source_model().rowCount()
+        sales = []
+        for row, customer_id, item_id in self.journal.read():
+            if row < row_at_end + len(sales):
+                continue
+            sales.append((customer_id, item_id))
+
+        # ジャーナルには値段を記録していないため、引き直す。全商品一覧から消えた商品の値段は空のままにする
+        items = [None] * len(sales)
+        if self.catalog is not None:
+            for offset, (customer_id, item_id) in enumerate(sales):
+                try:
+                    items[offset] = self.catalog.lookup(item_id)
+                except UnknownItemException:
+                    pass
+
+        self._append_rows(row_at_end, sales, items)
+
+        return len(sales)
+
+    def _source_model(self):
+        '''
+        行を追加する先のモデルを返します。qt_modelがRelationProxyModelの場合は、その主モデルです。
+        '''
+        if isinstance(self.qt_model, RelationProxyModel):
+            return self.qt_model.main_model
+        return self.qt_model
+
+    def _append_rows(self, row_at_end, sales, items):
+        '''
+        モデルの末尾に (顧客番号, 商品番号) の行をまとめて追加します。ジャーナルには記録しません。
+
+        column_for_sale_priceが指定されている場合、itemsの (商品名, 値段) の値段も格納します。
 
-        # 顧客番号セルを作成
-        qt_customer_id = QStandardItem(customer_id)
-        # 商品番号セルを作成
-        qt_item_id = QStandardItem(item_id)
-        # セルをモデルに組み込む
-        self.qt_model.setItem(row_at_end, self.column_for_customer_id, qt_customer_id)
-        self.qt_model.setItem(row_at_end, self.column_for_item_id, qt_item_id)
+        SqliteTableModelのように行の追加を1回の操作で書き込めるモデル（append_rows()をもつモデル）では、
+        それを使います。QStandardItemModelでは、空の行を1回で挿入してからシグナルを止めてセルを入れ、
+        最後にそれらの行全体の dataChanged シグナルを1回だけ放出します。
+        '''
+        if not sales:
+            return
+
+        source_model = self._source_model()
+        rows = self._typed_rows(source_model, sales, items)
+
+        if hasattr(source_model, 'append_rows'):
+            number_of_columns = source_model.columnCount()
+            source_model.append_rows([
+                [values.get(column) for column in range(number_of_columns)] for values in rows
+            ])
+            return
+
+        columns = [self.column_for_customer_id, self.column_for_item_id]
+        if self.column_for_sale_price is not None:
+            columns.append(self.column_for_sale_price)
+
+        # 列が足りない場合は、シグナルを止める前に増やしておく
+        if source_model.columnCount() <= max(columns):
+            source_model.setColumnCount(max(columns) + 1)
+
+        source_model.insertRows(row_at_end, len(sales))
+
+        source_model.blockSignals(True)
+        try:
+            for offset, values in enumerate(rows):
+                # 顧客番号・商品番号・値段のセルを作成し、モデルに組み込む
+                for column, value in values.items():
+                    if value is not None:
+                        source_model.setItem(row_at_end + offset, column, create_item(value))
+        finally:
+            source_model.blockSignals(False)
+
+        source_model.dataChanged.emit(
+            source_model.index(row_at_end, min(columns)),
+            source_model.index(row_at_end + len(sales) - 1, max(columns))
+        )
+
+    def _typed_rows(self, source_model, sales, items):
+        '''
+        追加する行ごとの {列: 値} の辞書のリストを返します。値は列にすでにある値の型に揃えます。
+        '''
+        customer_id_type = find_column_type(source_model, self.column_for_customer_id)
+        item_id_type = find_column_type(source_model, self.column_for_item_id)
+
+        rows = []
+        for (customer_id, item_id), item in zip(sales, items):
+            values = {
+                self.column_for_customer_id: to_column_type(customer_id, customer_id_type),
+                self.column_for_item_id: to_column_type(item_id, item_id_type),
+            }
+            if self.column_for_sale_price is not None:
+                values[self.column_for_sale_price] = item[1] if item is not None else None
+            rows.append(values)
+        return rows
+
+def find_column_type(qt_model, column):
+    '''
+    列の最後の空でないセルのTYPED_VALUE_ROLEの値から、その列の型を返します。
+
+    シートから読み込んだ列の値はexcelio.infer_column_type()で推定した型に揃えられているため、
+    1つのセルの型が列の型になります。空の列の場合はNoneを返します。
+    '''
+    for row in range(qt_model.rowCount() - 1, -1, -1):
+        value = qt_model.data(qt_model.index(row, column), TYPED_VALUE_ROLE)
+        if value is not None:
+            return type(value)
+    return None
+
+def to_column_type(value, column_type):
+    '''
+    文字列の値を、表示用の文字列が変わらない範囲でcolumn_type型に変換します。
+
+    column_typeがNone（空の列）の場合は、Excelにその文字列を入力したときと同じく、整数として読める値を整数にします。
+    変換できない値や、変換すると表示用の文字列が変わる値（'007'など）は文字列のまま返します。
+
+    Parameters:
+    value -- str型 顧客番号や商品番号
+    column_type -- type型 列の型（int, float, str など）またはNone
+
+    Return: column_type型に変換した値、またはvalue
+        e.g. to_column_type('22072', int) -> 22072
+             to_column_type('22072', str) -> '22072'
+             to_column_type('A-1', int) -> 'A-1'
+    '''
+    if column_type not in (int, float, None):
+        return value
+
+    for number_type in (int, float):
+        if number_type is float and column_type is not float:
+            break
+        try:
+            number = number_type(value)
+        except (TypeError, ValueError):
+            continue
+        if str(number) == value:
+            return number
+    return value
+
+def find_closed_journals(journal_stem, partition):
+    '''
+    現在の区分以外の区分のジャーナルファイル「journal_stem.区分.journal」を探します。
+
+    Parameters:
+    journal_stem -- str型 区分と拡張子を除いたジャーナルファイルのファイル名
+    partition -- str型 現在の区分
+
+    Return: dict型 {区分: ジャーナルファイルのファイル名} からなる辞書
+    '''
+    directory, base_name = os.path.split(journal_stem)
+    prefix = base_name + '.'
+    closed_journals = {}
+    for name in os.listdir(directory or os.curdir):
+        if not name.startswith(prefix) or not name.endswith('.journal'):
+            continue
+        closed_partition = name[len(prefix):-len('.journal')]
+        if closed_partition != partition and is_partition(closed_partition):
+            closed_journals[closed_partition] = os.path.join(directory, name)
+    return closed_journals
 
 class Manager:
 
     '''
     全商品一覧と購入済み商品一覧を持っています。
 
-    このクラスはExcelQtConverterに対するラッパです。ExcelQtConverterに
-    一般性を持たせるために、会計簿管理に特化した機能はManagerクラスに分離されています。
+    読み書きは保存先（storage.Storage）を通して行われます。保存先はファイル名の拡張子から選ばれ、
+    Excelファイルの場合はstorage.ExcelStorage、SQLiteのデータベースの場合はstorage.SqliteStorageになります。
+    会計簿管理に特化した機能はManagerクラスに、ファイル形式に特化した機能は保存先に分離されています。
 
     Parameters:
-    file_name -- str型 エクセルファイルのファイル名
+    file_name -- str型 エクセルファイルまたはデータベースのファイル名
     sheet_name_for_all_items -- str型 全商品一覧を格納したシートの名前
     sheet_name_for_purchased_items -- str型 購入済み商品一覧を格納したシートの名前
+    read_only -- bool型 Trueの場合、必要なシートだけをストリーミングで読み込む
+                 （未指定の場合True）
+    journal_file_name -- str型 購入済み商品の追加を記録するジャーナルファイルのファイル名
+                         （未指定の場合、ファイル名の拡張子を .journal にしたもの。
+                         区分に分ける場合は .区分.journal にしたもので、ほかの区分のジャーナルは
+                         recover_closed_partitions()で書き戻された後に削除される）
+    storage -- storage.Storage型 保存先。指定した場合はfile_nameから選ばずにこれを使う
+               （未指定の場合None）
+    partition -- str型 購入済み商品一覧を日付の区分に分ける場合の、現在の区分。e.g. storage.today_partition()
+                 読み書きするのはこの区分だけで、ほかの区分はget_partition_model()で求められたときに
+                 読み取り専用で読み込まれる。storageを指定した場合は使われない（未指定の場合None）
+
+    Raises:
+    storage.StorageException -- partitionが'YYYY-MM-DD'形式でない場合
     '''
 
-    def __init__(self, file_name, sheet_name_for_all_items, sheet_name_for_purchased_items):
-        self.excel_handler = ExcelQtConverter(file_name)
+    def __init__(self, file_name, sheet_name_for_all_items, sheet_name_for_purchased_items,
+                 read_only=True, journal_file_name=None, storage=None, partition=None):
+        if storage is None:
+            storage = open_storage(
+                file_name,
+                sheet_name_for_all_items,
+                sheet_name_for_purchased_items,
+                read_only=read_only,
+                partition=partition
+            )
+        self.storage = storage
+
+        # 追加がその場で確実に保存される保存先では、ジャーナルは不要
+        self.journal = None
+
+        # {区分: ジャーナルファイルのファイル名} からなる、ほかの区分のジャーナルの辞書
+        self.closed_journal_file_names = {}
+
+        if not storage.durable_inserts:
+            if journal_file_name is None:
+                # ジャーナルの行番号は区分ごとのファイルの行番号なので、区分ごとに別のファイルにする
+                journal_file_name = os.path.splitext(file_name)[0]
+                if storage.partition is not None:
+                    self.closed_journal_file_names = find_closed_journals(
+                        journal_file_name, storage.partition
+                    )
+                    journal_file_name += '.' + storage.partition
+                journal_file_name += '.journal'
+            self.journal = SalesJournal(journal_file_name)
+
         self.sheet_name_for_all_items = sheet_name_for_all_items
         self.sheet_name_for_purchased_items = sheet_name_for_purchased_items
         self.all_item_model = None
+        self.item_catalog = None
+        self.item_search_model = None
         self.purchased_item_model = None
+        self.purchased_item_source_model = None
+        self.sales_totals = None
+        self.model_feeder = None
+
+        # 別のスレッドでの読み込みに失敗した場合の例外。失敗していなければNone
+        self.load_error = None
 
-    def init_purchased_item_model(self, column_for_customer_id, column_for_item_id):
+        # recover_closed_partitions()で {区分: 書き戻した行数}, {区分: 書き戻せなかった例外} からなる辞書
+        self.recovered_partitions = {}
+        self.recovery_errors = {}
+
+        # {区分: 読み込んだ購入済み商品一覧のモデル}, {区分: SalesTotals} からなる辞書
+        self.partition_models = {}
+        self.partition_totals = {}
+
+    def init_purchased_item_model(self, column_for_customer_id, column_for_item_id,
+                                  column_for_sale_price=None):
         '''
-        購入済み商品一覧をExcelファイルからQtモデルに変換します。
+        購入済み商品一覧を保存先からQtモデルに変換します。
 
         Parameters:
         column_for_customer_id -- int型 顧客番号を格納する列
         column_for_item_id -- int型 商品番号を格納する列
+        column_for_sale_price -- int型 追加した商品の値段を格納する列。Noneの場合は格納しない
+                                 （未指定の場合None）
+        '''
+        purchased_model = self.storage.load_purchased_item_model(
+            column_for_customer_id, column_for_item_id
+        )
+        self.set_purchased_item_model(
+            purchased_model, column_for_customer_id, column_for_item_id, column_for_sale_price
+        )
+        self.on_purchased_item_model_loaded()
+
+    def init_models_in_background(self, column_for_customer_id, column_for_item_id,
+                                  column_for_item_name=1, column_for_item_price=2,
+                                  column_for_sale_price=None):
+        '''
+        全商品一覧と購入済み商品一覧を、保存先から別のスレッドで読み込みます。
+
+        init_all_item_model()とinit_purchased_item_model()を続けて呼び出す代わりに使えます。
+        モデルはすぐに作られ、読み込んだ行が少しずつ追加されていくため、GUIは読み込みを待たずに表示できます。
+        購入済み商品一覧を読み込み終えるまで、get_purchased_item_model().add_item()はModelExceptionを送出します。
+        読み込みに失敗した場合、例外はload_errorに保持され、model_feeder.failedシグナルで通知されます。
+        書き戻しは始めず、add_item()はModelExceptionを送出し続けます。
+
+        Parameters:
+        column_for_customer_id -- int型 顧客番号を格納する列
+        column_for_item_id -- int型 商品番号を格納する列
+        column_for_item_name -- int型 全商品一覧の商品名を格納する列（未指定の場合1）
+        column_for_item_price -- int型 全商品一覧の値段を格納する列（未指定の場合2）
+        column_for_sale_price -- int型 購入済み商品一覧の、追加した商品の値段を格納する列。
+                                 Noneの場合は格納しない（未指定の場合None）
+        '''
+        all_model, purchased_model, model_feeder = self.storage.load_models_in_background(
+            column_for_customer_id, column_for_item_id
+        )
+        self.set_all_item_model(all_model, column_for_item_name, column_for_item_price)
+        self.set_purchased_item_model(
+            purchased_model, column_for_customer_id, column_for_item_id, column_for_sale_price
+        )
+
+        # 保存先によっては、すでに読み込み終えている
+        if model_feeder is None:
+            self.on_purchased_item_model_loaded()
+            return
+
+        self.purchased_item_model.loading = True
+        model_feeder.loaded.connect(self.on_purchased_item_model_loaded)
+        model_feeder.failed.connect(self.on_purchased_item_model_failed)
+        model_feeder.start()
+
+        # 読み込みが終わるまでModelFeederを破棄しない
+        self.model_feeder = model_feeder
+
+    def set_purchased_item_model(self, purchased_model, column_for_customer_id,
+                                 column_for_item_id, column_for_sale_price=None):
+        '''
+        購入済み商品一覧のQtモデルから、全商品一覧と結合したモデルと合計を作ります。
         '''
-        purchased_model = self.excel_handler.to_model(self.sheet_name_for_purchased_items)
+        self.purchased_item_source_model = purchased_model
 
         all_model = self.all_item_model
 
@@ -94,14 +566,157 @@ class Manager:
         self.purchased_item_model = PurchasedItemModelWrapper(
             joined_model, 
             column_for_customer_id, 
-            column_for_item_id
+            column_for_item_id,
+            journal=self.journal,
+            catalog=self.item_catalog,
+            column_for_sale_price=column_for_sale_price
         )
 
-    def init_all_item_model(self):
+        # 顧客ごとなどの合計は、購入済み商品一覧の変更を受けて1行ずつ更新される
+        if self.item_catalog is not None:
+            self.sales_totals = SalesTotals(
+                purchased_model, column_for_customer_id, column_for_item_id, self.item_catalog
+            )
+
+    def on_purchased_item_model_loaded(self):
+        '''
+        購入済み商品一覧を読み込み終えた後に呼び出され、変更の書き戻しとジャーナルの復元を始めます。
+
+        読み込み中のモデルを書き戻すとシートの行が失われるため、書き戻しは読み込み終えてから始めます。
+        '''
+        purchased_model = self.purchased_item_source_model
+
+        # 購入済み商品が追加・変更されたら、保存先に書き戻す
+        purchased_model.rowsInserted.connect(self.write_back_purchased_items)
+        purchased_model.dataChanged.connect(self.write_back_purchased_items)
+        self.purchased_item_model.loading = False
+
+        if self.journal is not None:
+            # 前回異常終了した場合に備え、保存されていない追加を復元する
+            self.purchased_item_model.replay_journal()
+
+            # 保存が終われば、それまでのジャーナルの記録は不要になる
+            self.storage.add_save_listener(self.journal.truncate)
+
+            # 前回までの区分で異常終了していた場合は、その区分のファイルに書き戻す
+            self.recover_closed_partitions()
+
+    def recover_closed_partitions(self):
         '''
-        全商品一覧をExcelファイルからQtモデルに変換します。
+        ほかの区分のジャーナルに残っている、保存されていない追加をその区分のファイルに書き戻し、ジャーナルを削除します。
+
+        ジャーナルは保存が終わるたびに空になるため、空でないジャーナルはその区分を保存する前に異常終了したことを表します
+        （ある日に電源が切れ、次の日に起動した場合など）。記録は現在の区分と同じくreplay_journal()で追加し直され、
+        その場で保存されます。値段は現在の全商品一覧から引き直します。
+        書き戻せなかった区分のジャーナルは次の起動で書き戻せるよう残し、例外をrecovery_errorsに保持します。
+        購入済み商品一覧を読み込み終えた後に呼び出されます。
+
+        Return: dict型 {区分: 書き戻した行数} からなる辞書。書き戻す行がなかった区分は含まない
+        '''
+        recovered_partitions = {}
+        for partition, journal_file_name in sorted(self.closed_journal_file_names.items()):
+            try:
+                number_of_rows = self.recover_partition(partition, journal_file_name)
+                os.remove(journal_file_name)
+            except Exception as exception:
+                self.recovery_errors[partition] = exception
+                continue
+            if number_of_rows:
+                recovered_partitions[partition] = number_of_rows
+
+        self.closed_journal_file_names = {}
+        self.recovered_partitions.update(recovered_partitions)
+        return recovered_partitions
+
+    def recover_partition(self, partition, journal_file_name):
+        '''
+        区分のジャーナルに記録された追加のうち、まだその区分のファイルにない行を書き戻して保存します。
+
+        Parameters:
+        partition -- str型 区分
+        journal_file_name -- str型 区分のジャーナルファイルのファイル名
+
+        Return: int型 書き戻した行数
+        '''
+        if os.path.getsize(journal_file_name) == 0:
+            return 0
+
+        wrapper = self.purchased_item_model
+        journal = SalesJournal(journal_file_name)
+        try:
+            partition_storage = self.storage.open_partition(partition)
+            partition_model = partition_storage.load_purchased_item_model(
+                wrapper.column_for_customer_id, wrapper.column_for_item_id
+            )
+            number_of_rows = PurchasedItemModelWrapper(
+                partition_model,
+                wrapper.column_for_customer_id,
+                wrapper.column_for_item_id,
+                journal=journal,
+                catalog=self.item_catalog,
+                column_for_sale_price=wrapper.column_for_sale_price
+            ).replay_journal()
+            if number_of_rows:
+                partition_storage.save_purchased_item_model(partition_model)
+                partition_storage.flush()
+        finally:
+            journal.close()
+        return number_of_rows
+
+    def on_purchased_item_model_failed(self, exception):
         '''
-        self.all_item_model = self.excel_handler.to_model(self.sheet_name_for_all_items)
+        別のスレッドでの読み込みに失敗した後に呼び出されます。
+
+        途中まで読み込んだモデルを書き戻すとシートの行が失われるため、書き戻しは始めず、商品も追加できないままにします。
+        '''
+        self.load_error = exception
+        self.purchased_item_model.loading = False
+        self.purchased_item_model.load_error = exception
+
+    def write_back_purchased_items(self, *args):
+        '''
+        購入済み商品一覧の変更を保存先に書き戻します。
+
+        Excelファイルへの保存はExcelQtConverterのタイマーでまとめて行われます。
+        '''
+        self.storage.save_purchased_item_model(self.purchased_item_source_model)
+
+    def init_all_item_model(self, column_for_item_name=1, column_for_item_price=2):
+        '''
+        全商品一覧を保存先からQtモデルに変換し、商品番号（0列目）の索引を作ります。
+
+        Parameters:
+        column_for_item_name -- int型 商品名を格納する列（未指定の場合1）
+        column_for_item_price -- int型 値段を格納する列（未指定の場合2）
+        '''
+        self.set_all_item_model(
+            self.storage.load_all_item_model(), column_for_item_name, column_for_item_price
+        )
+
+    def set_all_item_model(self, all_model, column_for_item_name, column_for_item_price):
+        '''
+        全商品一覧のQtモデルを設定し、商品番号（0列目）の索引を作ります。
+        '''
+        self.all_item_model = all_model
+        self.item_catalog = ItemCatalog(
+            self.all_item_model, 0, column_for_item_name, column_for_item_price
+        )
+        self.item_search_model = None
+
+    def lookup_item(self, item_id):
+        '''
+        商品番号から商品名と値段を引きます。init_all_item_model()の後で呼び出してください。
+
+        Parameters:
+        item_id -- str型 商品番号
+
+        Return: (商品名, 値段) のタプル
+            e.g. ('衣装ケース08', 200)
+
+        Raises:
+        UnknownItemException -- 全商品一覧にない商品番号の場合
+        '''
+        return self.item_catalog.lookup(item_id)
 
     def get_purchased_item_model(self):
         '''
@@ -109,8 +724,88 @@ class Manager:
         '''
         return self.purchased_item_model
 
+    def get_sales_totals(self):
+        '''
+        顧客ごと・商品ごと・グループごとの合計（totals.SalesTotals）を返します。
+        '''
+        return self.sales_totals
+
+    def list_partitions(self):
+        '''
+        保存先にある購入済み商品一覧の区分のリストを、古い順に返します。
+
+        区分に分けていない場合は空のリストを返します。
+        '''
+        return self.storage.list_partitions()
+
+    def get_partition_model(self, partition, column_for_customer_id=0, column_for_item_id=1):
+        '''
+        購入済み商品一覧の区分を読み取り専用のモデルとして返します。
+
+        区分は初めて求められたときに保存先から読み込まれ、release_partitions()を呼び出すまで保持されます。
+        現在の区分の変更はこのモデルに反映されないため、現在の区分にはget_purchased_item_model()を使ってください。
+
+        Parameters:
+        partition -- str型 区分。list_partitions()が返す値のいずれか
+        column_for_customer_id -- int型 顧客番号を格納する列（未指定の場合0）
+        column_for_item_id -- int型 商品番号を格納する列（未指定の場合1）
+
+        Raises:
+        storage.StorageException -- 保存先にない区分の場合
+        '''
+        qt_model = self.partition_models.get(partition)
+        if qt_model is None:
+            qt_model = self.storage.load_partition_model(
+                partition, column_for_customer_id, column_for_item_id
+            )
+            self.partition_models[partition] = qt_model
+        return qt_model
+
+    def get_partition_totals(self, partition, column_for_customer_id=0, column_for_item_id=1):
+        '''
+        購入済み商品一覧の区分の、顧客ごと・商品ごと・グループごとの合計（totals.SalesTotals）を返します。
+        init_all_item_model()の後で呼び出してください。
+
+        Parameters:
+        get_partition_model()と同じ
+        '''
+        sales_totals = self.partition_totals.get(partition)
+        if sales_totals is None:
+            sales_totals = SalesTotals(
+                self.get_partition_model(partition, column_for_customer_id, column_for_item_id),
+                column_for_customer_id,
+                column_for_item_id,
+                self.item_catalog
+            )
+            self.partition_totals[partition] = sales_totals
+        return sales_totals
+
+    def release_partitions(self):
+        '''
+        get_partition_model()で読み込んだ区分のモデルと合計を手放します。再び求められると読み込み直します。
+
+        合計は全商品一覧のシグナルから切断されるため、手放した後は更新されず、メモリからも解放されます。
+        '''
+        for sales_totals in self.partition_totals.values():
+            sales_totals.close()
+        self.partition_models.clear()
+        self.partition_totals.clear()
+
     def get_all_item_model(self):
         '''
         全商品一覧を返します。
         '''
-        return self.all_item_model
\ No newline at end of file
+        return self.all_item_model
+
+    def get_item_search_model(self):
+        '''
+        全商品一覧を商品番号（前方一致）と商品名（部分一致）で絞り込めるモデル
+        （search_index.ItemSearchProxyModel）を返します。init_all_item_model()の後で呼び出してください。
+        '''
+        if self.item_search_model is None:
+            self.item_search_model = ItemSearchProxyModel(
+                self.all_item_model,
+                (self.item_catalog.column_for_item_id,),
+                (self.item_catalog.column_for_item_name,)
+            )
+        return self.item_search_model
\ No newline at end of file
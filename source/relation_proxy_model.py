@@ -2,7 +2,22 @@
 PyQtで2つのQAbstractItemModelを結合するためのモジュールです。
 '''
 
-from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+import bisect
+import instrumentation
+from PyQt5.QtCore import QAbstractItemModel, QCoreApplication, QModelIndex, Qt, QTimer
+
+# 副モデルに同じキーをもつ行が複数ある場合の扱い
+DUPLICATES_FIRST = 'first'      # 最初の行と結合する
+DUPLICATES_LAST = 'last'        # 最後の行と結合する
+DUPLICATES_ERROR = 'error'      # RelationProxyModelExceptionを送出する
+DUPLICATES_FAN_OUT = 'fanout'   # 該当する行ごとにプロキシモデルの行を作る
+
+# 一度に放出する dataChanged シグナルの範囲の数の上限。
+# 変更された行がこれより多くの範囲に散らばっている場合は、それらを包む1つの範囲として放出します。
+MAX_DATA_CHANGED_RANGES = 8
+
+class RelationProxyModelException(Exception):
+    pass
 
 class RelationProxyModel(QAbstractItemModel):
 
@@ -14,34 +29,80 @@ class RelationProxyModel(QAbstractItemModel):
     Parameters:
     main_model -- QAbstractItemModel型 主モデルとして使うモデル。
     main_column -- int型 主モデルにおける、結合に利用するキーが入っている列の番号。
+                   複数の列の組をキーにする場合は、列の番号のタプル。
     sub_model -- QAbstractItemModel型 副モデルとして使うモデル。
     main_column -- int型 副モデルにおける、結合に利用するキーが入っている列の番号。
+                   複数の列の組をキーにする場合は、列の番号のタプル。
+    duplicates -- str型 副モデルに同じキーをもつ行が複数ある場合の扱い。
+                  DUPLICATES_FIRST, DUPLICATES_LAST, DUPLICATES_ERROR, DUPLICATES_FAN_OUT
+                  のいずれか（未指定の場合DUPLICATES_FIRST）
+    coalesce -- bool型 Trueの場合、イベントループの1周の間に起きたソースモデルの変更をまとめ、
+                最小限の連続した範囲の dataChanged シグナルとして放出する（未指定の場合False）
     '''
 
-    def __init__(self, main_model, main_column, sub_model, sub_column):
+    def __init__(self, main_model, main_column, sub_model, sub_column,
+                 duplicates=DUPLICATES_FIRST, coalesce=False):
         super().__init__()
         self.main_model = main_model
         self.sub_model = sub_model
         self.main_column = main_column
         self.sub_column = sub_column
 
-        self.mapper = Mapper(main_model, main_column, sub_model, sub_column, self)
+        self.mapper = Mapper(main_model, main_column, sub_model, sub_column, self, duplicates)
+
+        # 行数・列数と、プロキシモデルの列ごとの参照先 (サブモデルの列ならTrue, ソースモデルの列番号)
+        # はキャッシュされ、行・列の構造が変わるシグナルを受けたときにだけ作り直されます。
+        self.number_of_rows = None
+        self.number_of_columns = None
+        self.column_routes = None
+        self.refresh_shape()
+
+        # coalesce=True の場合に、まだ放出していない変更された行と列の範囲
+        self.coalesce = coalesce
+        self.pending_rows = set()
+        self.pending_columns = None
+        self.data_changed_timer = None
 
         # メインモデルの発するシグナルを捕捉し自分自身から対応するシグナルを発します。
-        self.main_model.rowsAboutToBeInserted.connect(self.beginInsertRows)
-        self.main_model.rowsInserted.connect(self.endInsertRows)
-        self.main_model.dataChanged.connect(self.emit_data_changed)
+        # 行や列の構造が変わる場合は、対応表を更新してから end～() を呼び出します。
+        self.main_model.rowsAboutToBeInserted.connect(self.on_main_rows_about_to_be_inserted)
+        self.main_model.rowsInserted.connect(self.on_main_rows_inserted)
+        self.main_model.rowsAboutToBeRemoved.connect(self.on_main_rows_about_to_be_removed)
+        self.main_model.rowsRemoved.connect(self.on_main_rows_removed)
+        self.main_model.rowsAboutToBeMoved.connect(self.on_main_rows_about_to_be_moved)
+        self.main_model.rowsMoved.connect(self.on_main_rows_moved)
+        self.main_model.columnsAboutToBeInserted.connect(self.on_main_columns_about_to_be_inserted)
+        self.main_model.columnsInserted.connect(self.on_main_columns_inserted)
+        self.main_model.modelAboutToBeReset.connect(self.begin_reset)
+        self.main_model.modelReset.connect(
+            instrumentation.counting_slot('メインモデルのmodelReset', self.on_model_reset)
+        )
+        self.main_model.dataChanged.connect(self.on_main_data_changed)
 
 
         # サブモデルの発するシグナルを補足し自分自身から対応するシグナルを発します。
-        self.sub_model.dataChanged.connect(self.emit_data_changed)
+        # サブモデルの行の増減はプロキシモデルの行数を変えないため、結合先が変わった行の
+        # dataChanged シグナルとして放出します。
+        self.sub_model.rowsAboutToBeInserted.connect(self.on_sub_rows_about_to_be_changed)
+        self.sub_model.rowsInserted.connect(self.on_sub_rows_inserted)
+        self.sub_model.rowsAboutToBeRemoved.connect(self.on_sub_rows_about_to_be_changed)
+        self.sub_model.rowsRemoved.connect(self.on_sub_rows_removed)
+        self.sub_model.rowsAboutToBeMoved.connect(self.on_sub_rows_about_to_be_changed)
+        self.sub_model.rowsMoved.connect(self.on_sub_rows_moved)
+        self.sub_model.columnsAboutToBeInserted.connect(self.on_sub_columns_about_to_be_inserted)
+        self.sub_model.columnsInserted.connect(self.on_sub_columns_inserted)
+        self.sub_model.modelAboutToBeReset.connect(self.begin_reset)
+        self.sub_model.modelReset.connect(
+            instrumentation.counting_slot('サブモデルのmodelReset', self.on_model_reset)
+        )
+        self.sub_model.dataChanged.connect(self.on_sub_data_changed)
 
 
 
     def __getattr__(self, name):
         '''
         存在しない属性が呼び出された場合に呼び出されるメソッドです。
-        
+
         主モデルの属性を探索します。
         '''
         return getattr(self.main_model, name)
@@ -50,22 +111,353 @@ class RelationProxyModel(QAbstractItemModel):
         '''
         ソースモデルの dataChanged シグナルが放出された場合に呼び出され、self.dataChanged シグナルを放出します。
 
-        self.__init__内でソースモデルの dataChanged シグナルにconnectされる必要があります。
+        サブモデルの行の変更は、その行を参照するすべてのメインの行に伝えられます。
 
         Parameters:
         topleft -- QAbstractItemModel.dataChanged() のtopLeft引数を参照。
         bottomright -- QAbstractItemModel.dataChanged() のbottomRight引数を参照。
         '''
-        redirected_topleft = self.mapper.from_source(topleft)
-        redirected_bottomright = self.mapper.from_source(bottomright)
-        self.dataChanged.emit(redirected_topleft, redirected_bottomright)
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+
+        if topleft.model() == self.main_model:
+            proxy_rows = self.mapper.proxy_rows_for_main_rows(topleft.row(), bottomright.row())
+            first_column = topleft.column()
+            last_column = bottomright.column()
+        else:
+            proxy_rows = self.mapper.proxy_rows_for_sub_rows(topleft.row(), bottomright.row())
+            first_column = topleft.column() + self.mapper.number_of_main_columns
+            last_column = bottomright.column() + self.mapper.number_of_main_columns
+
+        self.queue_data_changed(proxy_rows, first_column, last_column)
+
+    def queue_data_changed(self, proxy_rows, first_column, last_column):
+        '''
+        プロキシモデルの行の変更を dataChanged シグナルとして放出します。
+
+        coalesce=True の場合は、イベントループに戻るまで放出を遅らせ、その間の変更をまとめます。
+
+        Parameters:
+        proxy_rows -- iterable型 変更されたプロキシモデルの行
+        first_column -- int型 変更された最初の列
+        last_column -- int型 変更された最後の列
+        '''
+        proxy_rows = set(proxy_rows)
+        if not proxy_rows:
+            return
+
+        if not self.coalesce:
+            self.emit_row_ranges(proxy_rows, first_column, last_column)
+            return
+
+        self.pending_rows |= proxy_rows
+        if self.pending_columns is None:
+            self.pending_columns = (first_column, last_column)
+        else:
+            self.pending_columns = (
+                min(self.pending_columns[0], first_column),
+                max(self.pending_columns[1], last_column)
+            )
+        self.schedule_data_changed()
+
+    def schedule_data_changed(self):
+        '''
+        flush_data_changed()をイベントループの次の周回に予約します。
+
+        イベントループがない（QCoreApplicationが存在しない）場合は、その場で放出します。
+        '''
+        if QCoreApplication.instance() is None:
+            self.flush_data_changed()
+            return
+
+        if self.data_changed_timer is None:
+            self.data_changed_timer = QTimer()
+            self.data_changed_timer.setSingleShot(True)
+            self.data_changed_timer.setInterval(0)
+            self.data_changed_timer.timeout.connect(self.flush_data_changed)
+
+        if not self.data_changed_timer.isActive():
+            self.data_changed_timer.start()
+
+    def flush_data_changed(self):
+        '''
+        まだ放出していない変更を dataChanged シグナルとして放出します。
+
+        行や列の構造が変わると行番号がずれるため、構造の変更を始める前にも呼び出されます。
+        '''
+        if self.data_changed_timer is not None:
+            self.data_changed_timer.stop()
+        if not self.pending_rows:
+            return
+
+        proxy_rows = self.pending_rows
+        first_column, last_column = self.pending_columns
+        self.pending_rows = set()
+        self.pending_columns = None
+
+        self.emit_row_ranges(proxy_rows, first_column, last_column)
+
+    def emit_row_ranges(self, proxy_rows, first_column, last_column):
+        '''
+        変更された行を連続した範囲にまとめ、範囲ごとに dataChanged シグナルを放出します。
+
+        範囲の数が MAX_DATA_CHANGED_RANGES を超える場合は、それらを包む1つの範囲として放出します。
+        '''
+        row_ranges = to_contiguous_ranges(sorted(proxy_rows))
+        if len(row_ranges) > MAX_DATA_CHANGED_RANGES:
+            row_ranges = [(row_ranges[0][0], row_ranges[-1][1])]
+
+        for first_row, last_row in row_ranges:
+            self.dataChanged.emit(
+                self.index(first_row, first_column),
+                self.index(last_row, last_column)
+            )
+
+    def begin_reset(self):
+        '''
+        プロキシモデルのリセットを開始します。リセットですべての行が更新されるため、
+        まだ放出していない変更は捨てられます。
+        '''
+        if self.data_changed_timer is not None:
+            self.data_changed_timer.stop()
+        self.pending_rows = set()
+        self.pending_columns = None
+        self.beginResetModel()
+
+    def on_main_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        メインモデルの dataChanged シグナルにconnectされます。
+
+        キーの列が変更された場合は、対応表を更新してから結合先が変わった行も通知します。
+        '''
+        if not self.mapper.is_main_key_changed(topleft, bottomright):
+            self.emit_data_changed(topleft, bottomright)
+            return
+
+        if self.mapper.fan_out:
+            self.begin_reset()
+            self.mapper.update_main_keys(topleft.row(), bottomright.row())
+            self.mapper.refresh_fan_out_rows()
+            self.refresh_shape()
+            self.endResetModel()
+            return
+
+        relinked_main_rows = self.mapper.update_main_keys(topleft.row(), bottomright.row())
+        self.emit_data_changed(topleft, bottomright)
+        self.emit_sub_rows_relinked(relinked_main_rows)
+
+    def on_sub_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        サブモデルの dataChanged シグナルにconnectされます。
+
+        キーの列が変更された場合は、対応表を更新してから結合先が変わった行を通知します。
+        '''
+        if not self.mapper.is_sub_key_changed(topleft, bottomright):
+            self.emit_data_changed(topleft, bottomright)
+            return
+
+        if self.mapper.fan_out:
+            self.begin_reset()
+            self.mapper.update_sub_keys(topleft.row(), bottomright.row())
+            self.mapper.refresh_fan_out_rows()
+            self.refresh_shape()
+            self.endResetModel()
+            return
+
+        self.emit_sub_rows_relinked(
+            self.mapper.update_sub_keys(topleft.row(), bottomright.row())
+        )
+
+    def on_main_rows_about_to_be_inserted(self, parent, first, last):
+        '''
+        メインモデルの rowsAboutToBeInserted シグナルにconnectされます。
+        '''
+        if self.mapper.fan_out:
+            self.begin_reset()
+        else:
+            self.flush_data_changed()
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def on_main_rows_inserted(self, parent, first, last):
+        '''
+        メインモデルの rowsInserted シグナルにconnectされます。
+        '''
+        self.mapper.insert_main_rows(first, last)
+        self.end_structure_change(self.endInsertRows)
+
+    def on_main_rows_about_to_be_removed(self, parent, first, last):
+        '''
+        メインモデルの rowsAboutToBeRemoved シグナルにconnectされます。
+        '''
+        if self.mapper.fan_out:
+            self.begin_reset()
+        else:
+            self.flush_data_changed()
+            self.beginRemoveRows(QModelIndex(), first, last)
+
+    def on_main_rows_removed(self, parent, first, last):
+        '''
+        メインモデルの rowsRemoved シグナルにconnectされます。
+        '''
+        self.mapper.remove_main_rows(first, last)
+        self.end_structure_change(self.endRemoveRows)
+
+    def on_main_rows_about_to_be_moved(self, parent, start, end, destination, row):
+        '''
+        メインモデルの rowsAboutToBeMoved シグナルにconnectされます。
+        '''
+        if self.mapper.fan_out:
+            self.begin_reset()
+        else:
+            self.flush_data_changed()
+            self.beginMoveRows(QModelIndex(), start, end, QModelIndex(), row)
+
+    def on_main_rows_moved(self, parent, start, end, destination, row):
+        '''
+        メインモデルの rowsMoved シグナルにconnectされます。
+        '''
+        self.mapper.move_main_rows(start, end, row)
+        self.end_structure_change(self.endMoveRows)
+
+    def on_main_columns_about_to_be_inserted(self, parent, first, last):
+        '''
+        メインモデルの columnsAboutToBeInserted シグナルにconnectされます。
+        '''
+        self.flush_data_changed()
+        self.beginInsertColumns(QModelIndex(), first, last)
+
+    def on_main_columns_inserted(self, parent, first, last):
+        '''
+        メインモデルの columnsInserted シグナルにconnectされます。
+        '''
+        self.mapper.insert_main_columns(first, last)
+        self.main_column = self.mapper.main_column
+        self.refresh_shape()
+        self.endInsertColumns()
+
+    def on_sub_columns_about_to_be_inserted(self, parent, first, last):
+        '''
+        サブモデルの columnsAboutToBeInserted シグナルにconnectされます。
+        '''
+        self.flush_data_changed()
+        main_columns = self.mapper.number_of_main_columns
+        self.beginInsertColumns(QModelIndex(), first + main_columns, last + main_columns)
+
+    def on_sub_columns_inserted(self, parent, first, last):
+        '''
+        サブモデルの columnsInserted シグナルにconnectされます。
+        '''
+        self.mapper.insert_sub_columns(first, last)
+        self.sub_column = self.mapper.sub_column
+        self.refresh_shape()
+        self.endInsertColumns()
+
+    def on_sub_rows_about_to_be_changed(self, *args):
+        '''
+        サブモデルの rowsAboutToBeInserted・rowsAboutToBeRemoved・rowsAboutToBeMoved
+        シグナルにconnectされます。
+
+        DUPLICATES_FAN_OUT の場合はプロキシモデルの行数が変わりうるため、リセットを開始します。
+        '''
+        if self.mapper.fan_out:
+            self.begin_reset()
+
+    def on_sub_rows_inserted(self, parent, first, last):
+        '''
+        サブモデルの rowsInserted シグナルにconnectされます。
+        '''
+        self.end_sub_structure_change(self.mapper.insert_sub_rows(first, last))
+
+    def on_sub_rows_removed(self, parent, first, last):
+        '''
+        サブモデルの rowsRemoved シグナルにconnectされます。
+        '''
+        self.end_sub_structure_change(self.mapper.remove_sub_rows(first, last))
+
+    def on_sub_rows_moved(self, parent, start, end, destination, row):
+        '''
+        サブモデルの rowsMoved シグナルにconnectされます。
+        '''
+        self.end_sub_structure_change(self.mapper.move_sub_rows(start, end, row))
+
+    def on_model_reset(self):
+        '''
+        メインモデル・サブモデルの modelReset シグナルにconnectされます。
+        '''
+        self.mapper.count_main_columns()
+        self.mapper.refresh_map()
+        self.refresh_shape()
+        self.endResetModel()
+
+    def end_structure_change(self, end):
+        '''
+        メインモデルの行の構造の変更を終えます。
+
+        DUPLICATES_FAN_OUT の場合はプロキシモデルの行を作り直してリセットを終え、
+        それ以外の場合はendを呼び出します。
+
+        Parameters:
+        end -- endInsertRows などの、構造の変更を終えるメソッド
+        '''
+        if self.mapper.fan_out:
+            self.mapper.refresh_fan_out_rows()
+            self.refresh_shape()
+            self.endResetModel()
+        else:
+            self.refresh_shape()
+            end()
+
+    def end_sub_structure_change(self, relinked_main_rows):
+        '''
+        サブモデルの行の構造の変更を終えます。
+
+        Parameters:
+        relinked_main_rows -- iterable型 結合先が変わったメインの行
+        '''
+        if self.mapper.fan_out:
+            self.mapper.refresh_fan_out_rows()
+            self.refresh_shape()
+            self.endResetModel()
+        else:
+            self.emit_sub_rows_relinked(relinked_main_rows)
+
+    def refresh_shape(self):
+        '''
+        キャッシュされた行数・列数と、列ごとの参照先を作り直します。
+        '''
+        main_columns = self.main_model.columnCount()
+        sub_columns = self.sub_model.columnCount()
+
+        self.column_routes = (
+            [(False, column) for column in range(main_columns)]
+            + [(True, column) for column in range(sub_columns)]
+        )
+        self.number_of_columns = main_columns + sub_columns
+
+        if self.mapper.fan_out:
+            self.number_of_rows = len(self.mapper.fan_out_rows)
+        else:
+            self.number_of_rows = self.main_model.rowCount()
+
+    def emit_sub_rows_relinked(self, main_rows):
+        '''
+        結合先のサブの行が変わったメインの行について、サブモデル部分の dataChanged シグナルを放出します。
+
+        Parameters:
+        main_rows -- iterable型 結合先が変わったメインの行
+        '''
+        self.queue_data_changed(
+            main_rows,
+            self.mapper.number_of_main_columns,
+            self.number_of_columns - 1
+        )
 
     def index(self, row, column, parent=QModelIndex()):
         '''
         QAbstractItemModel.index()の実装です。
         '''
         # 引数が範囲内ならば有効なインデックスを返す
-        if column < self.columnCount() and row < self.rowCount():
+        if 0 <= column < self.number_of_columns and 0 <= row < self.number_of_rows:
             return self.createIndex(row, column, None)
 
         # 範囲外なら無効なインデックスを返す
@@ -76,13 +468,13 @@ class RelationProxyModel(QAbstractItemModel):
         '''
         QAbstractItemModel.index()の実装です。
         '''
-        return self.main_model.columnCount() + self.sub_model.columnCount()
+        return self.number_of_columns
 
     def rowCount(self, parent=QModelIndex()):
         '''
         QAbstractItemModel.index()の実装です。
         '''
-        return self.main_model.rowCount()
+        return self.number_of_rows
 
     def parent(self, child):
         '''
@@ -94,73 +486,527 @@ class RelationProxyModel(QAbstractItemModel):
         '''
         メインモデルの範囲外のインデックスをもつアイテムへの参照をサブモデルにリダイレクトします。
         QAbstractItemModel.data()の実装です。
-        '''
 
-        redirected_index = self.mapper.to_source(index)
-        if not redirected_index.isValid():
+        ビューの再描画のたびに呼ばれるため、Mapper.to_source()を経由せず、
+        列ごとの参照先と対応表を直接引きます。
+        '''
+        if not index.isValid():
             return None
 
-        if redirected_index.model() == self.main_model:
-            return self.main_model.data(redirected_index, role)
+        is_sub_column, source_column = self.column_routes[index.column()]
+        mapper = self.mapper
+
+        if mapper.fan_out:
+            main_row, sub_row = mapper.fan_out_rows[index.row()]
         else:
-            return self.sub_model.data(redirected_index, role)
+            main_row = index.row()
+            sub_row = mapper.main_sub_map.get(main_row) if is_sub_column else None
+
+        if is_sub_column:
+            if sub_row is None:
+                return None
+            return self.sub_model.data(self.sub_model.index(sub_row, source_column), role)
+        return self.main_model.data(self.main_model.index(main_row, source_column), role)
+
+    def column_values(self, column, role=Qt.DisplayRole):
+        '''
+        column列目の値を、data()と同じ形でまとめてリストにして返します。
+
+        ソースモデルの列をread_column()でまとめて取り出し、対応表で並べ替えます。
+        属性の探索が主モデルに及んで、主モデルのcolumn_values()が呼ばれることはありません。
+
+        Parameters:
+        column -- int型 列番号
+        role -- Qt.ItemDataRole型 data()のroleと同じ（未指定の場合Qt.DisplayRole）
+
+        Return: list型
+        '''
+        if not 0 <= column < self.number_of_columns:
+            return [None] * self.number_of_rows
+
+        is_sub_column, source_column = self.column_routes[column]
+        mapper = self.mapper
+
+        if not is_sub_column:
+            values = read_column(self.main_model, source_column, role)
+            if mapper.fan_out:
+                return [values[main_row] for main_row, sub_row in mapper.fan_out_rows]
+            return values
+
+        values = read_column(self.sub_model, source_column, role)
+        if mapper.fan_out:
+            sub_rows = [sub_row for main_row, sub_row in mapper.fan_out_rows]
+        else:
+            sub_rows = [mapper.main_sub_map.get(main_row) for main_row in range(self.number_of_rows)]
+        return [None if sub_row is None else values[sub_row] for sub_row in sub_rows]
 
 class Mapper:
     '''
     メインモデル・サブモデルとプロキシモデルの対応付けを行います。
+
+    対応表はソースモデルの変更に合わせて、変更のあった行の分だけ更新されます。
+    サブモデルのキーの索引（{キーの値: 行のリスト}）は一度だけ作られるため、
+    キーが複数の列の組であっても、メインの1行の対応付けは定数時間で行われます。
+
+    DUPLICATES_FAN_OUT の場合、main_sub_map の値はサブの該当行のタプルになり、
+    プロキシモデルの行は fan_out_rows に (メインの行, サブの行) の組として並びます。
     '''
-    def __init__(self, main_model, main_column, sub_model, sub_column, proxy_model):
+    def __init__(self, main_model, main_column, sub_model, sub_column, proxy_model,
+                 duplicates=DUPLICATES_FIRST):
+        if duplicates not in (DUPLICATES_FIRST, DUPLICATES_LAST, DUPLICATES_ERROR,
+                              DUPLICATES_FAN_OUT):
+            raise RelationProxyModelException(
+                '重複の扱い {!r} には対応していません'.format(duplicates)
+            )
+
         self.main_model = main_model
         self.sub_model = sub_model
         self.main_column = main_column
         self.sub_column = sub_column
         self.proxy_model = proxy_model
+        self.duplicates = duplicates
+        self.fan_out = duplicates == DUPLICATES_FAN_OUT
 
+        # キーに使う列の番号のタプル
+        self.main_key_columns = to_key_columns(main_column)
+        self.sub_key_columns = to_key_columns(sub_column)
+
+        # main_sub_map は {メインの行: サブの該当行} からなる辞書
+        # sub_main_map は {サブの行: その行を参照するメインの行の集合} からなる辞書
         self.main_sub_map = None
         self.sub_main_map = None
         self.number_of_main_columns = None
 
+        # 各行のキーの値と、{キーの値: 行} の索引
+        # main_key_rows の値は行の集合、sub_key_rows の値は昇順に並んだ行のリスト
+        self.main_keys = None
+        self.sub_keys = None
+        self.main_key_rows = None
+        self.sub_key_rows = None
+
+        # DUPLICATES_FAN_OUT の場合の、プロキシモデルの各行に対応する (メインの行, サブの行) と、
+        # 各メインの行に対応する最初のプロキシモデルの行
+        self.fan_out_rows = None
+        self.fan_out_offsets = None
+
         self.refresh_map()
         self.count_main_columns()
 
-        # ソースモデルのデータに変更があった場合に、メイン・サブ対応表を作り直します。
-        self.main_model.dataChanged.connect(self.refresh_map)
-        self.sub_model.dataChanged.connect(self.refresh_map)
-
     def refresh_map(self):
         '''
-        self.main_sub_mapを作ります。
+        self.main_sub_mapとself.sub_main_mapを作り直します。
         main_sub_mapはmain_modelの行:sub_modelの該当行 からなる辞書です。
         '''
-        number_of_rows_for_main_model = self.main_model.rowCount()
+        self.main_keys = read_keys(self.main_model, self.main_key_columns)
+        self.sub_keys = read_keys(self.sub_model, self.sub_key_columns)
 
-        value_row_map = map_value_to_row(self.sub_model, self.sub_column)
+        self.main_key_rows = group_rows_by_value(self.main_keys, set)
+        self.sub_key_rows = group_rows_by_value(self.sub_keys, list)
 
-        main_sub_map = {}
+        if self.duplicates == DUPLICATES_ERROR:
+            for sub_value, sub_rows in self.sub_key_rows.items():
+                if len(sub_rows) > 1 and not is_empty_key(sub_value):
+                    raise_duplicate_key(sub_value)
 
-        for main_row in range(0, number_of_rows_for_main_model):
-            main_index = self.main_model.index(main_row, self.main_column)
-            main_value = self.main_model.data(main_index)
-            if not main_value:
-                continue
-            try:
-                sub_row = value_row_map[main_value]
-            except KeyError:
-                pass
-            else:
-                main_sub_map[main_row] = sub_row
-
-        self.main_sub_map = main_sub_map
-        self.sub_main_map = self.get_reversed_map()
+        self.relink_all_main_rows()
 
     def get_reversed_map(self):
         '''
         self.main_sub_mapの値とキーを逆にします。
 
         subの行番号からメインの該当行の番号を知りたいときに使ってください。
+        1つのサブの行を複数のメインの行が参照することがあるため、値は行の集合になります。
         Return: dict型
         '''
-        return {value: key for key, value in self.main_sub_map.items()}
+        reversed_map = {}
+        for main_row, sub_rows in self.main_sub_map.items():
+            for sub_row in as_tuple(sub_rows):
+                reversed_map.setdefault(sub_row, set()).add(main_row)
+        return reversed_map
+
+    def select_sub_rows(self, main_value):
+        '''
+        キーの値がmain_valueであるサブの行のうち、結合するものを返します。
+
+        Return: 行のリスト（DUPLICATES_FAN_OUT 以外では長さ0か1）
+        '''
+        sub_rows = self.sub_key_rows.get(main_value)
+        if not sub_rows:
+            return ()
+
+        if self.duplicates == DUPLICATES_FIRST:
+            return sub_rows[:1]
+        if self.duplicates == DUPLICATES_LAST:
+            return sub_rows[-1:]
+        if self.duplicates == DUPLICATES_ERROR and len(sub_rows) > 1:
+            raise_duplicate_key(main_value)
+        return sub_rows
+
+    def link_main_row(self, main_row):
+        '''
+        メインの行を、同じキーをもつサブの行に対応付けます。
+        '''
+        main_value = self.main_keys[main_row]
+        if is_empty_key(main_value):
+            return
+
+        sub_rows = self.select_sub_rows(main_value)
+        if not sub_rows:
+            return
+
+        if self.fan_out:
+            self.main_sub_map[main_row] = tuple(sub_rows)
+        else:
+            self.main_sub_map[main_row] = sub_rows[0]
+
+        for sub_row in sub_rows:
+            self.sub_main_map.setdefault(sub_row, set()).add(main_row)
+
+    def unlink_main_row(self, main_row):
+        '''
+        メインの行の対応付けを解除します。
+        '''
+        sub_rows = self.main_sub_map.pop(main_row, None)
+        if sub_rows is None:
+            return
+
+        for sub_row in as_tuple(sub_rows):
+            main_rows = self.sub_main_map[sub_row]
+            main_rows.discard(main_row)
+            if not main_rows:
+                del self.sub_main_map[sub_row]
+
+    def update_main_keys(self, first, last):
+        '''
+        メインモデルのfirst行目からlast行目までのキーが変更された後に呼び出されます。
+
+        キーの値が変わった行についてだけ、対応付けをやり直します。
+
+        Return: set型 結合先が変わったメインの行の集合
+        '''
+        if self.is_out_of_sync():
+            instrumentation.count_refresh('Mapper.refresh_map', 'メインモデルのdataChanged')
+            self.refresh_map()
+            return set(range(len(self.main_keys)))
+
+        relinked_main_rows = set()
+        for main_row in range(first, last + 1):
+            new_value = read_key(self.main_model, main_row, self.main_key_columns)
+            old_value = self.main_keys[main_row]
+            if new_value == old_value:
+                continue
+
+            self.unlink_main_row(main_row)
+
+            remove_from_index(self.main_key_rows, old_value, main_row)
+            self.main_key_rows.setdefault(new_value, set()).add(main_row)
+            self.main_keys[main_row] = new_value
+
+            self.link_main_row(main_row)
+            relinked_main_rows.add(main_row)
+
+        return relinked_main_rows
+
+    def update_sub_keys(self, first, last):
+        '''
+        サブモデルのfirst行目からlast行目までのキーが変更された後に呼び出されます。
+
+        変更前・変更後のキーをもつメインの行だけを対応付け直します。
+
+        Return: set型 結合先が変わったメインの行の集合
+        '''
+        if self.is_out_of_sync():
+            instrumentation.count_refresh('Mapper.refresh_map', 'サブモデルのdataChanged')
+            self.refresh_map()
+            return set(range(len(self.main_keys)))
+
+        changed_values = []
+        for sub_row in range(first, last + 1):
+            new_value = read_key(self.sub_model, sub_row, self.sub_key_columns)
+            old_value = self.sub_keys[sub_row]
+            if new_value == old_value:
+                continue
+
+            sub_rows = self.sub_key_rows[old_value]
+            sub_rows.remove(sub_row)
+            if not sub_rows:
+                del self.sub_key_rows[old_value]
+            bisect.insort(self.sub_key_rows.setdefault(new_value, []), sub_row)
+            self.sub_keys[sub_row] = new_value
+
+            changed_values += [old_value, new_value]
+
+        return self.relink_main_rows_with_values(changed_values)
+
+    def insert_main_rows(self, first, last):
+        '''
+        メインモデルのfirst行目からlast行目までが挿入された後に呼び出されます。
+
+        末尾への追加の場合、追加された行数に比例する手間で対応表を更新します。
+        '''
+        number_of_rows = last - first + 1
+        if first < len(self.main_keys):
+            self.shift_main_rows(first, number_of_rows)
+
+        self.main_keys[first:first] = [
+            read_key(self.main_model, main_row, self.main_key_columns)
+            for main_row in range(first, last + 1)
+        ]
+        for main_row in range(first, last + 1):
+            self.main_key_rows.setdefault(self.main_keys[main_row], set()).add(main_row)
+            self.link_main_row(main_row)
+
+    def remove_main_rows(self, first, last):
+        '''
+        メインモデルのfirst行目からlast行目までが削除された後に呼び出されます。
+        '''
+        for main_row in range(first, last + 1):
+            self.unlink_main_row(main_row)
+            remove_from_index(self.main_key_rows, self.main_keys[main_row], main_row)
+
+        del self.main_keys[first:last + 1]
+        self.shift_main_rows(last + 1, -(last - first + 1))
+
+    def move_main_rows(self, start, end, row):
+        '''
+        メインモデルのstart行目からend行目までがrow行目の前に移動した後に呼び出されます。
+        '''
+        self.main_keys = move_slice(self.main_keys, start, end, row)
+        self.main_key_rows = {}
+        for main_row, main_value in enumerate(self.main_keys):
+            self.main_key_rows.setdefault(main_value, set()).add(main_row)
+        self.relink_all_main_rows()
+
+    def insert_sub_rows(self, first, last):
+        '''
+        サブモデルのfirst行目からlast行目までが挿入された後に呼び出されます。
+
+        Return: set型 結合先が変わったメインの行の集合
+        '''
+        number_of_rows = last - first + 1
+        if first < len(self.sub_keys):
+            self.shift_sub_rows(first, number_of_rows)
+
+        new_values = [
+            read_key(self.sub_model, sub_row, self.sub_key_columns)
+            for sub_row in range(first, last + 1)
+        ]
+        self.sub_keys[first:first] = new_values
+        for sub_row, sub_value in zip(range(first, last + 1), new_values):
+            bisect.insort(self.sub_key_rows.setdefault(sub_value, []), sub_row)
+
+        return self.relink_main_rows_with_values(new_values)
+
+    def remove_sub_rows(self, first, last):
+        '''
+        サブモデルのfirst行目からlast行目までが削除された後に呼び出されます。
+
+        Return: set型 結合先が変わったメインの行の集合
+        '''
+        removed_values = self.sub_keys[first:last + 1]
+        for sub_row, sub_value in zip(range(first, last + 1), removed_values):
+            sub_rows = self.sub_key_rows[sub_value]
+            sub_rows.remove(sub_row)
+            if not sub_rows:
+                del self.sub_key_rows[sub_value]
+
+        # 削除された行を参照していたメインの行は、対応付けを解除してから行番号をずらす
+        affected_main_rows = set()
+        for sub_row in range(first, last + 1):
+            affected_main_rows |= self.sub_main_map.get(sub_row, set())
+        for main_row in affected_main_rows:
+            self.unlink_main_row(main_row)
+
+        del self.sub_keys[first:last + 1]
+        self.shift_sub_rows(last + 1, -(last - first + 1))
+
+        return affected_main_rows | self.relink_main_rows_with_values(removed_values)
+
+    def move_sub_rows(self, start, end, row):
+        '''
+        サブモデルのstart行目からend行目までがrow行目の前に移動した後に呼び出されます。
+
+        Return: set型 結合先が変わったメインの行の集合
+        '''
+        old_main_sub_map = self.main_sub_map
+        self.sub_keys = move_slice(self.sub_keys, start, end, row)
+        self.sub_key_rows = {}
+        for sub_row, sub_value in enumerate(self.sub_keys):
+            self.sub_key_rows.setdefault(sub_value, []).append(sub_row)
+        self.relink_all_main_rows()
+
+        return {
+            main_row for main_row in set(old_main_sub_map) | set(self.main_sub_map)
+            if old_main_sub_map.get(main_row) != self.main_sub_map.get(main_row)
+        }
+
+    def insert_main_columns(self, first, last):
+        '''
+        メインモデルに列が挿入された後に呼び出されます。キーの列の番号を更新します。
+        '''
+        self.main_key_columns = shift_columns(
+            self.main_key_columns, first, last - first + 1, self.main_model.columnCount()
+        )
+        self.main_column = from_key_columns(self.main_key_columns)
+        self.count_main_columns()
+
+    def insert_sub_columns(self, first, last):
+        '''
+        サブモデルに列が挿入された後に呼び出されます。キーの列の番号を更新します。
+        '''
+        self.sub_key_columns = shift_columns(
+            self.sub_key_columns, first, last - first + 1, self.sub_model.columnCount()
+        )
+        self.sub_column = from_key_columns(self.sub_key_columns)
+
+    def relink_main_rows_with_values(self, values):
+        '''
+        キーの値がvaluesのいずれかであるメインの行を、対応付けし直します。
+
+        Return: set型 結合先が変わったメインの行の集合
+        '''
+        affected_main_rows = set()
+        for value in set(values):
+            for main_row in self.main_key_rows.get(value, ()):
+                old_sub_rows = self.main_sub_map.get(main_row)
+                self.unlink_main_row(main_row)
+                self.link_main_row(main_row)
+                if self.main_sub_map.get(main_row) != old_sub_rows:
+                    affected_main_rows.add(main_row)
+        return affected_main_rows
+
+    def relink_all_main_rows(self):
+        '''
+        各行のキーの値から、main_sub_mapとsub_main_mapを作り直します。ソースモデルは参照しません。
+        '''
+        # 行ごとではなく、キーの値ごとに結合するサブの行を選ぶ
+        selected = {}
+        for main_value in self.main_key_rows:
+            if is_empty_key(main_value):
+                continue
+            sub_rows = self.select_sub_rows(main_value)
+            if sub_rows:
+                selected[main_value] = tuple(sub_rows) if self.fan_out else sub_rows[0]
+
+        self.main_sub_map = {
+            main_row: selected[main_value]
+            for main_row, main_value in enumerate(self.main_keys) if main_value in selected
+        }
+
+        self.sub_main_map = {}
+        for main_value, sub_rows in selected.items():
+            main_rows = self.main_key_rows[main_value]
+            for sub_row in as_tuple(sub_rows):
+                if sub_row in self.sub_main_map:
+                    self.sub_main_map[sub_row].update(main_rows)
+                else:
+                    self.sub_main_map[sub_row] = set(main_rows)
+
+        if self.fan_out:
+            self.refresh_fan_out_rows()
+
+    def refresh_fan_out_rows(self):
+        '''
+        DUPLICATES_FAN_OUT の場合に、プロキシモデルの各行に対応する (メインの行, サブの行) を作り直します。
+
+        結合先のないメインの行は、(メインの行, None) として1行になります。
+        '''
+        fan_out_rows = []
+        fan_out_offsets = []
+        for main_row in range(len(self.main_keys)):
+            fan_out_offsets.append(len(fan_out_rows))
+            sub_rows = self.main_sub_map.get(main_row)
+            if sub_rows:
+                fan_out_rows.extend((main_row, sub_row) for sub_row in sub_rows)
+            else:
+                fan_out_rows.append((main_row, None))
+        fan_out_offsets.append(len(fan_out_rows))
+
+        self.fan_out_rows = fan_out_rows
+        self.fan_out_offsets = fan_out_offsets
+
+    def proxy_rows_for_main_rows(self, first, last):
+        '''
+        メインモデルのfirst行目からlast行目までに対応するプロキシモデルの行を返します。
+
+        Return: range型
+        '''
+        if self.fan_out:
+            return range(self.fan_out_offsets[first], self.fan_out_offsets[last + 1])
+        return range(first, last + 1)
+
+    def proxy_rows_for_sub_rows(self, first, last):
+        '''
+        サブモデルのfirst行目からlast行目までを参照するプロキシモデルの行をすべて返します。
+
+        Return: set型
+        '''
+        proxy_rows = set()
+        for sub_row in range(first, last + 1):
+            for main_row in self.sub_main_map.get(sub_row, ()):
+                if self.fan_out:
+                    proxy_rows.add(
+                        self.fan_out_offsets[main_row] + self.main_sub_map[main_row].index(sub_row)
+                    )
+                else:
+                    proxy_rows.add(main_row)
+        return proxy_rows
+
+    def shift_main_rows(self, first, delta):
+        '''
+        対応表に含まれるfirst行目以降のメインの行番号をdeltaだけずらします。
+        '''
+        def shift(main_row):
+            return main_row + delta if main_row >= first else main_row
+
+        self.main_sub_map = {
+            shift(main_row): sub_row for main_row, sub_row in self.main_sub_map.items()
+        }
+        for main_rows in (self.sub_main_map, self.main_key_rows):
+            for key, rows in main_rows.items():
+                main_rows[key] = {shift(main_row) for main_row in rows}
+
+    def shift_sub_rows(self, first, delta):
+        '''
+        対応表に含まれるfirst行目以降のサブの行番号をdeltaだけずらします。
+        '''
+        def shift(sub_row):
+            return sub_row + delta if sub_row >= first else sub_row
+
+        def shift_all(sub_rows):
+            if isinstance(sub_rows, tuple):
+                return tuple(shift(sub_row) for sub_row in sub_rows)
+            return shift(sub_rows)
+
+        self.main_sub_map = {
+            main_row: shift_all(sub_rows) for main_row, sub_rows in self.main_sub_map.items()
+        }
+        self.sub_main_map = {
+            shift(sub_row): main_rows for sub_row, main_rows in self.sub_main_map.items()
+        }
+        for sub_value, sub_rows in self.sub_key_rows.items():
+            self.sub_key_rows[sub_value] = [shift(sub_row) for sub_row in sub_rows]
+
+    def is_main_key_changed(self, topleft, bottomright):
+        '''
+        メインモデルの dataChanged シグナルの範囲がキーの列を含む場合にTrueを返します。
+        '''
+        return is_key_column_changed(topleft, bottomright, self.main_key_columns)
+
+    def is_sub_key_changed(self, topleft, bottomright):
+        '''
+        サブモデルの dataChanged シグナルの範囲がキーの列を含む場合にTrueを返します。
+        '''
+        return is_key_column_changed(topleft, bottomright, self.sub_key_columns)
+
+    def is_out_of_sync(self):
+        '''
+        ソースモデルの行数が対応表の行数と食い違っている場合にTrueを返します。
+        '''
+        return (
+            len(self.main_keys) != self.main_model.rowCount()
+            or len(self.sub_keys) != self.sub_model.rowCount()
+        )
 
     def from_source(self, index: QModelIndex):
         '''
@@ -173,18 +1019,31 @@ class Mapper:
         '''
 
         if index.model() == self.main_model:
-            return self.proxy_model.index(index.row(), index.column())
+            proxy_row = index.row()
+            if self.fan_out:
+                proxy_row = self.fan_out_offsets[proxy_row]
+            return self.proxy_model.index(proxy_row, index.column())
 
         else:
             try:
-                redirected_index = self.proxy_model.index(
-                    self.sub_main_map[index.row()],
-                    index.column() + self.number_of_main_columns
-                )
-                return redirected_index
+                main_rows = self.sub_main_map[index.row()]
             except KeyError:
                 return QModelIndex()
 
+            # サブの行を参照するメインの行が複数ある場合は、最初の行を返す
+            proxy_row = min(main_rows)
+            if self.fan_out:
+                proxy_row = (
+                    self.fan_out_offsets[proxy_row]
+                    + self.main_sub_map[proxy_row].index(index.row())
+                )
+
+            redirected_index = self.proxy_model.index(
+                proxy_row,
+                index.column() + self.number_of_main_columns
+            )
+            return redirected_index
+
     def to_source(self, index: QModelIndex):
         '''
         プロキシモデルのインデックスをソースモデルのインデックスに変換します。
@@ -198,13 +1057,16 @@ class Mapper:
         proxy_row = index.row()
         main_columns = self.number_of_main_columns
 
+        if self.fan_out:
+            main_row, sub_row = self.fan_out_rows[proxy_row]
+        else:
+            main_row = proxy_row
+            sub_row = self.main_sub_map.get(proxy_row)
+
         # index がメインモデルの範囲外の場合
         if proxy_column >= main_columns:
-            # サブモデルの該当行の行番号を取得
-            try:
-                sub_row = self.main_sub_map[proxy_row]
             # 該当行がない場合、無効なインデックスを返す
-            except KeyError:
+            if sub_row is None:
                 return QModelIndex()
 
             # サブモデルの該当列の列番号を取得
@@ -215,7 +1077,7 @@ class Mapper:
         # index がメインモデルの範囲内の場合
         else:
             # メインモデルにアクセス
-            redirected_index = self.main_model.index(proxy_row, proxy_column)
+            redirected_index = self.main_model.index(main_row, proxy_column)
 
         return redirected_index
 
@@ -236,7 +1098,7 @@ def map_value_to_row(qt_model: QAbstractItemModel, column):
             ------+------
         0   Apple |  Red
         1   Berry |  Blue
-    
+
     column -- int型 列番号
         e.g. 0
 
@@ -244,15 +1106,173 @@ def map_value_to_row(qt_model: QAbstractItemModel, column):
         e.g. {'Apple': 0, 'Berry': 1}
 
     '''
-    number_of_rows = qt_model.rowCount()
-    value_row_pair = {}
+    values = read_column(qt_model, column)
+
+    # 後から入れた値で上書きされるので、逆順に入れると最初の行が残る
+    return dict(zip(reversed(values), range(len(values) - 1, -1, -1)))
+
+def read_keys(qt_model: QAbstractItemModel, key_columns):
+    '''
+    qt_modelの各行のキーの値を、行の順にリストにして返します。
+
+    return: list型
+        e.g. ['Apple', 'Berry']
+    '''
+    columns = [read_column(qt_model, column) for column in key_columns]
+    if len(columns) == 1:
+        return columns[0]
+    return list(zip(*columns))
+
+def read_column(qt_model: QAbstractItemModel, column, role=Qt.DisplayRole):
+    '''
+    qt_modelのcolumn列目の値を、行の順にリストにして返します。
+
+    ColumnarTableModelのように列全体をまとめて取り出せるモデル（column_values()をもつモデル）では、
+    行ごとにindex()とdata()を呼ばずに一度に取り出します。
+
+    Parameters:
+    role -- Qt.ItemDataRole型 取り出す値のrole（未指定の場合Qt.DisplayRole）
+
+    return: list型
+        e.g. ['Apple', 'Berry']
+    '''
+    if hasattr(qt_model, 'column_values'):
+        return qt_model.column_values(column, role)
+
+    return [
+        qt_model.data(qt_model.index(row, column), role)
+        for row in range(qt_model.rowCount())
+    ]
+
+def group_rows_by_value(values, container):
+    '''
+    行ごとの値のリストから、{値: その値をもつ行の集まり} からなる辞書を作ります。
 
-    for row in range(number_of_rows):
-        index = qt_model.index(row, column)
-        value = qt_model.data(index)
+    Parameters:
+    values -- list型 行の順に並んだ値のリスト
+    container -- set型かlist型 行を入れる型。list型の場合、行は昇順に並びます
 
-        if not value in value_row_pair.keys():
-            value_row_pair[value] = row
+    return: dict型
+        e.g. group_rows_by_value(['Apple', 'Berry', 'Apple'], list)
+             -> {'Apple': [0, 2], 'Berry': [1]}
+    '''
+    value_rows = {}
+    for row, value in enumerate(values):
+        rows = value_rows.get(value)
+        if rows is None:
+            value_rows[value] = container((row,))
+        elif container is set:
+            rows.add(row)
+        else:
+            rows.append(row)
+    return value_rows
 
-    return value_row_pair
+def read_key(qt_model: QAbstractItemModel, row, key_columns):
+    '''
+    qt_modelのrow行目のキーの値を返します。
+
+    キーの列が1つの場合はその値を、複数の場合は値のタプルを返します。
+    '''
+    if len(key_columns) == 1:
+        return qt_model.data(qt_model.index(row, key_columns[0]), Qt.DisplayRole)
+    return tuple(
+        qt_model.data(qt_model.index(row, column), Qt.DisplayRole) for column in key_columns
+    )
+
+def is_empty_key(value):
+    '''
+    キーの値が空の場合にTrueを返します。複数の列の組の場合は、すべての値が空のときに空とみなします。
+    '''
+    if isinstance(value, tuple):
+        return not any(value)
+    return not value
 
+def is_key_column_changed(topleft, bottomright, key_columns):
+    '''
+    dataChangedシグナルの範囲がキーの列のいずれかを含む場合にTrueを返します。
+    '''
+    if not topleft.isValid() or not bottomright.isValid():
+        return False
+    return any(topleft.column() <= column <= bottomright.column() for column in key_columns)
+
+def to_key_columns(column):
+    '''
+    列の番号、または列の番号のタプルを、列の番号のタプルに変換します。
+    '''
+    if isinstance(column, int):
+        return (column,)
+    return tuple(column)
+
+def from_key_columns(key_columns):
+    '''
+    to_key_columns()の逆変換です。列が1つの場合は列の番号を返します。
+    '''
+    if len(key_columns) == 1:
+        return key_columns[0]
+    return key_columns
+
+def shift_columns(key_columns, first, number_of_columns, column_count):
+    '''
+    first列目にnumber_of_columns列が挿入された後の、キーの列の番号のタプルを返します。
+
+    挿入前のモデルにまだなかった列（column_countは挿入後の列数）は、後から作られる列を指しているため、
+    ずらしません。
+    '''
+    old_column_count = column_count - number_of_columns
+    return tuple(
+        column + number_of_columns if first <= column < old_column_count else column
+        for column in key_columns
+    )
+
+def as_tuple(sub_rows):
+    '''
+    main_sub_mapの値を、サブの行のタプルとして返します。
+    '''
+    if isinstance(sub_rows, tuple):
+        return sub_rows
+    return (sub_rows,)
+
+def raise_duplicate_key(value):
+    '''
+    DUPLICATES_ERROR の場合に、キーの重複を知らせる例外を送出します。
+    '''
+    raise RelationProxyModelException(
+        '副モデルにキー {!r} をもつ行が複数あります'.format(value)
+    )
+
+def to_contiguous_ranges(sorted_rows):
+    '''
+    昇順に並んだ行番号を、連続した範囲のリストにまとめます。
+
+    e.g. to_contiguous_ranges([0, 1, 2, 5, 7, 8]) -> [(0, 2), (5, 5), (7, 8)]
+    '''
+    row_ranges = []
+    for row in sorted_rows:
+        if row_ranges and row_ranges[-1][1] + 1 == row:
+            row_ranges[-1] = (row_ranges[-1][0], row)
+        else:
+            row_ranges.append((row, row))
+    return row_ranges
+
+def move_slice(values, start, end, row):
+    '''
+    valuesのstart番目からend番目までを、row番目の要素の前に移動した新しいリストを返します。
+    QAbstractItemModel.rowsMoved()と同じ規則に従います。
+
+    e.g. move_slice(['a', 'b', 'c', 'd'], 0, 1, 3) -> ['c', 'a', 'b', 'd']
+    '''
+    moved = values[start:end + 1]
+    rest = values[:start] + values[end + 1:]
+    destination = row if row <= start else row - len(moved)
+    return rest[:destination] + moved + rest[destination:]
+
+def remove_from_index(value_rows, value, row):
+    '''
+    {値: 行の集合} からなる索引から、行を1つ取り除きます。空になった集合は削除されます。
+    '''
+    rows = value_rows.get(value)
+    if rows is None:
+        return
+    rows.discard(row)
+    if not rows:
+        del value_rows[value]
@@ -0,0 +1,117 @@
+'''
+バーコードスキャナから読み取った顧客番号・商品番号で、購入済み商品一覧に商品を追加するためのモジュールです。
+'''
+
+import time
+from model import ModelException, UnknownItemException
+from PyQt5.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+
+class CheckoutScanner(QObject):
+
+    '''
+    スキャナから1件ずつ届く文字列（Enterで終わる1行）を、会計の操作として処理します。
+
+    顧客の会計が始まっていない間に読み取った文字列は顧客番号として扱い、それ以降は商品番号として扱います。
+    空の行（Enterだけ）を読み取ると、その顧客の会計を終えます。
+
+    読み取った文字列はすぐには処理せず、イベントループの次の周回でまとめて処理します。
+    連続して読み取った商品は PurchasedItemModelWrapper.add_items() で1回で追加されるため、
+    スキャナが続けて読み取っても、行の追加とプロキシモデルの更新は1回で済みます。
+    全商品一覧にない商品番号はその商品だけが追加されず、rejected シグナルで通知されます。
+
+    Parameters:
+    cart -- model.PurchasedItemModelWrapper型 商品を追加する購入済み商品一覧
+    '''
+
+    # 会計中の顧客番号。空の文字列は会計を終えたことを表す
+    customer_changed = pyqtSignal(str)
+    # 追加した商品の (顧客番号, 商品番号, 商品名, 値段, 読み取った時刻) のタプルのリスト。
+    # 時刻は time.perf_counter() の値
+    items_added = pyqtSignal(list)
+    # (読み取った文字列, 追加できなかった理由)
+    rejected = pyqtSignal(str, str)
+
+    def __init__(self, cart):
+        super().__init__()
+        self.cart = cart
+
+        # 会計中の顧客番号。会計が始まっていない間はNone
+        self.customer_id = None
+
+        # まだ処理していない (読み取った文字列, 読み取った時刻) のリスト
+        self.pending_scans = []
+        self.flush_timer = None
+
+    def scan(self, code, scanned_at=None):
+        '''
+        スキャナから読み取った1行を受け取ります。処理はイベントループの次の周回で行われます。
+
+        イベントループがない（QCoreApplicationが存在しない）場合は、その場で処理します。
+
+        Parameters:
+        code -- str型 読み取った文字列。前後の空白は無視される
+        scanned_at -- float型 読み取った時刻（time.perf_counter()の値）。未指定の場合は呼び出した時刻
+        '''
+        if scanned_at is None:
+            scanned_at = time.perf_counter()
+        self.pending_scans.append((code.strip(), scanned_at))
+
+        if QCoreApplication.instance() is None:
+            self.flush()
+            return
+
+        if self.flush_timer is None:
+            self.flush_timer = QTimer()
+            self.flush_timer.setSingleShot(True)
+            self.flush_timer.setInterval(0)
+            self.flush_timer.timeout.connect(self.flush)
+
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        '''
+        まだ処理していない読み取りを順に処理し、追加する商品をまとめて購入済み商品一覧に追加します。
+        '''
+        scans = self.pending_scans
+        self.pending_scans = []
+
+        # (顧客番号, 商品番号, 商品名, 値段, 読み取った時刻) のリスト
+        sales = []
+        for code, scanned_at in scans:
+            if not code:
+                if self.customer_id is not None:
+                    self.customer_id = None
+                    self.customer_changed.emit('')
+                continue
+
+            if self.customer_id is None:
+                self.customer_id = code
+                self.customer_changed.emit(code)
+                continue
+
+            # 1つの商品番号のためにまとめて追加する商品すべてが追加されなくならないよう、先に確かめる
+            item_name, item_price = None, None
+            if self.cart.catalog is not None:
+                try:
+                    item_name, item_price = self.cart.catalog.lookup(code)
+                except UnknownItemException:
+                    self.rejected.emit(code, '商品番号 {} は登録されていません'.format(code))
+                    continue
+
+            sales.append((self.customer_id, code, item_name, item_price, scanned_at))
+
+        if not sales:
+            return
+
+        try:
+            self.cart.add_items(
+                (customer_id, item_id) for customer_id, item_id, *rest in sales
+            )
+        except ModelException as exception:
+            # 読み込み中など、いまは追加できない
+            for customer_id, item_id, *rest in sales:
+                self.rejected.emit(item_id, str(exception))
+            return
+
+        self.items_added.emit(sales)
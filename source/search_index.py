@@ -0,0 +1,459 @@
+'''
+全商品一覧を商品番号・商品名で検索するための索引と、検索結果の行だけを表示するプロキシモデルのモジュールです。
+'''
+
+import bisect
+import instrumentation
+import unicodedata
+from PyQt5.QtCore import QAbstractProxyModel, QModelIndex, Qt
+from relation_proxy_model import read_column
+
+# 商品名の索引に使う部分文字列の最大の長さ。1文字と2文字の部分文字列（n-gram）を索引にする
+NGRAM_SIZE = 2
+
+# カタカナをひらがなに揃えるための変換表
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+# 前方一致の範囲の上限に使う、どの文字よりも大きい文字
+MAX_CHARACTER = '\U0010ffff'
+
+# 前方一致の索引に、ソートし直さずに1つずつ挿入する値の数の上限
+INSORT_LIMIT = 64
+
+def normalize(value):
+    '''
+    検索で区別しない違いを揃えた文字列を返します。
+
+    全角・半角（NFKC）、大文字・小文字、カタカナ・ひらがなを区別しません。
+
+    e.g. normalize('ﾘﾝｺﾞＡ') -> 'りんごa'
+    '''
+    if value is None:
+        return ''
+    return unicodedata.normalize('NFKC', str(value)).casefold().translate(KATAKANA_TO_HIRAGANA)
+
+def split_query(query):
+    '''
+    検索文字列を空白で区切り、normalize()した語のリストにします。
+    '''
+    return normalize(query).split()
+
+def ngrams(text):
+    '''
+    textに含まれる、長さ1からNGRAM_SIZEまでの部分文字列の集合を返します。
+    '''
+    return {
+        text[start:start + size]
+        for size in range(1, NGRAM_SIZE + 1)
+        for start in range(len(text) - size + 1)
+    }
+
+class SearchIndex:
+
+    '''
+    Qtモデルの行を検索するための転置索引です。
+
+    prefix_columnsの列（商品番号など）は値の前方一致で、ngram_columnsの列（商品名など）は
+    値のどこかに含まれていれば一致します。検索文字列を空白で区切った場合は、すべての語に一致する行を返します。
+
+    前方一致はソートした (値, 行) のリストを二分探索し、部分一致は n-gram ごとの行のリストのうち
+    最も短いものだけを実際の値と照合します。そのため検索はモデルの行数ではなく候補の数に比例した時間で済みます。
+    索引はモデルのシグナルを受けて更新され、末尾への追加と値の変更では変わった行の分だけ更新されます。
+
+    Parameters:
+    qt_model -- QAbstractItemModel型 検索するモデル
+    prefix_columns -- tuple型 前方一致で検索する列の番号のタプル
+    ngram_columns -- tuple型 部分一致で検索する列の番号のタプル
+    '''
+
+    def __init__(self, qt_model, prefix_columns, ngram_columns):
+        self.qt_model = qt_model
+        self.prefix_columns = tuple(prefix_columns)
+        self.ngram_columns = tuple(ngram_columns)
+
+        # 行ごとの、部分一致で検索する列の値をnormalize()して改行でつないだ文字列
+        self.texts = []
+        # {n-gram: 昇順に並んだ行のリスト}。値が変わった行は、含まれなくなったn-gramのリストから除かれる
+        self.ngram_rows = {}
+        # 行ごとの、前方一致で検索する列の値をnormalize()したもののタプルと、
+        # すべての行の (値, 行) をソートしたリスト
+        self.prefix_values = []
+        self.prefix_keys = []
+        self.refresh()
+
+        self.qt_model.dataChanged.connect(self.on_data_changed)
+        self.qt_model.rowsInserted.connect(self.on_rows_inserted)
+        self.qt_model.rowsRemoved.connect(instrumentation.counting_slot('rowsRemoved', self.refresh))
+        self.qt_model.rowsMoved.connect(instrumentation.counting_slot('rowsMoved', self.refresh))
+        self.qt_model.modelReset.connect(instrumentation.counting_slot('modelReset', self.refresh))
+
+    def refresh(self, *args):
+        '''
+        索引を作り直します。行の構造が変わるシグナルにconnectされます。
+        '''
+        self.texts = []
+        self.ngram_rows = {}
+        self.prefix_values = []
+        self.prefix_keys = []
+
+        number_of_rows = self.qt_model.rowCount()
+        self.add_rows(
+            0,
+            self.read_rows(self.prefix_columns, number_of_rows),
+            self.read_rows(self.ngram_columns, number_of_rows)
+        )
+
+    def on_rows_inserted(self, parent, first, last):
+        '''
+        qt_modelのrowsInsertedシグナルにconnectされます。末尾に追加された行だけ索引に加えます。
+
+        末尾以外への挿入では、後ろの行の番号がずれるため索引を作り直します。
+        '''
+        if first != len(self.texts):
+            instrumentation.count_refresh('SearchIndex.refresh', 'rowsInserted')
+            self.refresh()
+            return
+
+        rows = range(first, last + 1)
+        self.add_rows(
+            first,
+            [self.read_values(row, self.prefix_columns) for row in rows],
+            [self.read_values(row, self.ngram_columns) for row in rows]
+        )
+
+    def on_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        qt_modelのdataChangedシグナルにconnectされます。値が変わった行だけ索引を更新します。
+        '''
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+
+        for row in range(topleft.row(), min(bottomright.row() + 1, len(self.texts))):
+            prefix_values = tuple(
+                normalize(value) for value in self.read_values(row, self.prefix_columns)
+            )
+            if prefix_values != self.prefix_values[row]:
+                for value in self.prefix_values[row]:
+                    del self.prefix_keys[bisect.bisect_left(self.prefix_keys, (value, row))]
+                for value in prefix_values:
+                    bisect.insort(self.prefix_keys, (value, row))
+                self.prefix_values[row] = prefix_values
+
+            text = self.join_text(self.read_values(row, self.ngram_columns))
+            if text != self.texts[row]:
+                old_grams = ngrams(self.texts[row])
+                new_grams = ngrams(text)
+                for gram in old_grams - new_grams:
+                    rows = self.ngram_rows[gram]
+                    del rows[bisect.bisect_left(rows, row)]
+                    if not rows:
+                        del self.ngram_rows[gram]
+                for gram in new_grams - old_grams:
+                    bisect.insort(self.ngram_rows.setdefault(gram, []), row)
+                self.texts[row] = text
+
+    def add_rows(self, first, prefix_rows, ngram_rows):
+        '''
+        first行目から始まる行を索引に加えます。
+
+        Parameters:
+        first -- int型 最初の行の番号
+        prefix_rows -- list型 行ごとの、前方一致で検索する列の値のタプルのリスト
+        ngram_rows -- list型 行ごとの、部分一致で検索する列の値のタプルのリスト
+        '''
+        new_keys = []
+        for row, values in enumerate(prefix_rows, first):
+            prefix_values = tuple(normalize(value) for value in values)
+            self.prefix_values.append(prefix_values)
+            new_keys.extend((value, row) for value in prefix_values)
+        self.merge_prefix_keys(new_keys)
+
+        for row, values in enumerate(ngram_rows, first):
+            text = self.join_text(values)
+            self.texts.append(text)
+            for gram in ngrams(text):
+                rows = self.ngram_rows.get(gram)
+                if rows is None:
+                    self.ngram_rows[gram] = [row]
+                else:
+                    rows.append(row)
+
+    def merge_prefix_keys(self, new_keys):
+        '''
+        (値, 行) のリストを、ソート済みの前方一致の索引に加えます。
+
+        すべての値が既存の値より大きい場合は末尾に付け足し、少ない場合は1つずつ二分探索で挿入します。
+        それ以外の場合は、ソートした新しい値を既存の値の後ろに付け足してからソートします。
+        既存の部分と新しい部分はそれぞれソート済みのため、このソートは2つの列のマージで済みます。
+        '''
+        new_keys.sort()
+        prefix_keys = self.prefix_keys
+        if not new_keys:
+            return
+        if not prefix_keys or new_keys[0] >= prefix_keys[-1]:
+            prefix_keys.extend(new_keys)
+        elif len(new_keys) <= INSORT_LIMIT:
+            for key in new_keys:
+                bisect.insort(prefix_keys, key)
+        else:
+            prefix_keys.extend(new_keys)
+            prefix_keys.sort()
+
+    def read_rows(self, columns, number_of_rows):
+        '''
+        すべての行のcolumnsの列の表示用の値を、行ごとのタプルのリストにして返します。
+        '''
+        if not columns:
+            return [()] * number_of_rows
+        return list(zip(*(read_column(self.qt_model, column) for column in columns)))
+
+    def read_values(self, row, columns):
+        '''
+        row行目のcolumnsの列の表示用の値のタプルを返します。
+        '''
+        return tuple(
+            self.qt_model.data(self.qt_model.index(row, column), Qt.DisplayRole)
+            for column in columns
+        )
+
+    def join_text(self, values):
+        '''
+        部分一致で検索する列の値をnormalize()して改行でつなぎます。語に改行は含まれないため、列をまたいで一致することはありません。
+        '''
+        return '\n'.join(normalize(value) for value in values)
+
+    def search(self, query):
+        '''
+        queryに一致する行を返します。
+
+        Parameters:
+        query -- str型 検索文字列。空白で区切った語のすべてに一致する行を返す
+
+        Return: 昇順に並んだ行の番号のシーケンス。queryが空の場合はすべての行を表すrange
+        '''
+        tokens = split_query(query)
+        if not tokens:
+            return range(len(self.texts))
+
+        matched_rows = None
+        for token in tokens:
+            rows = self.match_token(token)
+            matched_rows = rows if matched_rows is None else matched_rows & rows
+            if not matched_rows:
+                return []
+        return sorted(matched_rows)
+
+    def match_token(self, token):
+        '''
+        normalize()した1つの語に、前方一致か部分一致する行の集合を返します。
+        '''
+        first = bisect.bisect_left(self.prefix_keys, (token,))
+        last = bisect.bisect_left(self.prefix_keys, (token + MAX_CHARACTER,))
+        rows = {row for value, row in self.prefix_keys[first:last]}
+
+        # 語のn-gramのうち、最も行の少ないものの行だけを照合する
+        if len(token) <= NGRAM_SIZE:
+            candidates = self.ngram_rows.get(token, ())
+        else:
+            candidates = min(
+                (self.ngram_rows.get(token[start:start + NGRAM_SIZE], ())
+                 for start in range(len(token) - NGRAM_SIZE + 1)),
+                key=len
+            )
+        texts = self.texts
+        rows.update(row for row in candidates if token in texts[row])
+        return rows
+
+class ItemSearchProxyModel(QAbstractProxyModel):
+
+    '''
+    ソースモデルの行のうち、検索文字列に一致する行だけを表示するプロキシモデルです。
+
+    QSortFilterProxyModelのように行ごとにdata()を呼び出して判定せず、SearchIndexが返した行の番号の
+    リストをそのまま使います。検索文字列が空の場合はすべての行を表示します。
+
+    Parameters:
+    source_model -- QAbstractItemModel型 ソースモデル
+    prefix_columns -- tuple型 前方一致で検索する列の番号のタプル
+    ngram_columns -- tuple型 部分一致で検索する列の番号のタプル
+    '''
+
+    def __init__(self, source_model, prefix_columns, ngram_columns):
+        super().__init__()
+        # 索引はソースモデルのシグナルをこのモデルより先に受け取り、更新されている
+        self.search_index = SearchIndex(source_model, prefix_columns, ngram_columns)
+        self.setSourceModel(source_model)
+
+        self.query = ''
+        # 表示するソースモデルの行の番号の、昇順のシーケンス
+        self.rows = self.search_index.search(self.query)
+        self.resetting = False
+
+        source_model.rowsAboutToBeInserted.connect(self.on_source_rows_about_to_be_inserted)
+        source_model.rowsInserted.connect(self.on_source_rows_inserted)
+        source_model.dataChanged.connect(self.on_source_data_changed)
+        source_model.headerDataChanged.connect(self.headerDataChanged)
+        for about_to_change, changed in [
+                (source_model.rowsAboutToBeRemoved, source_model.rowsRemoved),
+                (source_model.rowsAboutToBeMoved, source_model.rowsMoved),
+                (source_model.columnsAboutToBeInserted, source_model.columnsInserted),
+                (source_model.columnsAboutToBeRemoved, source_model.columnsRemoved),
+                (source_model.modelAboutToBeReset, source_model.modelReset),
+                (source_model.layoutAboutToBeChanged, source_model.layoutChanged)]:
+            about_to_change.connect(self.begin_reset)
+            changed.connect(self.end_reset)
+
+    def set_query(self, query):
+        '''
+        検索文字列を設定し、一致する行だけを表示します。
+        '''
+        if split_query(query) == split_query(self.query):
+            self.query = query
+            return
+
+        self.beginResetModel()
+        self.query = query
+        self.rows = self.search_index.search(query)
+        self.endResetModel()
+
+    def begin_reset(self, *args):
+        '''
+        ソースモデルの構造が変わる前に呼び出され、リセットを始めます。
+        '''
+        if not self.resetting:
+            self.resetting = True
+            self.beginResetModel()
+
+    def end_reset(self, *args):
+        '''
+        ソースモデルの構造が変わった後に呼び出され、検索し直してリセットを終えます。
+        '''
+        self.rows = self.search_index.search(self.query)
+        if self.resetting:
+            self.resetting = False
+            self.endResetModel()
+
+    def on_source_rows_about_to_be_inserted(self, parent, first, last):
+        '''
+        ソースモデルの rowsAboutToBeInserted シグナルにconnectされます。
+
+        末尾以外への挿入では、表示している行の番号がずれるためリセットします。
+        '''
+        if first != self.sourceModel().rowCount():
+            self.begin_reset()
+
+    def on_source_rows_inserted(self, parent, first, last):
+        '''
+        ソースモデルの rowsInserted シグナルにconnectされます。末尾に追加された行のうち、一致する行を追加します。
+        '''
+        if self.resetting:
+            self.end_reset()
+            return
+
+        rows = self.search_index.search(self.query)
+        if len(rows) == len(self.rows):
+            self.rows = rows
+            return
+
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(rows) - 1)
+        self.rows = rows
+        self.endInsertRows()
+
+    def on_source_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        ソースモデルの dataChanged シグナルにconnectされます。
+
+        値が変わって一致する行が変わった場合はリセットし、そうでなければ dataChanged シグナルを放出します。
+        '''
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+
+        if self.query:
+            rows = self.search_index.search(self.query)
+            if rows != self.rows:
+                self.beginResetModel()
+                self.rows = rows
+                self.endResetModel()
+                return
+
+        first = bisect.bisect_left(self.rows, topleft.row())
+        last = bisect.bisect_right(self.rows, bottomright.row()) - 1
+        if first <= last:
+            self.dataChanged.emit(
+                self.index(first, topleft.column()), self.index(last, bottomright.column()), roles
+            )
+
+    def index(self, row, column, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.index()の実装です。
+        '''
+        if parent.isValid() or not (0 <= row < len(self.rows) and 0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, child=QModelIndex()):
+        '''
+        QAbstractItemModel.parent()の実装です。
+        '''
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.rowCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.columnCount()の実装です。
+        '''
+        # 破棄される途中ではソースモデルが外されている
+        source_model = self.sourceModel()
+        if parent.isValid() or source_model is None:
+            return 0
+        return source_model.columnCount()
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.data()の実装です。ソースモデルの対応する行の値を返します。
+        '''
+        if not index.isValid():
+            return None
+        source_model = self.sourceModel()
+        return source_model.data(
+            source_model.index(self.rows[index.row()], index.column()), role
+        )
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.headerData()の実装です。行のヘッダにはソースモデルの行のヘッダを返します。
+        '''
+        source_model = self.sourceModel()
+        if source_model is None:
+            return None
+        if orientation == Qt.Vertical:
+            if not 0 <= section < len(self.rows):
+                return None
+            section = self.rows[section]
+        return source_model.headerData(section, orientation, role)
+
+    def mapToSource(self, proxy_index):
+        '''
+        QAbstractProxyModel.mapToSource()の実装です。
+        '''
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.rows[proxy_index.row()], proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        '''
+        QAbstractProxyModel.mapFromSource()の実装です。表示していない行には無効なインデックスを返します。
+        '''
+        if not source_index.isValid():
+            return QModelIndex()
+        row = bisect.bisect_left(self.rows, source_index.row())
+        if row == len(self.rows) or self.rows[row] != source_index.row():
+            return QModelIndex()
+        return self.createIndex(row, source_index.column())
@@ -0,0 +1,209 @@
+'''
+Excelファイルから読み込んだシートの値を、次の起動のためにファイルに保存しておくためのモジュールです。
+'''
+
+import hashlib
+import os
+import pickle
+
+# キャッシュファイルの形式を変えたときは上げる。古い形式のキャッシュは使われない
+CACHE_VERSION = 1
+
+# 内容のハッシュを計算するときに一度に読むバイト数
+HASH_BLOCK_SIZE = 1 << 20
+
+class SheetCache:
+
+    '''
+    シートを読み込んだ結果（ヘッダ、型を揃えた列ごとの値のリスト、行数）を、pickleでファイルに保存します。
+
+    キャッシュは元のExcelファイルの大きさ・更新日時・内容のハッシュ（SHA-1）と一緒に保存されます。
+    大きさと更新日時が変わっていなければそのまま使い、更新日時だけが変わった場合は
+    ハッシュが同じであれば使います。それ以外の場合、キャッシュは捨てられシートは読み直されます。
+    このプログラム自身がファイルを保存した場合は、refresh()で書き込んだシートのキャッシュだけを捨て、
+    ほかのシートのキャッシュは保存後のファイルのものとして使い続けます。
+
+    キャッシュファイルはpickleで読み込むため、信頼できる入力として扱います。
+    Excelファイルと同じく、このプログラムを使う人だけが書き込める場所に置いてください。
+
+    Parameters:
+    file_name -- str型 エクセルファイルのファイル名
+    cache_file_name -- str型 キャッシュファイルのファイル名
+    '''
+
+    def __init__(self, file_name, cache_file_name):
+        self.file_name = file_name
+        self.cache_file_name = cache_file_name
+
+        # キャッシュを作ったときのExcelファイルの (大きさ, 更新日時) と内容のハッシュ
+        self.stat = None
+        self.digest = None
+
+        # {sheet_key()の値: (ヘッダの値のリスト, 列ごとの値のリストのリスト, 行数)} からなる辞書
+        self.sheets = {}
+
+        self.load()
+
+    def read_columns(self, name, header, column_types, read):
+        '''
+        シートを読み込んだ結果を返します。キャッシュが使えない場合はreadを呼び出し、結果を保存します。
+
+        返されるリストは呼び出しごとに新しく作られるため、変更してもキャッシュには影響しません。
+
+        Parameters:
+        name -- str型 Excelのシート名
+        header -- bool型 Trueの場合シートの1行目をヘッダとして扱う
+        column_types -- dict型 {列番号またはヘッダの文字列: 型} からなる辞書。Noneでもよい
+        read -- 引数をとらず、excelio.read_openpyxl_columns()と同じ形のタプルを返す呼び出し可能オブジェクト
+
+        Return: (ヘッダの値のリスト, 列ごとの値のリストのリスト, 行数) のタプル
+        '''
+        entry = self.get(name, header, column_types)
+        if entry is None:
+            entry = read()
+            self.put(name, header, column_types, entry)
+            entry = copy_entry(entry)
+        return entry
+
+    def get(self, name, header, column_types):
+        '''
+        キャッシュが使えれば、シートを読み込んだ結果をread_columns()と同じ形で返します。使えなければNoneを返します。
+
+        Parameters:
+        read_columns()と同じ
+        '''
+        self.validate()
+
+        entry = self.sheets.get(sheet_key(name, header, column_types))
+        if entry is None:
+            return None
+        return copy_entry(entry)
+
+    def put(self, name, header, column_types, entry):
+        '''
+        シートを読み込んだ結果をキャッシュに加え、ファイルに保存します。
+
+        get()で使えないことを確かめた後、シートを読み込んだ側が呼び出してください。
+        entryのリストはそのまま保持されるため、渡した後は変更しないでください。
+
+        Parameters:
+        name, header, column_types -- read_columns()と同じ
+        entry -- tuple型 (ヘッダの値のリスト, 列ごとの値のリストのリスト, 行数) のタプル
+        '''
+        self.sheets[sheet_key(name, header, column_types)] = entry
+        self.save()
+
+    def validate(self):
+        '''
+        Excelファイルがキャッシュを作ったときから変わっていれば、キャッシュを捨てます。
+        '''
+        stat = read_stat(self.file_name)
+        if stat == self.stat:
+            return
+
+        # 更新日時だけが変わった（コピーされた、保存し直されたなど）場合は、内容で比べる
+        digest = hash_file(self.file_name)
+        unchanged = self.stat is not None and stat[0] == self.stat[0] and digest == self.digest
+        self.stat = stat
+        self.digest = digest
+
+        if not unchanged:
+            self.sheets = {}
+        elif self.sheets:
+            # 次からはハッシュを計算せずに使えるよう、新しい更新日時を保存しておく
+            self.save()
+
+    def refresh(self, changed_names):
+        '''
+        このプログラム自身がExcelファイルを保存した後に呼び出され、キャッシュを保存後のファイルに合わせます。
+
+        changed_namesのシートのキャッシュは捨て、ほかのシートのキャッシュは新しい大きさ・更新日時・ハッシュと一緒に
+        保存し直します。保存したワークブックは、開く前にvalidate()でキャッシュと同じ内容であることを確かめておいてください。
+
+        Parameters:
+        changed_names -- iterable型 書き込んだシートの名前を返すイテラブル
+        '''
+        changed_names = set(changed_names)
+        self.sheets = {
+            key: entry for key, entry in self.sheets.items() if key[0] not in changed_names
+        }
+        self.stat = read_stat(self.file_name)
+        self.digest = hash_file(self.file_name)
+        if self.sheets:
+            self.save()
+
+    def load(self):
+        '''
+        キャッシュファイルを読み込みます。ファイルがない、壊れている、形式が古い場合は空のキャッシュになります。
+        '''
+        try:
+            # キャッシュファイルは信頼できる入力として扱う（クラスの説明を参照）
+            with open(self.cache_file_name, 'rb') as cache_file:
+                cache = pickle.load(cache_file)
+        except (OSError, EOFError, AttributeError, ValueError, pickle.UnpicklingError):
+            return
+
+        if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+            return
+
+        self.stat = cache['stat']
+        self.digest = cache['digest']
+        self.sheets = cache['sheets']
+
+    def save(self):
+        '''
+        キャッシュをファイルに書き込みます。
+
+        書き込みの途中で異常終了しても壊れたキャッシュが残らないよう、一時ファイルに書いてから置き換えます。
+        '''
+        temporary_file_name = self.cache_file_name + '.tmp'
+        with open(temporary_file_name, 'wb') as cache_file:
+            pickle.dump(
+                {
+                    'version': CACHE_VERSION,
+                    'stat': self.stat,
+                    'digest': self.digest,
+                    'sheets': self.sheets
+                },
+                cache_file,
+                pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temporary_file_name, self.cache_file_name)
+
+def copy_entry(entry):
+    '''
+    シートを読み込んだ結果のリストを、変更してもキャッシュに影響しないよう新しく作り直します。
+    '''
+    header_strings, columns, number_of_rows = entry
+    return (
+        None if header_strings is None else list(header_strings),
+        [list(values) for values in columns],
+        number_of_rows
+    )
+
+def sheet_key(name, header, column_types):
+    '''
+    シートの読み込み方ごとにキャッシュを分けるためのキーを返します。
+    '''
+    if not column_types:
+        return (name, header, ())
+    return (name, header, tuple(sorted(
+        (repr(column), repr(column_type)) for column, column_type in column_types.items()
+    )))
+
+def read_stat(file_name):
+    '''
+    ファイルの (大きさ, 更新日時のナノ秒) のタプルを返します。
+    '''
+    stat = os.stat(file_name)
+    return (stat.st_size, stat.st_mtime_ns)
+
+def hash_file(file_name):
+    '''
+    ファイルの内容のSHA-1ハッシュを16進数の文字列で返します。
+    '''
+    file_hash = hashlib.sha1()
+    with open(file_name, 'rb') as hashed_file:
+        for block in iter(lambda: hashed_file.read(HASH_BLOCK_SIZE), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
@@ -0,0 +1,312 @@
+'''
+表データを固定レイアウトのファイル（スナップショット）に書き出し、mmapしたまま PyQt のモデルとして使うためのモジュールです。
+'''
+
+import datetime
+import mmap
+import os
+import struct
+from columnar_model import TYPED_VALUE_ROLE
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+# ファイルの先頭: マジックナンバー, 形式のバージョン, 行数, 列数,
+# 元のファイルの大きさ, 更新日時のナノ秒, 内容のSHA-1
+FILE_HEADER = struct.Struct('<8sIIIQq20s')
+MAGIC = b'GOMISNAP'
+SNAPSHOT_VERSION = 1
+
+# 列ごとのセルの表の位置
+OFFSET = struct.Struct('<Q')
+
+# セル: 型のタグと8バイトの値。文字列は (文字列ヒープ内の位置, バイト数)
+CELL = struct.Struct('<Bq')
+STRING_CELL = struct.Struct('<BII')
+FLOAT_CELL = struct.Struct('<Bd')
+
+TAG_NONE = 0
+TAG_INT = 1
+TAG_FLOAT = 2
+TAG_STR = 3
+TAG_BOOL = 4
+TAG_DATETIME = 5
+
+class SnapshotException(Exception):
+    pass
+
+class SnapshotTableModel(QAbstractTableModel):
+
+    '''
+    write_snapshot()で書き出したファイルをmmapし、data()のたびにその場で値を読み出す読み取り専用のモデルです。
+
+    値はPythonのオブジェクトとして保持しないため、モデルが使うメモリはファイルの大きさによらずほぼ一定です。
+    同じマシンの複数のプロセス（レジ）が同じファイルを開いた場合、ファイルの内容はOSのページキャッシュで共有されます。
+
+    Parameters:
+    file_name -- str型 スナップショットのファイル名
+    parent -- QObject型 親オブジェクト（未指定の場合None）
+    '''
+
+    def __init__(self, file_name, parent=None):
+        super().__init__(parent)
+        self.file_name = file_name
+
+        with open(file_name, 'rb') as snapshot_file:
+            self.buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.number_of_rows, self.number_of_columns,
+         *self.source_stamp) = read_file_header(self.buffer, file_name)
+
+        self.column_offsets = [
+            OFFSET.unpack_from(self.buffer, FILE_HEADER.size + OFFSET.size * column)[0]
+            for column in range(self.number_of_columns + 1)
+        ]
+        # 最後の位置はヘッダのセルの表
+        header_offset = self.column_offsets.pop()
+        self.heap_offset = header_offset + CELL.size * self.number_of_columns
+
+        self.header_labels = [
+            self.read_cell(header_offset + CELL.size * column)
+            for column in range(self.number_of_columns)
+        ]
+
+    def close(self):
+        '''
+        mmapを閉じます。閉じた後はモデルを使わないでください。
+        '''
+        self.buffer.close()
+
+    def rowCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.rowCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return self.number_of_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.columnCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return self.number_of_columns
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.data()の実装です。
+
+        DisplayRoleでは値を文字列にして返し、EditRoleとTYPED_VALUE_ROLEでは値をそのまま返します。
+        空のセルにはNoneを返します。
+        '''
+        if not index.isValid():
+            return None
+
+        if role == Qt.DisplayRole:
+            value = self.read_cell(self.cell_offset(index.row(), index.column()))
+            return None if value is None else str(value)
+        if role == Qt.EditRole or role == TYPED_VALUE_ROLE:
+            return self.read_cell(self.cell_offset(index.row(), index.column()))
+        return None
+
+    def flags(self, index):
+        '''
+        QAbstractItemModel.flags()の実装です。値は変更できません。
+        '''
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.headerData()の実装です。
+        '''
+        if (orientation == Qt.Horizontal and role == Qt.DisplayRole
+                and section < len(self.header_labels)):
+            return self.header_labels[section]
+        return super().headerData(section, orientation, role)
+
+    def column_values(self, column, role=Qt.DisplayRole):
+        '''
+        column列目の値を、data()と同じ形でまとめてリストにして返します。
+
+        Parameters:
+        column -- int型 列番号
+        role -- Qt.ItemDataRole型 data()のroleと同じ（未指定の場合Qt.DisplayRole）
+
+        Return: list型
+        '''
+        if not 0 <= column < self.number_of_columns:
+            return [None] * self.number_of_rows
+
+        offset = self.column_offsets[column]
+        values = [
+            self.decode_cell(tag, payload, offset + CELL.size * row)
+            for row, (tag, payload) in enumerate(CELL.iter_unpack(
+                self.buffer[offset:offset + CELL.size * self.number_of_rows]
+            ))
+        ]
+        if role == Qt.DisplayRole:
+            return [None if value is None else str(value) for value in values]
+        if role == Qt.EditRole or role == TYPED_VALUE_ROLE:
+            return values
+        return [None] * self.number_of_rows
+
+    def cell_offset(self, row, column):
+        '''
+        row行目column列目のセルのファイル内の位置を返します。
+        '''
+        return self.column_offsets[column] + CELL.size * row
+
+    def read_cell(self, offset):
+        '''
+        offsetの位置にあるセルの値を返します。
+        '''
+        tag, payload = CELL.unpack_from(self.buffer, offset)
+        return self.decode_cell(tag, payload, offset)
+
+    def decode_cell(self, tag, payload, offset):
+        '''
+        セルのタグと値から、Pythonの値を作ります。
+        '''
+        if tag == TAG_NONE:
+            return None
+        if tag == TAG_INT:
+            return payload
+        if tag == TAG_BOOL:
+            return bool(payload)
+        if tag == TAG_FLOAT:
+            return FLOAT_CELL.unpack_from(self.buffer, offset)[1]
+
+        tag, string_offset, length = STRING_CELL.unpack_from(self.buffer, offset)
+        start = self.heap_offset + string_offset
+        string = str(self.buffer[start:start + length], 'utf-8')
+        if tag == TAG_DATETIME:
+            return datetime.datetime.fromisoformat(string)
+        return string
+
+def write_snapshot(file_name, header_labels, columns, number_of_rows, source_stamp=None):
+    '''
+    列ごとの値を、SnapshotTableModelで読み込めるファイルに書き出します。
+
+    ファイルは一時ファイルに書いてから置き換えるため、ほかのプロセスが開いているスナップショットは壊れません。
+    値はNone, bool, int, float, str, datetime.datetimeのまま保存され、それ以外の値は文字列として保存されます。
+
+    Parameters:
+    file_name -- str型 スナップショットのファイル名
+    header_labels -- list型 ヘッダの値のリスト
+    columns -- list型 列ごとの値のリストのリスト
+    number_of_rows -- int型 行数
+    source_stamp -- tuple型 元のファイルの (大きさ, 更新日時のナノ秒, 内容のSHA-1の16進数の文字列)。
+                    read_snapshot_stamp()で読み出せる（未指定の場合None）
+    '''
+    number_of_columns = len(header_labels)
+    if source_stamp is None:
+        source_stamp = (0, 0, '')
+    size, mtime_ns, digest = source_stamp
+
+    # 同じ文字列はヒープに1回だけ書く
+    heap = bytearray()
+    string_offsets = {}
+
+    def encode_cell(value):
+        if value is None:
+            return CELL.pack(TAG_NONE, 0)
+        if isinstance(value, bool):
+            return CELL.pack(TAG_BOOL, int(value))
+        if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+            return CELL.pack(TAG_INT, value)
+        if isinstance(value, float):
+            return FLOAT_CELL.pack(TAG_FLOAT, value)
+
+        tag = TAG_STR
+        if isinstance(value, datetime.datetime):
+            tag = TAG_DATETIME
+            value = value.isoformat()
+        string = str(value)
+        if string not in string_offsets:
+            encoded = string.encode('utf-8')
+            string_offsets[string] = (len(heap), len(encoded))
+            heap.extend(encoded)
+        return STRING_CELL.pack(tag, *string_offsets[string])
+
+    # 列の表の位置。最後はヘッダのセルの表の位置
+    first_table_offset = FILE_HEADER.size + OFFSET.size * (number_of_columns + 1)
+    column_offsets = [
+        first_table_offset + CELL.size * number_of_rows * column
+        for column in range(number_of_columns + 1)
+    ]
+
+    temporary_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(temporary_file_name, 'wb') as snapshot_file:
+        snapshot_file.write(FILE_HEADER.pack(
+            MAGIC, SNAPSHOT_VERSION, number_of_rows, number_of_columns,
+            size, mtime_ns, bytes.fromhex(digest).ljust(20, b'\0')
+        ))
+        snapshot_file.write(b''.join(OFFSET.pack(offset) for offset in column_offsets))
+        for column in range(number_of_columns):
+            values = columns[column] if column < len(columns) else ()
+            snapshot_file.write(b''.join(encode_cell(value) for value in values))
+            # 長さの足りない列はNoneで埋める
+            snapshot_file.write(CELL.pack(TAG_NONE, 0) * (number_of_rows - len(values)))
+        snapshot_file.write(b''.join(encode_cell(label) for label in header_labels))
+        snapshot_file.write(heap)
+
+    try:
+        os.replace(temporary_file_name, file_name)
+    except OSError:
+        # Windowsでは、ほかのプロセスがmmapしているファイルは置き換えられない
+        os.remove(temporary_file_name)
+        raise
+
+def read_snapshot_stamp(file_name):
+    '''
+    スナップショットに保存された元のファイルの (大きさ, 更新日時のナノ秒, 内容のSHA-1の16進数の文字列) を返します。
+
+    ファイルがない、またはスナップショットでない場合はNoneを返します。
+    '''
+    try:
+        with open(file_name, 'rb') as snapshot_file:
+            buffer = snapshot_file.read(FILE_HEADER.size)
+        file_header = read_file_header(buffer, file_name)
+    except (OSError, SnapshotException):
+        return None
+    return file_header[4:]
+
+def update_snapshot_stamp(file_name, source_stamp):
+    '''
+    スナップショットに保存された元のファイルの (大きさ, 更新日時のナノ秒, 内容のSHA-1) を書き換えます。
+
+    値の部分は書き換えないため、ほかのプロセスがmmapしているスナップショットにも使えます。
+    元のファイルのうち、スナップショットにした部分が変わらないまま保存し直された場合に呼び出してください。
+
+    Parameters:
+    file_name -- str型 スナップショットのファイル名
+    source_stamp -- tuple型 write_snapshot()のsource_stampと同じ
+
+    Raises:
+    SnapshotException -- スナップショットでないファイルの場合
+    '''
+    size, mtime_ns, digest = source_stamp
+    with open(file_name, 'r+b') as snapshot_file:
+        magic, version, number_of_rows, number_of_columns = read_file_header(
+            snapshot_file.read(FILE_HEADER.size), file_name
+        )[:4]
+        snapshot_file.seek(0)
+        snapshot_file.write(FILE_HEADER.pack(
+            magic, version, number_of_rows, number_of_columns,
+            size, mtime_ns, bytes.fromhex(digest).ljust(20, b'\0')
+        ))
+
+def read_file_header(buffer, file_name):
+    '''
+    ファイルの先頭を読み込み、(マジックナンバー, バージョン, 行数, 列数, 大きさ, 更新日時, SHA-1) を返します。
+    '''
+    if len(buffer) < FILE_HEADER.size:
+        raise SnapshotException('{}はスナップショットではありません'.format(file_name))
+
+    magic, version, number_of_rows, number_of_columns, size, mtime_ns, digest = (
+        FILE_HEADER.unpack_from(buffer, 0)
+    )
+    if magic != MAGIC or version != SNAPSHOT_VERSION:
+        raise SnapshotException('{}はスナップショットではありません'.format(file_name))
+    return magic, version, number_of_rows, number_of_columns, size, mtime_ns, digest.hex()
@@ -0,0 +1,401 @@
+'''
+表の行を列の値で並べ替えて表示するプロキシモデルのモジュールです。
+'''
+
+import bisect
+import datetime
+import math
+from PyQt5.QtCore import QAbstractProxyModel, QModelIndex, Qt
+from relation_proxy_model import read_column
+
+# 一度に追加された行がこれより多い場合は、1行ずつ挿入せずに並べ直してリセットする
+MAX_INSERT_SIGNALS = 64
+
+# ソートキーの種類。数値、文字列、空の値の順に並ぶ
+KEY_NUMBER = 0
+KEY_STRING = 1
+KEY_EMPTY = 2
+
+def sort_key(value):
+    '''
+    セルの値から、型の違う値どうしでも比べられるソートキーを作ります。
+
+    数値と数値として読める文字列は数値として比べ、それ以外の値は文字列として比べます。
+    昇順では数値、文字列、空の値（Noneと空の文字列）の順に並びます。
+
+    e.g. sort_key('200') -> (KEY_NUMBER, 200)
+         sort_key('衣装ケース08') -> (KEY_STRING, '衣装ケース08')
+    '''
+    if value is None or value == '':
+        return (KEY_EMPTY, 0)
+    if isinstance(value, (bool, int, float)):
+        if isinstance(value, float) and math.isnan(value):
+            return (KEY_EMPTY, 0)
+        return (KEY_NUMBER, value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return (KEY_STRING, value.isoformat())
+
+    text = str(value)
+    try:
+        return (KEY_NUMBER, int(text))
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return (KEY_STRING, text)
+    if math.isnan(number):
+        return (KEY_STRING, text)
+    return (KEY_NUMBER, number)
+
+class SortProxyModel(QAbstractProxyModel):
+
+    '''
+    ソースモデルの行を、sort()で指定した列の値の順に並べて表示するプロキシモデルです。
+
+    列ごとのソートキーはソースモデルの値（EditRole）からsort_key()で一度だけ作られ、キャッシュされます。
+    ソースモデルが column_values() をもつ場合（RelationProxyModelなど）は、列全体をまとめて取り出します。
+    並び順は (ソートキー, 行) の昇順のリストとして保持され、末尾に追加された行や値の変わった行は
+    二分探索で挿入位置を求めて差し込まれるため、並べ替えた後も追加のたびに全体を並べ直すことはありません。
+    同じ値の行はソースモデルの順に並びます。
+
+    QTableView.setSortingEnabled(True) と組み合わせると、列のヘッダのクリックで並べ替えられます。
+
+    Parameters:
+    source_model -- QAbstractItemModel型 ソースモデル
+    parent -- QObject型 親オブジェクト（未指定の場合None）
+    '''
+
+    def __init__(self, source_model, parent=None):
+        super().__init__(parent)
+        self.setSourceModel(source_model)
+
+        # 並べ替えに使う列。負の場合は並べ替えず、ソースモデルの順に表示する
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+
+        # {列: 行ごとのソートキーのリスト}
+        self.column_keys = {}
+
+        # 並べ替えている場合の、ソートキーの後に符号付きの行を加えたタプルの昇順のリストと、同じ順のソースモデルの行のリスト。
+        # 降順の場合、行は符号を反転して持ち、プロキシモデルの行はリストを後ろから数える
+        self.sorted_keys = None
+        self.sorted_rows = None
+
+        self.number_of_rows = source_model.rowCount()
+        self.resetting = False
+
+        source_model.rowsAboutToBeInserted.connect(self.on_source_rows_about_to_be_inserted)
+        source_model.rowsInserted.connect(self.on_source_rows_inserted)
+        source_model.dataChanged.connect(self.on_source_data_changed)
+        source_model.headerDataChanged.connect(self.headerDataChanged)
+        for about_to_change, changed in [
+                (source_model.rowsAboutToBeRemoved, source_model.rowsRemoved),
+                (source_model.rowsAboutToBeMoved, source_model.rowsMoved),
+                (source_model.columnsAboutToBeInserted, source_model.columnsInserted),
+                (source_model.columnsAboutToBeRemoved, source_model.columnsRemoved),
+                (source_model.modelAboutToBeReset, source_model.modelReset),
+                (source_model.layoutAboutToBeChanged, source_model.layoutChanged)]:
+            about_to_change.connect(self.begin_reset)
+            changed.connect(self.end_reset)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        '''
+        QAbstractItemModel.sort()の実装です。column列目の値の順に並べ替えます。
+
+        columnが負の場合は並べ替えをやめ、ソースモデルの順に戻します。
+        '''
+        self.layoutAboutToBeChanged.emit()
+
+        persistent_indexes = self.persistentIndexList()
+        source_rows = [self.to_source_row(index.row()) for index in persistent_indexes]
+
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh_order()
+
+        self.changePersistentIndexList(persistent_indexes, [
+            self.index(self.from_source_row(row), index.column())
+            for row, index in zip(source_rows, persistent_indexes)
+        ])
+        self.layoutChanged.emit()
+
+    def refresh_order(self):
+        '''
+        並び順を作り直します。
+        '''
+        if not 0 <= self.sort_column < self.sourceModel().columnCount():
+            self.sorted_keys = None
+            self.sorted_rows = None
+            return
+
+        keys = self.get_column_keys(self.sort_column)
+        # 行をソートキーで並べてから (ソートキー, 符号付きの行) を作るほうが、タプルどうしを比べるより速い。
+        # 降順では同じ値の行を後ろの行から並べる
+        if self.sort_order == Qt.AscendingOrder:
+            self.sorted_rows = sorted(range(len(keys)), key=keys.__getitem__)
+        else:
+            self.sorted_rows = sorted(range(len(keys)), key=keys.__getitem__, reverse=True)
+            self.sorted_rows.reverse()
+        self.sorted_keys = [self.sorted_key(row) for row in self.sorted_rows]
+
+    def get_column_keys(self, column):
+        '''
+        column列目の行ごとのソートキーのリストを返します。初めての列の場合はソースモデルから作ります。
+        '''
+        keys = self.column_keys.get(column)
+        if keys is None:
+            keys = [sort_key(value) for value in read_column(self.sourceModel(), column, Qt.EditRole)]
+            self.column_keys[column] = keys
+        return keys
+
+    def read_key(self, row, column):
+        '''
+        ソースモデルのrow行目column列目のソートキーを作ります。
+        '''
+        source_model = self.sourceModel()
+        return sort_key(source_model.data(source_model.index(row, column), Qt.EditRole))
+
+    def row_sign(self):
+        '''
+        sorted_keysで行に掛ける符号を返します。降順でも同じ値の行がソースモデルの順に並ぶよう、降順では-1です。
+        '''
+        return 1 if self.sort_order == Qt.AscendingOrder else -1
+
+    def sorted_key(self, row):
+        '''
+        ソースモデルのrow行目の、sorted_keysでのタプル（ソートキーの後に符号付きの行を加えたもの）を返します。
+        '''
+        return self.column_keys[self.sort_column][row] + (self.row_sign() * row,)
+
+    def to_proxy_row(self, position):
+        '''
+        sorted_keysでの位置を、プロキシモデルの行にします。逆の変換も同じ式です。
+        '''
+        if self.sort_order == Qt.AscendingOrder:
+            return position
+        return len(self.sorted_keys) - 1 - position
+
+    def to_source_row(self, proxy_row):
+        '''
+        プロキシモデルの行をソースモデルの行にします。
+        '''
+        if self.sorted_rows is None:
+            return proxy_row
+        return self.sorted_rows[self.to_proxy_row(proxy_row)]
+
+    def from_source_row(self, row):
+        '''
+        ソースモデルの行をプロキシモデルの行にします。
+        '''
+        if self.sorted_keys is None:
+            return row
+        return self.to_proxy_row(bisect.bisect_left(self.sorted_keys, self.sorted_key(row)))
+
+    def begin_reset(self, *args):
+        '''
+        ソースモデルの構造が変わる前に呼び出され、リセットを始めます。
+        '''
+        if not self.resetting:
+            self.resetting = True
+            self.beginResetModel()
+
+    def end_reset(self, *args):
+        '''
+        ソースモデルの構造が変わった後に呼び出され、ソートキーを捨てて並べ直し、リセットを終えます。
+        '''
+        self.column_keys = {}
+        self.number_of_rows = self.sourceModel().rowCount()
+        self.refresh_order()
+        if self.resetting:
+            self.resetting = False
+            self.endResetModel()
+
+    def on_source_rows_about_to_be_inserted(self, parent, first, last):
+        '''
+        ソースモデルの rowsAboutToBeInserted シグナルにconnectされます。
+
+        末尾以外への挿入では、後ろの行の番号がずれるためリセットします。
+        '''
+        if first != self.number_of_rows:
+            self.begin_reset()
+
+    def on_source_rows_inserted(self, parent, first, last):
+        '''
+        ソースモデルの rowsInserted シグナルにconnectされます。
+
+        末尾に追加された行のソートキーをキャッシュに加え、並び順の中の位置に1行ずつ挿入します。
+        '''
+        if self.resetting:
+            self.end_reset()
+            return
+
+        rows = range(first, last + 1)
+        for column, keys in self.column_keys.items():
+            keys.extend(self.read_key(row, column) for row in rows)
+
+        if self.sorted_keys is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.number_of_rows = last + 1
+            self.endInsertRows()
+            return
+
+        if len(rows) > MAX_INSERT_SIGNALS:
+            self.beginResetModel()
+            self.number_of_rows = last + 1
+            sign = self.row_sign()
+            # 既存の部分はソート済みのため、追加した分をマージするだけで済む
+            self.sorted_keys.extend(self.sorted_key(row) for row in rows)
+            self.sorted_keys.sort()
+            self.sorted_rows = [sign * sorted_key[-1] for sorted_key in self.sorted_keys]
+            self.endResetModel()
+            return
+
+        for row in rows:
+            sorted_key = self.sorted_key(row)
+            position = bisect.bisect_left(self.sorted_keys, sorted_key)
+            if self.sort_order == Qt.AscendingOrder:
+                proxy_row = position
+            else:
+                proxy_row = len(self.sorted_keys) - position
+
+            self.beginInsertRows(QModelIndex(), proxy_row, proxy_row)
+            self.sorted_keys.insert(position, sorted_key)
+            self.sorted_rows.insert(position, row)
+            self.number_of_rows = row + 1
+            self.endInsertRows()
+
+    def on_source_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        ソースモデルの dataChanged シグナルにconnectされます。
+
+        変更された列のキャッシュされたソートキーを更新し、並べ替えている列の値が変わった行は新しい位置に移します。
+        '''
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+
+        rows = range(topleft.row(), min(bottomright.row() + 1, self.number_of_rows))
+        for column, keys in self.column_keys.items():
+            if not topleft.column() <= column <= bottomright.column() or column == self.sort_column:
+                continue
+            for row in rows:
+                keys[row] = self.read_key(row, column)
+
+        if self.sorted_keys is not None and topleft.column() <= self.sort_column <= bottomright.column():
+            for row in rows:
+                self.move_row(row, self.read_key(row, self.sort_column))
+
+        proxy_rows = [self.from_source_row(row) for row in rows]
+        if proxy_rows:
+            self.dataChanged.emit(
+                self.index(min(proxy_rows), topleft.column()),
+                self.index(max(proxy_rows), bottomright.column()),
+                roles
+            )
+
+    def move_row(self, row, key):
+        '''
+        並べ替えている列の値が変わったソースモデルのrow行目を、新しいソートキーkeyの位置に移します。
+        '''
+        old_sorted_key = self.sorted_key(row)
+        if old_sorted_key[:-1] == key:
+            return
+
+        old_position = bisect.bisect_left(self.sorted_keys, old_sorted_key)
+        new_sorted_key = key + old_sorted_key[-1:]
+        new_position = bisect.bisect_left(self.sorted_keys, new_sorted_key)
+        # 元の位置から除いた後の位置
+        if new_position > old_position:
+            new_position -= 1
+
+        old_proxy_row = self.to_proxy_row(old_position)
+        new_proxy_row = self.to_proxy_row(new_position)
+        moved = old_proxy_row != new_proxy_row
+        if moved:
+            # beginMoveRows() の移動先は、移動する前の行の番号で数える
+            destination = new_proxy_row + 1 if new_proxy_row > old_proxy_row else new_proxy_row
+            self.beginMoveRows(
+                QModelIndex(), old_proxy_row, old_proxy_row, QModelIndex(), destination
+            )
+
+        del self.sorted_keys[old_position]
+        del self.sorted_rows[old_position]
+        self.sorted_keys.insert(new_position, new_sorted_key)
+        self.sorted_rows.insert(new_position, row)
+        self.column_keys[self.sort_column][row] = key
+
+        if moved:
+            self.endMoveRows()
+
+    def index(self, row, column, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.index()の実装です。
+        '''
+        if parent.isValid() or not (0 <= row < self.number_of_rows and 0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, child=QModelIndex()):
+        '''
+        QAbstractItemModel.parent()の実装です。
+        '''
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.rowCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return self.number_of_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.columnCount()の実装です。
+        '''
+        # 破棄される途中ではソースモデルが外されている
+        source_model = self.sourceModel()
+        if parent.isValid() or source_model is None:
+            return 0
+        return source_model.columnCount()
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.data()の実装です。ソースモデルの対応する行の値を返します。
+        '''
+        if not index.isValid():
+            return None
+        source_model = self.sourceModel()
+        return source_model.data(
+            source_model.index(self.to_source_row(index.row()), index.column()), role
+        )
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.headerData()の実装です。行のヘッダにはソースモデルでの行の番号（1から）を返します。
+        '''
+        source_model = self.sourceModel()
+        if source_model is None:
+            return None
+        if orientation == Qt.Vertical:
+            # 行のヘッダはソースモデルでの行の番号。行の数だけ呼ばれるため、ソースモデルには問い合わせない
+            if role != Qt.DisplayRole or not 0 <= section < self.number_of_rows:
+                return None
+            return self.to_source_row(section) + 1
+        return source_model.headerData(section, orientation, role)
+
+    def mapToSource(self, proxy_index):
+        '''
+        QAbstractProxyModel.mapToSource()の実装です。
+        '''
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.to_source_row(proxy_index.row()), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        '''
+        QAbstractProxyModel.mapFromSource()の実装です。
+        '''
+        if not source_index.isValid():
+            return QModelIndex()
+        return self.createIndex(self.from_source_row(source_index.row()), source_index.column())
@@ -0,0 +1,350 @@
+'''
+SQLiteのテーブルをPyQtのモデルとして使うためのモジュールです。
+'''
+
+import sqlite3
+from columnar_model import TYPED_VALUE_ROLE
+from PyQt5.QtCore import QAbstractTableModel, QCoreApplication, QModelIndex, Qt, QTimer
+
+# data()で読み込むときに、まとめて読み込む行数
+PAGE_SIZE = 256
+
+# キャッシュしておくページの数の上限
+MAX_CACHED_PAGES = 64
+
+class SqliteModelException(Exception):
+    pass
+
+class SqliteTableModel(QAbstractTableModel):
+
+    '''
+    SQLiteのテーブルを表として表示するモデルです。
+
+    テーブル全体は読み込まず、data()で必要になった行をPAGE_SIZE行ずつ読み込んでキャッシュします。
+    テーブルはcreate_table()で作ったものを使ってください。
+    行番号は id列（INTEGER PRIMARY KEY）の値から1を引いたもので、行を追加しても既存の行の番号は変わりません。
+
+    同じデータベースをほかの接続（ほかのレジのプロセスなど）も書き換える場合は、watch()またはpoll()で
+    ほかの接続が追加した行を取り込めます。取り込まれた行は rowsInserted シグナルで通知されます。
+
+    Parameters:
+    connection -- sqlite3.Connection型 データベースへの接続
+    table_name -- str型 テーブル名
+    parent -- QObject型 親オブジェクト（未指定の場合None）
+    '''
+
+    def __init__(self, connection, table_name, parent=None):
+        super().__init__(parent)
+        self.connection = connection
+        self.table_name = table_name
+        self.header_labels = read_header_labels(connection, table_name)
+        if not self.header_labels:
+            raise SqliteModelException('テーブル{}がありません'.format(table_name))
+
+        self.number_of_rows = count_rows(connection, table_name)
+
+        # {ページ番号: 行の値のタプルのリスト} からなる辞書
+        self.pages = {}
+
+        # ほかの接続による変更を調べるためのタイマーと、最後に調べたときの PRAGMA data_version の値
+        self.watch_timer = None
+        self.data_version = read_data_version(connection)
+
+    def rowCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.rowCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return self.number_of_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.columnCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return len(self.header_labels)
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.data()の実装です。
+
+        DisplayRoleでは値を文字列にして返し、EditRoleとTYPED_VALUE_ROLEでは値をそのまま返します。
+        空のセルにはNoneを返します。
+        '''
+        if not index.isValid():
+            return None
+
+        value = self.read_row(index.row())[index.column()]
+
+        if role == Qt.DisplayRole:
+            return None if value is None else str(value)
+        if role == Qt.EditRole or role == TYPED_VALUE_ROLE:
+            return value
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        '''
+        QAbstractItemModel.setData()の実装です。値はその場でテーブルに書き込まれます。
+        '''
+        if not index.isValid() or role not in (Qt.EditRole, Qt.DisplayRole, TYPED_VALUE_ROLE):
+            return False
+
+        with self.connection:
+            self.connection.execute(
+                'UPDATE {} SET c{} = ? WHERE id = ?'.format(self.table_name, index.column()),
+                (value, index.row() + 1)
+            )
+        self.pages.pop(index.row() // PAGE_SIZE, None)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        '''
+        QAbstractItemModel.flags()の実装です。
+        '''
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.headerData()の実装です。
+        '''
+        if (orientation == Qt.Horizontal and role == Qt.DisplayRole
+                and section < len(self.header_labels)):
+            return self.header_labels[section]
+        return super().headerData(section, orientation, role)
+
+    def append_row(self, values):
+        '''
+        テーブルの末尾に1行追加します。追加は1つのトランザクションとしてその場で書き込まれます。
+
+        Parameters:
+        values -- list型 列の順に並んだ値のリスト。足りない列はNoneになる
+
+        Return: int型 追加された行の番号
+        '''
+        return self.append_rows([values])
+
+    def append_rows(self, rows):
+        '''
+        テーブルの末尾に複数の行を追加します。
+
+        追加は1つのトランザクションとして書き込まれ、rowsInserted シグナルは1回だけ放出されます。
+
+        Parameters:
+        rows -- iterable型 列の順に並んだ値のリストを返すイテラブル。足りない列はNoneになる
+
+        Return: int型 追加された最初の行の番号
+        '''
+        number_of_columns = self.columnCount()
+        rows = [
+            list(values)[:number_of_columns] + [None] * (number_of_columns - len(values))
+            for values in rows
+        ]
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO {} ({}) VALUES ({})'.format(
+                    self.table_name,
+                    ', '.join('c{}'.format(column) for column in range(number_of_columns)),
+                    ', '.join('?' * number_of_columns)
+                ),
+                rows
+            )
+            # トランザクションの中では、ほかの接続は行を追加できない
+            number_of_rows = count_rows(self.connection, self.table_name)
+
+        # ほかの接続が先に追加した行があれば、それも含めて取り込まれる
+        self.extend_rows(number_of_rows)
+
+        return number_of_rows - len(rows)
+
+    def watch(self, interval):
+        '''
+        interval ミリ秒ごとにpoll()を呼び出し、ほかの接続が追加した行を取り込みます。
+
+        イベントループがない（QCoreApplicationが存在しない）場合は何もしません。poll()を直接呼び出してください。
+
+        Parameters:
+        interval -- int型 調べる間隔のミリ秒数
+        '''
+        if QCoreApplication.instance() is None:
+            return
+
+        if self.watch_timer is None:
+            self.watch_timer = QTimer(self)
+            self.watch_timer.timeout.connect(self.poll)
+        self.watch_timer.start(interval)
+
+    def poll(self):
+        '''
+        ほかの接続がデータベースを変更していれば、キャッシュを捨て、追加された行を取り込みます。
+
+        変更の有無は PRAGMA data_version で調べるため、変更がなければテーブルは読みません。
+
+        Return: int型 取り込んだ行数
+        '''
+        data_version = read_data_version(self.connection)
+        if data_version == self.data_version:
+            return 0
+        self.data_version = data_version
+
+        # ほかの接続による値の変更は、次に表示されるときに読み込まれる
+        self.pages.clear()
+
+        number_of_rows = self.number_of_rows
+        self.extend_rows(count_rows(self.connection, self.table_name))
+        return self.number_of_rows - number_of_rows
+
+    def extend_rows(self, number_of_rows):
+        '''
+        行数をnumber_of_rowsまで増やし、増えた行について rowsInserted シグナルを放出します。
+        '''
+        if number_of_rows <= self.number_of_rows:
+            return
+
+        # 最後のページは行が足りないままキャッシュされているかもしれない
+        self.pages.pop(self.number_of_rows // PAGE_SIZE, None)
+
+        self.beginInsertRows(QModelIndex(), self.number_of_rows, number_of_rows - 1)
+        self.number_of_rows = number_of_rows
+        self.endInsertRows()
+
+    def column_values(self, column, role=Qt.DisplayRole):
+        '''
+        column列目の値を、data()と同じ形でまとめてリストにして返します。
+
+        Parameters:
+        column -- int型 列番号
+        role -- Qt.ItemDataRole型 data()のroleと同じ（未指定の場合Qt.DisplayRole）
+
+        Return: list型
+        '''
+        cursor = self.connection.execute(
+            'SELECT c{} FROM {} WHERE id <= ? ORDER BY id'.format(column, self.table_name),
+            (self.number_of_rows,)
+        )
+        values = [value for value, in cursor]
+        if role == Qt.DisplayRole:
+            return [None if value is None else str(value) for value in values]
+        if role == Qt.EditRole or role == TYPED_VALUE_ROLE:
+            return values
+        return [None] * len(values)
+
+    def read_row(self, row):
+        '''
+        row行目の値のタプルを返します。行を含むページがキャッシュになければ読み込みます。
+        '''
+        page_number = row // PAGE_SIZE
+        page = self.pages.get(page_number)
+        if page is None:
+            page = self.read_page(page_number)
+        return page[row - page_number * PAGE_SIZE]
+
+    def read_page(self, page_number):
+        '''
+        page_number番目のページをテーブルから読み込み、キャッシュします。
+        '''
+        first_id = page_number * PAGE_SIZE + 1
+        cursor = self.connection.execute(
+            'SELECT {} FROM {} WHERE id BETWEEN ? AND ? ORDER BY id'.format(
+                ', '.join('c{}'.format(column) for column in range(self.columnCount())),
+                self.table_name
+            ),
+            (first_id, first_id + PAGE_SIZE - 1)
+        )
+        page = cursor.fetchall()
+
+        # 古いページから捨てる
+        if len(self.pages) >= MAX_CACHED_PAGES:
+            del self.pages[next(iter(self.pages))]
+        self.pages[page_number] = page
+
+        return page
+
+def create_table(connection, table_name, header_labels, columns, number_of_rows):
+    '''
+    列ごとの値から、SqliteTableModelで読み込めるテーブルを作ります。すでにあるテーブルは置き換えられます。
+
+    列の名前は c0, c1, ... となり、ヘッダは headers テーブルに保存されます。
+
+    Parameters:
+    connection -- sqlite3.Connection型 データベースへの接続
+    table_name -- str型 テーブル名
+    header_labels -- list型 ヘッダの文字列のリスト
+    columns -- list型 列ごとの値のリストのリスト
+    number_of_rows -- int型 行数
+    '''
+    number_of_columns = len(header_labels)
+    column_names = ['c{}'.format(column) for column in range(number_of_columns)]
+
+    with connection:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS headers '
+            '(table_name TEXT, position INTEGER, label TEXT, PRIMARY KEY (table_name, position))'
+        )
+        connection.execute('DELETE FROM headers WHERE table_name = ?', (table_name,))
+        connection.executemany(
+            'INSERT INTO headers VALUES (?, ?, ?)',
+            [(table_name, position, label) for position, label in enumerate(header_labels)]
+        )
+
+        connection.execute('DROP TABLE IF EXISTS {}'.format(table_name))
+        connection.execute('CREATE TABLE {} (id INTEGER PRIMARY KEY, {})'.format(
+            table_name, ', '.join(column_names)
+        ))
+
+        # 長さの足りない列はNoneで埋める
+        columns = [
+            columns[column] if column < len(columns) else [None] * number_of_rows
+            for column in range(number_of_columns)
+        ]
+        connection.executemany(
+            'INSERT INTO {} (id, {}) VALUES (?, {})'.format(
+                table_name, ', '.join(column_names), ', '.join('?' * number_of_columns)
+            ),
+            ((row + 1,) + values for row, values in enumerate(zip(*columns)))
+        )
+
+def create_index(connection, table_name, column):
+    '''
+    テーブルのcolumn列目に索引を作ります。すでにある場合は何もしません。
+    '''
+    with connection:
+        connection.execute('CREATE INDEX IF NOT EXISTS {0}_c{1} ON {0} (c{1})'.format(
+            table_name, column
+        ))
+
+def read_header_labels(connection, table_name):
+    '''
+    テーブルのヘッダの文字列のリストを返します。テーブルがない場合は空のリストを返します。
+    '''
+    try:
+        cursor = connection.execute(
+            'SELECT label FROM headers WHERE table_name = ? ORDER BY position', (table_name,)
+        )
+    except sqlite3.OperationalError:
+        # headers テーブルがまだない
+        return []
+    return [label for label, in cursor]
+
+def read_data_version(connection):
+    '''
+    PRAGMA data_version の値を返します。この値は、ほかの接続がデータベースを変更するたびに変わります。
+    '''
+    data_version, = connection.execute('PRAGMA data_version').fetchone()
+    return data_version
+
+def count_rows(connection, table_name):
+    '''
+    テーブルの行数を返します。
+
+    行は削除されず id は1から連続しているため、全体を数える代わりに id の最大値を使います。
+    '''
+    number_of_rows, = connection.execute(
+        'SELECT coalesce(max(id), 0) FROM {}'.format(table_name)
+    ).fetchone()
+    return number_of_rows
@@ -0,0 +1,672 @@
+'''
+Managerが全商品一覧と購入済み商品一覧を読み書きする保存先（ストレージ）のためのモジュールです。
+'''
+
+import abc
+import copy
+import datetime
+import os
+import sqlite3
+from columnar_model import ColumnarTableModel
+from excelio import ExcelQtConverter, convert_columns_to_qtmodel, set_header_labels
+from loader import ModelFeeder, WorkbookLoader
+from openpyxl import Workbook
+from PyQt5.QtGui import QStandardItemModel
+from sheet_cache import hash_file, read_stat
+from snapshot_model import (
+    SnapshotException, SnapshotTableModel, read_snapshot_stamp, update_snapshot_stamp,
+    write_snapshot
+)
+from sqlite_model import SqliteTableModel, create_index, create_table
+
+# SQLiteのデータベースとして扱うファイルの拡張子
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Excelファイル名と区分（partition）の間の区切り。e.g. '会計用.2026-10-17.xlsx'
+# 空白はファイル名そのものや「会計用 コピー.xlsx」のような複製にも含まれるため使わない
+PARTITION_SEPARATOR = '.'
+
+# 区分の形式。today_partition()が返す'YYYY-MM-DD'形式の文字列だけを区分とする
+PARTITION_FORMAT = '%Y-%m-%d'
+
+class StorageException(Exception):
+    pass
+
+class Storage(abc.ABC):
+
+    '''
+    保存先の基底クラスです。Managerはこのクラスのメソッドだけを使って保存先を読み書きします。
+
+    新しい保存先を作るときはこのクラスを継承し、各メソッドを実装してください。
+    抽象メソッドを1つでも実装していない保存先は、作ろうとした時点でTypeErrorになります。
+
+    Attributes:
+    durable_inserts -- bool型 Trueの場合、購入済み商品の追加はその場で確実に保存されるため、
+                       Managerはジャーナルを使わない
+    partition -- str型 読み書きする購入済み商品一覧の区分。区分に分けない場合はNone
+    '''
+
+    durable_inserts = False
+    partition = None
+
+    @abc.abstractmethod
+    def load_all_item_model(self):
+        '''
+        全商品一覧のQtモデルを返します。商品番号（0列目）はstr型の値として読み込まれます。
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load_purchased_item_model(self, column_for_customer_id, column_for_item_id):
+        '''
+        購入済み商品一覧のQtモデルを返します。顧客番号と商品番号の表示用の値（DisplayRole）はstr型です。
+
+        Parameters:
+        column_for_customer_id -- int型 顧客番号を格納する列
+        column_for_item_id -- int型 商品番号を格納する列
+        '''
+        raise NotImplementedError
+
+    def load_models_in_background(self, column_for_customer_id, column_for_item_id):
+        '''
+        全商品一覧と購入済み商品一覧のQtモデルと、それらの中身を読み込むloader.ModelFeederを返します。
+
+        ModelFeeder.start()を呼び出すと、読み込んだ行がモデルに少しずつ追加されていき、
+        すべて読み込み終えるとGUIのスレッドで ModelFeeder.loaded シグナルが放出されます。
+        それまでは購入済み商品一覧を変更しないでください。
+        この実装はload_all_item_model()とload_purchased_item_model()でその場で読み込み、
+        ModelFeederの代わりにNoneを返します。
+
+        Parameters:
+        column_for_customer_id -- int型 顧客番号を格納する列
+        column_for_item_id -- int型 商品番号を格納する列
+
+        Return: (全商品一覧のモデル, 購入済み商品一覧のモデル, loader.ModelFeederまたはNone) のタプル
+        '''
+        return (
+            self.load_all_item_model(),
+            self.load_purchased_item_model(column_for_customer_id, column_for_item_id),
+            None
+        )
+
+    @abc.abstractmethod
+    def save_purchased_item_model(self, qt_model):
+        '''
+        購入済み商品一覧のQtモデルの変更を保存します。
+
+        モデルの rowsInserted, dataChanged シグナルが放出されるたびに呼び出されます。
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_save_listener(self, listener):
+        '''
+        購入済み商品一覧が保存された後に呼び出される関数を登録します。
+
+        Parameters:
+        listener -- 引数をとらない呼び出し可能オブジェクト
+        '''
+        raise NotImplementedError
+
+    def flush(self):
+        '''
+        まだ保存されていない購入済み商品一覧の変更を、その場で保存します。
+
+        この実装は変更をその場で保存する保存先のためのもので、何もしません。
+        '''
+        pass
+
+    def list_partitions(self):
+        '''
+        保存先にある購入済み商品一覧の区分のリストを、古い順に返します。
+
+        この実装は購入済み商品一覧を区分に分けない保存先のためのもので、空のリストを返します。
+        '''
+        return []
+
+    def load_partition_model(self, partition, column_for_customer_id, column_for_item_id):
+        '''
+        購入済み商品一覧の区分を、読み取り専用のQtモデルとして読み込みます。
+
+        返されるモデルの変更は保存先に書き戻されません。
+
+        Parameters:
+        partition -- str型 区分。list_partitions()が返す値のいずれか
+        column_for_customer_id -- int型 顧客番号を格納する列
+        column_for_item_id -- int型 商品番号を格納する列
+
+        Raises:
+        StorageException -- 保存先にない区分の場合
+        '''
+        raise StorageException('区分 {} はありません'.format(partition))
+
+    def open_partition(self, partition):
+        '''
+        同じ保存先の、別の区分の購入済み商品一覧を読み書きする保存先を返します。
+
+        この実装は購入済み商品一覧を区分に分けない保存先のためのもので、StorageExceptionを送出します。
+
+        Parameters:
+        partition -- str型 区分
+
+        Raises:
+        StorageException -- 区分に分けない保存先の場合や、区分が'YYYY-MM-DD'形式でない場合
+        '''
+        raise StorageException('この保存先は購入済み商品一覧を区分に分けられません')
+
+class ExcelStorage(Storage):
+
+    '''
+    1つのExcelファイルの2つのシートを保存先とします。
+
+    partitionを指定すると、購入済み商品一覧は日付の区分ごとのExcelファイル
+    「ファイル名 + PARTITION_SEPARATOR + 区分 + 拡張子」（partition_file_name()）の
+    sheet_name_for_purchased_itemsのシートに分けられ、全商品一覧だけがfile_nameのファイルに残ります。
+    読み込み・書き戻しの対象は指定した区分のファイルだけで、ファイルがなければ最初の書き戻しで作られます。
+    保存のたびに書き直されるのもその区分のファイルだけなので、会計の記録が増えても保存にかかる時間は変わりません。
+    ほかの区分のファイルはload_partition_model()で求められたときに、キャッシュを使わずに読み込まれます。
+
+    Parameters:
+    file_name -- str型 エクセルファイルのファイル名
+    sheet_name_for_all_items -- str型 全商品一覧を格納したシートの名前
+    sheet_name_for_purchased_items -- str型 購入済み商品一覧を格納したシートの名前
+    read_only -- bool型 Trueの場合、必要なシートだけをストリーミングで読み込む
+                 （未指定の場合True）
+    cache_file_name -- str型 読み込んだシートのキャッシュファイルのファイル名
+                       （未指定の場合、ファイル名の拡張子を .cache にしたもの）
+    item_snapshot_file_name -- str型 全商品一覧のスナップショット（snapshot_model.write_snapshot()）の
+                               ファイル名。指定した場合、全商品一覧はスナップショットをmmapした
+                               読み取り専用のSnapshotTableModelになり、同じマシンの複数のレジで
+                               ページキャッシュを共有できる。購入済み商品一覧を同じファイルに保存しても
+                               スナップショットは作り直されない。Noneの場合は使わない（未指定の場合None）
+    partition -- str型 読み書きする購入済み商品一覧の区分。today_partition()と同じ'YYYY-MM-DD'形式の文字列。
+                 Noneの場合は区分に分けず、file_nameのsheet_name_for_purchased_itemsのシートを使う
+                 （未指定の場合None）
+
+    Raises:
+    StorageException -- partitionが'YYYY-MM-DD'形式でない場合
+    '''
+
+    def __init__(self, file_name, sheet_name_for_all_items, sheet_name_for_purchased_items,
+                 read_only=True, cache_file_name=None, item_snapshot_file_name=None,
+                 partition=None):
+        # Excelファイルが前回から変わっていなければ、シートを読まずにキャッシュから読み込む
+        if cache_file_name is None:
+            cache_file_name = os.path.splitext(file_name)[0] + '.cache'
+        self.excel_handler = ExcelQtConverter(
+            file_name, read_only=read_only, cache_file_name=cache_file_name
+        )
+        self.sheet_name_for_all_items = sheet_name_for_all_items
+        self.sheet_name_for_purchased_items = sheet_name_for_purchased_items
+        self.item_snapshot_file_name = item_snapshot_file_name
+
+        # スナップショットと同じ内容のExcelファイルの (大きさ, 更新日時) と、書き込み用に開いたワークブックが
+        # その内容であったか（最初の保存で決まる）
+        self.item_snapshot_stat = None
+        self.item_snapshot_synced = None
+        if item_snapshot_file_name is not None:
+            self.excel_handler.add_save_listener(self.update_item_snapshot_stamp)
+
+        # 購入済み商品一覧を読み書きするExcelQtConverter。区分に分ける場合は現在の区分のファイルを扱う。
+        self.partition = None
+        self.ledger_handler = self.excel_handler
+        if partition is not None:
+            self.set_partition(partition)
+
+    def set_partition(self, partition):
+        '''
+        読み書きする購入済み商品一覧を、partitionの区分のファイルにします。
+
+        1日分のファイルは小さいため、キャッシュは使いません。
+
+        Raises:
+        StorageException -- partitionが'YYYY-MM-DD'形式でない場合
+        '''
+        if not is_partition(partition):
+            raise StorageException(
+                '区分 {!r} は YYYY-MM-DD 形式ではありません'.format(partition)
+            )
+        self.partition = partition
+        self.ledger_handler = ExcelQtConverter(
+            partition_file_name(self.excel_handler.file_name, partition), read_only=True
+        )
+
+    def load_all_item_model(self):
+        '''
+        Storage.load_all_item_model()の実装です。
+        '''
+        if self.item_snapshot_file_name is not None:
+            return self.load_item_snapshot()
+
+        # 商品番号（0列目）は購入済み商品一覧の商品番号と同じく文字列として扱う
+        return self.excel_handler.to_model(
+            self.sheet_name_for_all_items,
+            model_type=ColumnarTableModel,
+            column_types={0: str}
+        )
+
+    def load_purchased_item_model(self, column_for_customer_id, column_for_item_id):
+        '''
+        Storage.load_purchased_item_model()の実装です。
+        '''
+        if not self.has_purchased_item_sheet():
+            return self.create_purchased_item_model()
+
+        # 顧客番号と商品番号の表示用の値は文字列になり、add_item()で追加される値と比べられる。
+        # 書き戻しでシートの型が変わらないよう、列の型はシートの値から推定したままにする
+        return self.ledger_handler.to_model(self.sheet_name_for_purchased_items)
+
+    def load_item_snapshot(self):
+        '''
+        全商品一覧のスナップショットを開きます。
+
+        スナップショットがない場合や、作ったときからExcelファイルが変わっている場合は、シートを読み込んで作り直します。
+        ほかのレジが開いているためにスナップショットを置き換えられない（Windows）場合は、
+        読み込んだ値をそのまま持つColumnarTableModelを返します。
+        '''
+        size, mtime_ns = read_stat(self.excel_handler.file_name)
+        stamp = read_snapshot_stamp(self.item_snapshot_file_name)
+        if stamp is not None and stamp[:2] == (size, mtime_ns):
+            self.item_snapshot_stat = (size, mtime_ns)
+            return SnapshotTableModel(self.item_snapshot_file_name)
+
+        digest = hash_file(self.excel_handler.file_name)
+        if stamp is not None and stamp[0] == size and stamp[2] == digest:
+            self.item_snapshot_stat = (size, mtime_ns)
+            return SnapshotTableModel(self.item_snapshot_file_name)
+
+        header_labels, columns, number_of_rows = self.excel_handler.read_columns(
+            self.sheet_name_for_all_items, column_types={0: str}
+        )
+        try:
+            write_snapshot(
+                self.item_snapshot_file_name,
+                header_labels,
+                columns,
+                number_of_rows,
+                source_stamp=(size, mtime_ns, digest)
+            )
+        except OSError:
+            return convert_columns_to_qtmodel(
+                header_labels, columns, number_of_rows, model_type=ColumnarTableModel
+            )
+        self.item_snapshot_stat = (size, mtime_ns)
+        return SnapshotTableModel(self.item_snapshot_file_name)
+
+    def update_item_snapshot_stamp(self):
+        '''
+        Excelファイルを保存した後に呼び出され、スナップショットに記録された元のファイルの大きさ・更新日時・ハッシュを
+        保存後のファイルのものに書き換えます。
+
+        購入済み商品一覧を書き戻しても全商品一覧のシートは変わらないため、スナップショットはそのまま使えます。
+        記録を書き換えておけば、次の起動でExcelファイルのハッシュを計算したり、シートを読み直したりせずに済みます。
+        書き込み用に開いたワークブックがスナップショットと違う内容だった（ほかのプログラムで全商品一覧を
+        編集していたなど）場合や、全商品一覧のシートも書き戻している場合は書き換えず、次の起動で作り直されます。
+        '''
+        if self.item_snapshot_synced is None:
+            self.item_snapshot_synced = (
+                self.item_snapshot_stat is not None
+                and self.excel_handler.opened_stat == self.item_snapshot_stat
+            )
+        if not self.item_snapshot_synced:
+            return
+        if self.sheet_name_for_all_items in self.excel_handler.trackers:
+            return
+
+        file_name = self.excel_handler.file_name
+        size, mtime_ns = read_stat(file_name)
+        try:
+            update_snapshot_stamp(
+                self.item_snapshot_file_name, (size, mtime_ns, hash_file(file_name))
+            )
+        except (OSError, SnapshotException):
+            self.item_snapshot_synced = False
+            return
+        self.item_snapshot_stat = (size, mtime_ns)
+
+    def load_models_in_background(self, column_for_customer_id, column_for_item_id):
+        '''
+        Storage.load_models_in_background()の実装です。
+
+        2つのシートは作業用のスレッド（loader.WorkbookLoader）で全商品一覧、購入済み商品一覧の順に読み込まれ、
+        loader.CHUNK_SIZE行ずつモデルに追加されます。各シートは読み終えた時点でExcelQtConverterに登録され、
+        以後の変更だけが書き戻されます。
+        全商品一覧のスナップショットを使う場合、全商品一覧はその場で開かれ、購入済み商品一覧だけが読み込まれます。
+        区分に分ける場合、現在の区分のファイルは小さいためその場で読み込まれ、全商品一覧だけが作業用のスレッドで
+        読み込まれます。スナップショットも使う場合は、読み込むものがないためModelFeederの代わりにNoneを返します。
+        '''
+        qt_models = {}
+        sheets = []
+
+        if self.partition is not None:
+            purchased_model = self.load_purchased_item_model(
+                column_for_customer_id, column_for_item_id
+            )
+        else:
+            purchased_model = QStandardItemModel()
+            qt_models[self.sheet_name_for_purchased_items] = purchased_model
+
+            # 型はload_all_item_model(), load_purchased_item_model()と同じ
+            sheets.append((self.sheet_name_for_purchased_items, None))
+
+        if self.item_snapshot_file_name is not None:
+            all_model = self.load_all_item_model()
+        else:
+            all_model = ColumnarTableModel()
+            qt_models[self.sheet_name_for_all_items] = all_model
+            sheets.insert(0, (self.sheet_name_for_all_items, {0: str}))
+
+        if not sheets:
+            return all_model, purchased_model, None
+
+        loader = WorkbookLoader(
+            self.excel_handler.file_name, sheets, sheet_cache=self.excel_handler.sheet_cache
+        )
+        model_feeder = ModelFeeder(loader, qt_models)
+        model_feeder.sheet_loaded.connect(
+            lambda name: self.excel_handler.track_model(qt_models[name], name)
+        )
+
+        return all_model, purchased_model, model_feeder
+
+    def save_purchased_item_model(self, qt_model):
+        '''
+        Storage.save_purchased_item_model()の実装です。
+
+        変更された行だけがシートに書き戻され、ファイルへの保存はExcelQtConverterのタイマーでまとめて行われます。
+        '''
+        self.ledger_handler.from_model(qt_model, self.sheet_name_for_purchased_items)
+
+    def add_save_listener(self, listener):
+        '''
+        Storage.add_save_listener()の実装です。
+        '''
+        self.ledger_handler.add_save_listener(listener)
+
+    def flush(self):
+        '''
+        Storage.flush()の実装です。タイマーを待たずに、購入済み商品一覧の変更をファイルに保存します。
+        '''
+        self.ledger_handler.flush()
+
+    def open_partition(self, partition):
+        '''
+        Storage.open_partition()の実装です。
+
+        全商品一覧のファイルとそのキャッシュは、この保存先と共有します。
+        '''
+        partition_storage = copy.copy(self)
+        partition_storage.set_partition(partition)
+        return partition_storage
+
+    def list_partitions(self):
+        '''
+        Storage.list_partitions()の実装です。
+
+        file_nameと同じディレクトリにある区分のファイル（partition_file_name()）の区分を、古い順に返します。
+        ファイルの名前だけを調べ、中身は読み込みません。区分が'YYYY-MM-DD'形式でないファイル
+        （「会計用.2026-10-17 (1).xlsx」のような複製など）は区分とみなしません。
+        '''
+        directory, base_name = os.path.split(self.excel_handler.file_name)
+        stem, extension = os.path.splitext(base_name)
+        prefix = stem + PARTITION_SEPARATOR
+        partitions = []
+        for name in os.listdir(directory or os.curdir):
+            if name.startswith(prefix) and name.endswith(extension):
+                partition = name[len(prefix):len(name) - len(extension)]
+                if is_partition(partition):
+                    partitions.append(partition)
+        return sorted(partitions)
+
+    def load_partition_model(self, partition, column_for_customer_id, column_for_item_id):
+        '''
+        Storage.load_partition_model()の実装です。
+
+        区分のファイルは読み取り専用のColumnarTableModelとして読み込まれ、書き戻しの対象にはなりません。
+        一度しか読まない過去の区分でキャッシュファイルが大きくならないよう、キャッシュは使いません。
+        現在の区分を指定した場合も、その時点でファイルに保存されている内容が読み込まれます。
+        '''
+        if not is_partition(partition):
+            raise StorageException('区分 {!r} は YYYY-MM-DD 形式ではありません'.format(partition))
+
+        file_name = partition_file_name(self.excel_handler.file_name, partition)
+        if not os.path.exists(file_name):
+            raise StorageException('区分 {} のファイル {} はありません'.format(partition, file_name))
+
+        # to_model()と違い、書き戻しのためにモデルを登録しない
+        header_labels, columns, number_of_rows = ExcelQtConverter(
+            file_name, read_only=True
+        ).read_columns(
+            self.sheet_name_for_purchased_items,
+            column_types={column_for_customer_id: str, column_for_item_id: str}
+        )
+        qt_model = ColumnarTableModel(read_only=True)
+        qt_model.set_columns(header_labels, columns, number_of_rows)
+        return qt_model
+
+    def has_purchased_item_sheet(self):
+        '''
+        読み書きする購入済み商品一覧のシートがあればTrueを返します。
+
+        区分に分けていない場合は、シートがあるものとみなします。
+        '''
+        if self.partition is None:
+            return True
+        return self.sheet_name_for_purchased_items in self.ledger_handler.sheet_names()
+
+    def create_purchased_item_model(self):
+        '''
+        まだファイルのない区分のための、空の購入済み商品一覧のモデルを作ります。ファイルは最初の書き戻しで作られます。
+
+        ヘッダは最も新しい区分のファイルから、それもなければfile_nameの購入済み商品一覧のシートから写します。
+        '''
+        purchased_model = QStandardItemModel()
+
+        file_name = self.excel_handler.file_name
+        candidates = [
+            ExcelQtConverter(partition_file_name(file_name, partition), read_only=True)
+            for partition in reversed(self.list_partitions()) if partition != self.partition
+        ]
+        candidates.append(self.excel_handler)
+        for excel_handler in candidates:
+            if self.sheet_name_for_purchased_items in excel_handler.sheet_names():
+                set_header_labels(
+                    purchased_model, excel_handler.read_header(self.sheet_name_for_purchased_items)
+                )
+                break
+
+        # 最初の追加と同時に書き戻されるよう、行が追加される前に登録しておく
+        self.ledger_handler.track_model(
+            purchased_model, self.sheet_name_for_purchased_items, synced=False
+        )
+        return purchased_model
+
+class SqliteStorage(Storage):
+
+    '''
+    SQLiteのデータベースを保存先とします。
+
+    全商品一覧は items テーブルに、購入済み商品一覧は sales テーブルに保存されます。
+    購入済み商品の追加は1件ごとに1つのトランザクションで書き込まれ、Qtモデルは必要な行だけを読み込みます。
+    既存のExcelファイルとの間で、import_workbook(), export_workbook() で内容を移せます。
+
+    データベースはWALモードで開かれるため、同じマシンの複数のレジ（プロセス）が同じファイルを
+    同時に開いて会計できます。書き込みは1件ずつのトランザクションで、読み込みは書き込みを待ちません。
+    ほかのレジが追加した購入済み商品は、poll_interval ミリ秒ごとに調べて rowsInserted シグナルで
+    通知されます。WALモードは共有メモリを使うため、ネットワーク上のファイルには使えません。
+
+    Parameters:
+    file_name -- str型 データベースのファイル名
+    poll_interval -- int型 ほかのレジが追加した行を調べる間隔のミリ秒数。
+                     Noneの場合は調べない（未指定の場合500）
+    '''
+
+    durable_inserts = True
+
+    ITEM_TABLE = 'items'
+    SALE_TABLE = 'sales'
+
+    # ほかのレジが書き込み中の場合に待つ秒数
+    BUSY_TIMEOUT = 10.0
+
+    def __init__(self, file_name, poll_interval=500):
+        self.file_name = file_name
+        self.poll_interval = poll_interval
+        self.connection = sqlite3.connect(file_name, timeout=self.BUSY_TIMEOUT)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.save_listeners = []
+
+    def load_all_item_model(self):
+        '''
+        Storage.load_all_item_model()の実装です。
+        '''
+        qt_model = SqliteTableModel(self.connection, self.ITEM_TABLE)
+        # 商品番号で商品を探せるようにする
+        create_index(self.connection, self.ITEM_TABLE, 0)
+        return qt_model
+
+    def load_purchased_item_model(self, column_for_customer_id, column_for_item_id):
+        '''
+        Storage.load_purchased_item_model()の実装です。
+        '''
+        qt_model = SqliteTableModel(self.connection, self.SALE_TABLE)
+        create_index(self.connection, self.SALE_TABLE, column_for_customer_id)
+        create_index(self.connection, self.SALE_TABLE, column_for_item_id)
+        if self.poll_interval is not None:
+            qt_model.watch(self.poll_interval)
+        return qt_model
+
+    def save_purchased_item_model(self, qt_model):
+        '''
+        Storage.save_purchased_item_model()の実装です。
+
+        SqliteTableModelへの変更はその場でコミットされているため、登録された関数を呼び出すだけです。
+        '''
+        for listener in self.save_listeners:
+            listener()
+
+    def add_save_listener(self, listener):
+        '''
+        Storage.add_save_listener()の実装です。
+        '''
+        self.save_listeners.append(listener)
+
+    def import_workbook(self, xlsx_file_name, sheet_name_for_all_items,
+                        sheet_name_for_purchased_items):
+        '''
+        Excelファイルの全商品一覧と購入済み商品一覧を読み込み、データベースの内容を置き換えます。
+
+        商品番号（全商品一覧の0列目）と、購入済み商品一覧の顧客番号・商品番号（0列目と1列目）は
+        str型の値として保存されます。
+
+        Parameters:
+        xlsx_file_name -- str型 エクセルファイルのファイル名
+        sheet_name_for_all_items -- str型 全商品一覧を格納したシートの名前
+        sheet_name_for_purchased_items -- str型 購入済み商品一覧を格納したシートの名前
+        '''
+        excel_handler = ExcelQtConverter(xlsx_file_name, read_only=True)
+        for table_name, sheet_name, column_types in (
+                (self.ITEM_TABLE, sheet_name_for_all_items, {0: str}),
+                (self.SALE_TABLE, sheet_name_for_purchased_items, {0: str, 1: str})):
+            qt_model = excel_handler.to_model(
+                sheet_name, model_type=ColumnarTableModel, column_types=column_types
+            )
+            create_table(
+                self.connection,
+                table_name,
+                qt_model.header_labels,
+                qt_model.columns,
+                qt_model.number_of_rows
+            )
+
+    def export_workbook(self, xlsx_file_name, sheet_name_for_all_items,
+                        sheet_name_for_purchased_items):
+        '''
+        データベースの全商品一覧と購入済み商品一覧を、Excelファイルのシートに書き出します。
+
+        ファイルがない場合は新しく作ります。ファイルにあるほかのシートはそのまま残ります。
+
+        Parameters:
+        xlsx_file_name -- str型 エクセルファイルのファイル名
+        sheet_name_for_all_items -- str型 全商品一覧を書き出すシートの名前
+        sheet_name_for_purchased_items -- str型 購入済み商品一覧を書き出すシートの名前
+        '''
+        if not os.path.exists(xlsx_file_name):
+            px_workbook = Workbook()
+            px_workbook.active.title = sheet_name_for_all_items
+            px_workbook.save(xlsx_file_name)
+
+        excel_handler = ExcelQtConverter(xlsx_file_name)
+        excel_handler.from_model(
+            SqliteTableModel(self.connection, self.ITEM_TABLE), sheet_name_for_all_items
+        )
+        excel_handler.from_model(
+            SqliteTableModel(self.connection, self.SALE_TABLE), sheet_name_for_purchased_items
+        )
+        excel_handler.flush()
+
+    def close(self):
+        '''
+        データベースとの接続を閉じます。
+        '''
+        self.connection.close()
+
+def open_storage(file_name, sheet_name_for_all_items, sheet_name_for_purchased_items,
+                 read_only=True, partition=None):
+    '''
+    ファイル名の拡張子から保存先を選んで開きます。
+
+    拡張子がSQLITE_EXTENSIONSのいずれかであればSqliteStorageを、それ以外はExcelStorageを返します。
+    SqliteStorageは必要な行だけを読み込むため、購入済み商品一覧を区分に分けません。
+
+    Raises:
+    StorageException -- SQLiteのデータベースにpartitionを指定した場合
+    '''
+    if os.path.splitext(file_name)[1].lower() in SQLITE_EXTENSIONS:
+        if partition is not None:
+            raise StorageException('SQLiteのデータベースは購入済み商品一覧を区分に分けられません')
+        return SqliteStorage(file_name)
+    return ExcelStorage(
+        file_name,
+        sheet_name_for_all_items,
+        sheet_name_for_purchased_items,
+        read_only=read_only,
+        partition=partition
+    )
+
+def partition_file_name(file_name, partition):
+    '''
+    購入済み商品一覧の区分を格納するExcelファイルのファイル名を返します。
+
+    Parameters:
+    file_name -- str型 全商品一覧を格納したエクセルファイルのファイル名
+    partition -- str型 区分
+        e.g. partition_file_name('会計用.xlsx', '2026-10-17') == '会計用.2026-10-17.xlsx'
+    '''
+    stem, extension = os.path.splitext(file_name)
+    return stem + PARTITION_SEPARATOR + str(partition) + extension
+
+def today_partition():
+    '''
+    今日の日付の区分（'YYYY-MM-DD'形式の文字列）を返します。文字列の順は日付の順と一致します。
+    '''
+    return datetime.date.today().strftime(PARTITION_FORMAT)
+
+def is_partition(partition):
+    '''
+    partitionがtoday_partition()の返しうる区分（'YYYY-MM-DD'形式の実在する日付）であればTrueを返します。
+
+    Parameters:
+    partition -- 調べる値
+        e.g. is_partition('2026-10-17') -> True
+             is_partition('2026-10-17 (1)') -> False
+             is_partition('2026-1-7') -> False
+    '''
+    if not isinstance(partition, str):
+        return False
+    try:
+        date = datetime.datetime.strptime(partition, PARTITION_FORMAT)
+    except ValueError:
+        return False
+    # strptime()は'2026-1-7'のようなゼロ埋めのない値も受け付けるため、書き戻して比べる
+    return date.strftime(PARTITION_FORMAT) == partition
@@ -0,0 +1,48 @@
+'''
+benchmark.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import io
+import json
+import random
+import unittest
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+
+    '''
+    合成データの生成と、小さなデータでのベンチマークの実行をチェックします。
+    '''
+
+    def test_generated_rows(self):
+        '''
+        合成データの重複率と、全商品一覧にない商品番号の割合は指定したとおりになる。
+        '''
+        random_generator = random.Random(0)
+        item_rows = benchmark.generate_item_rows(2000, 0.2, random_generator)
+        item_ids = [item_id for item_id, name, price in item_rows]
+        sale_rows = benchmark.generate_sale_rows(2000, item_ids, 0.1, random_generator)
+
+        duplicate_rate = 1 - len(set(item_ids)) / len(item_ids)
+        miss_rate = sum(item_id not in set(item_ids) for customer_id, item_id in sale_rows) / 2000
+        self.assertAlmostEqual(duplicate_rate, 0.2, delta=0.05)
+        self.assertAlmostEqual(miss_rate, 0.1, delta=0.05)
+
+    def test_run_benchmarks(self):
+        '''
+        各ステージの結果が1行1件のJSONとして出力される。
+        '''
+        output = io.StringIO()
+        benchmark.run_benchmarks([30], list(benchmark.STAGES), 0.1, 0.1, 0, output)
+
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([result['stage'] for result in results], list(benchmark.STAGES))
+        for result in results:
+            self.assertEqual(result['rows'], 30)
+            self.assertGreaterEqual(result['seconds'], 0)
+            self.assertGreater(result['peak_traced_bytes'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+'''
+columnar_model.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import unittest
+from itertools import product
+from columnar_model import ColumnarTableModel
+from excelio import convert_openpyxl_to_qtmodel
+from openpyxl import Workbook
+from PyQt5.QtCore import Qt
+import relation_proxy_model
+
+class TestColumnarTableModel(unittest.TestCase):
+
+    '''
+    ColumnarTableModelが表の値を正しく保持するかチェックします。
+    '''
+
+    def test_convert_openpyxl_to_columnar_model(self):
+        '''
+        openpyxlのワークシートをColumnarTableModelに変換しても表の内容は変化しない。
+        '''
+        data = create_fruit_price_data()
+        px_worksheet = convert_index_value_pair_to_openpyxl(data)
+
+        qt_model = convert_openpyxl_to_qtmodel(px_worksheet, model_type=ColumnarTableModel)
+
+        self.assertEqual(convert_columnar_model_to_index_value_pair(qt_model), data)
+
+    def test_rows_of_different_length(self):
+        '''
+        長さの違う行は、足りない部分がNoneで埋められる。
+        '''
+        qt_model = ColumnarTableModel()
+        qt_model.set_rows(['Fruit'], [('Apple',), ('Berry', '400', 'Blue')])
+
+        self.assertEqual(qt_model.rowCount(), 2)
+        self.assertEqual(qt_model.columnCount(), 3)
+        self.assertEqual(qt_model.columns, [['Apple', 'Berry'], [None, '400'], [None, 'Blue']])
+        self.assertIsNone(qt_model.data(qt_model.index(0, 2)))
+
+    def test_set_data(self):
+        '''
+        setData()で値を書き換えると、dataChangedシグナルが放出される。
+        '''
+        qt_model = ColumnarTableModel()
+        qt_model.set_rows(['Fruit', 'Price'], [('Apple', 300)])
+
+        changed = []
+        qt_model.dataChanged.connect(lambda topleft, bottomright: changed.append(topleft.row()))
+
+        qt_model.setData(qt_model.index(0, 1), 350)
+
+        self.assertEqual(qt_model.data(qt_model.index(0, 1), Qt.EditRole), 350)
+        self.assertEqual(qt_model.data(qt_model.index(0, 1)), '350')
+        self.assertEqual(changed, [0])
+
+    def test_column_values(self):
+        '''
+        column_values()は、列全体の値をdata()と同じ形でまとめて返す。
+        '''
+        qt_model = ColumnarTableModel()
+        qt_model.set_rows(['Fruit', 'Price'], [('Apple', 300), ('Berry', None)])
+
+        self.assertEqual(qt_model.column_values(1), ['300', None])
+        self.assertEqual(qt_model.column_values(1, Qt.EditRole), [300, None])
+
+    def test_append_rows(self):
+        '''
+        append_rows()は行を末尾にまとめて追加し、rowsInserted シグナルを1回だけ放出する。
+        '''
+        qt_model = ColumnarTableModel()
+        qt_model.setHorizontalHeaderLabels(['Fruit', 'Price'])
+        inserted = []
+        qt_model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+        qt_model.append_rows([['Apple', 300], ['Berry'], ['Cherry', 500, 'extra']])
+
+        self.assertEqual(inserted, [(0, 2)])
+        self.assertEqual(qt_model.column_values(0), ['Apple', 'Berry', 'Cherry'])
+        self.assertEqual(qt_model.column_values(1, Qt.EditRole), [300, None, 500])
+
+    def test_as_sub_model_of_relation_proxy_model(self):
+        '''
+        ColumnarTableModelはRelationProxyModelの副モデルとして使える。
+        '''
+        fruit_color_model = ColumnarTableModel()
+        fruit_color_model.set_rows(['Fruit', 'Color'], [('Berry', 'Blue'), ('Apple', 'Red')])
+        fruit_price_model = ColumnarTableModel()
+        fruit_price_model.set_rows(['Fruit', 'Price'], [('Apple', '300'), ('Berry', '400')])
+
+        proxy = relation_proxy_model.RelationProxyModel(fruit_color_model, 0, fruit_price_model, 0)
+
+        self.assertEqual(proxy.data(proxy.index(0, 3)), '400')
+        self.assertEqual(proxy.data(proxy.index(1, 3)), '300')
+
+
+def convert_columnar_model_to_index_value_pair(qt_model):
+    '''
+    ColumnarTableModelをもとにindexとvalueのペアからなる辞書を作ります。
+    ヘッダは0行目として扱います。
+    '''
+    ret = {}
+    for column in range(qt_model.columnCount()):
+        ret[(0, column)] = qt_model.headerData(column, Qt.Horizontal)
+
+    for row, column in product(range(qt_model.rowCount()), range(qt_model.columnCount())):
+        ret[(row + 1, column)] = qt_model.data(qt_model.index(row, column))
+
+    return ret
+
+def convert_index_value_pair_to_openpyxl(data):
+    '''
+    data引数をもとにopenpyxlのワークシートを作ります。
+
+    Parameters:
+    data -- セルのインデックスをキーに、セルの値を値にもつ辞書。
+            セルのインデックスは(row, column)のtupleで、(0,0)から。
+
+    Return:
+    openpyxlのワークシート
+    '''
+    px_workbook = Workbook()
+    px_worksheet = px_workbook.active
+
+    for index, value in data.items():
+        px_worksheet.cell(row=index[0] + 1, column=index[1] + 1, value=value)
+
+    return px_worksheet
+
+def create_fruit_price_data():
+    '''
+    ダミーデータを返します。
+
+    果物の値段のテーブルを返します。
+    '''
+    data = {
+        (0,0): 'Fruit',
+        (0,1): 'Price',
+        (1,0): 'Apple',
+        (1,1): '300',
+        (2,0): 'Berry',
+        (2,1): '400'
+    }
+    return data
+
+if __name__ == '__main__':
+    unittest.main()
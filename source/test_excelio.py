@@ -4,10 +4,18 @@ model.pyの機能をチェックするunit testです。
 
 # unit test については https://docs.python.jp/3/library/unittest.html
 
+import gc
+import os
+import tempfile
 import unittest
+import weakref
 from itertools import product
 import model
-from openpyxl import Workbook
+from columnar_model import TYPED_VALUE_ROLE, ColumnarTableModel
+from excelio import ExcelIOException, ExcelQtConverter, convert_openpyxl_to_qtmodel
+from openpyxl import Workbook, load_workbook
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from sheet_cache import SheetCache
 
 class TestConversionBetweenQtmodelAndOpenpyxl(unittest.TestCase):
 
@@ -35,6 +43,234 @@ class TestConversionBetweenQtmodelAndOpenpyxl(unittest.TestCase):
         self.assertEqual(data, reversed_data)
 
 
+class TestColumnTypeInference(unittest.TestCase):
+
+    '''
+    Excel→Qtの変換で、列の型が正しく推定されるかチェックします。
+    '''
+
+    def test_typed_values(self):
+        '''
+        数値の列はint型のまま、空のセルはNoneとしてTYPED_VALUE_ROLEで取り出せる。
+        '''
+        px_worksheet = convert_index_value_pair_to_openpyxl(create_item_data())
+
+        for model_type in (QStandardItemModel, ColumnarTableModel):
+            qt_model = convert_openpyxl_to_qtmodel(px_worksheet, model_type=model_type)
+
+            self.assertEqual(qt_model.data(qt_model.index(0, 2), TYPED_VALUE_ROLE), 200)
+            self.assertEqual(qt_model.data(qt_model.index(0, 2)), '200')
+            self.assertIsNone(qt_model.data(qt_model.index(1, 3)))
+            self.assertIsNone(qt_model.data(qt_model.index(1, 3), TYPED_VALUE_ROLE))
+
+    def test_column_types(self):
+        '''
+        column_typesで指定された列は、その型に揃えられる。
+        '''
+        px_worksheet = convert_index_value_pair_to_openpyxl(create_item_data())
+
+        qt_model = convert_openpyxl_to_qtmodel(
+            px_worksheet, model_type=ColumnarTableModel, column_types={'商品番号': str}
+        )
+
+        self.assertEqual(qt_model.columns[0], ['22072', '22024'])
+
+    def test_column_types_with_invalid_value(self):
+        '''
+        column_typesで指定された型に変換できない値があると、ExcelIOExceptionを送出する。
+        '''
+        px_worksheet = convert_index_value_pair_to_openpyxl(create_item_data())
+
+        with self.assertRaises(ExcelIOException):
+            convert_openpyxl_to_qtmodel(px_worksheet, column_types={1: int})
+
+    def test_without_header(self):
+        '''
+        header=Falseの場合、1行目もデータとして扱われる。
+        '''
+        px_worksheet = convert_index_value_pair_to_openpyxl(create_fruit_price_data())
+
+        qt_model = convert_openpyxl_to_qtmodel(
+            px_worksheet, model_type=ColumnarTableModel, header=False
+        )
+
+        self.assertEqual(qt_model.rowCount(), 3)
+        self.assertEqual(qt_model.data(qt_model.index(0, 0)), 'Fruit')
+
+
+class TestExcelQtConverterReadOnly(unittest.TestCase):
+
+    '''
+    読み取り専用モードのExcelQtConverterをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'fruit.xlsx')
+        px_worksheet = convert_index_value_pair_to_openpyxl(create_fruit_price_data())
+        px_worksheet.title = 'fruit'
+        px_worksheet.parent.save(self.file_name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_to_model_streaming(self):
+        '''
+        読み取り専用モードで読み込んだシートは、通常モードで読み込んだシートと同じ内容になる。
+        '''
+        converter = ExcelQtConverter(self.file_name, read_only=True)
+        qt_model = converter.to_model('fruit')
+
+        self.assertEqual(convert_qtmodel_to_index_value_pair(qt_model), create_fruit_price_data())
+
+    def test_workbook_is_opened_only_when_needed(self):
+        '''
+        読み取り専用モードでは、書き込み用のワークブックは必要になるまで開かれない。
+        '''
+        converter = ExcelQtConverter(self.file_name, read_only=True)
+        converter.to_model('fruit')
+        self.assertIsNone(converter._px_workbook)
+
+        self.assertIn('fruit', converter.px_workbook.sheetnames)
+
+    def test_to_model_with_cache(self):
+        '''
+        キャッシュファイルを指定すると、読み込んだシートが保存され、次の読み込みで同じ内容になる。
+        '''
+        cache_file_name = os.path.join(self.temp_dir.name, 'fruit.cache')
+        for _ in range(2):
+            converter = ExcelQtConverter(
+                self.file_name, read_only=True, cache_file_name=cache_file_name
+            )
+            qt_model = converter.to_model('fruit')
+            self.assertEqual(
+                convert_qtmodel_to_index_value_pair(qt_model), create_fruit_price_data()
+            )
+            self.assertTrue(os.path.exists(cache_file_name))
+
+
+    def test_own_save_keeps_cache_of_other_sheets(self):
+        '''
+        自身が保存した後も、書き込まなかったシートのキャッシュは使われ、書き込んだシートのキャッシュは捨てられる。
+        '''
+        cache_file_name = os.path.join(self.temp_dir.name, 'fruit.cache')
+        converter = ExcelQtConverter(self.file_name, read_only=True, cache_file_name=cache_file_name)
+        fruit_model = converter.to_model('fruit')
+
+        # 別のシートを書き込んで保存しても、fruitのキャッシュは残る
+        sales_model = QStandardItemModel()
+        sales_model.setHorizontalHeaderLabels(['会計番号', '品目'])
+        converter.from_model(sales_model, 'sales')
+        converter.to_model('sales')
+
+        # fruitを書き込んで保存すると、fruitのキャッシュだけが捨てられる
+        fruit_model.setItem(0, 1, QStandardItem('350'))
+        converter.from_model(fruit_model, 'fruit')
+
+        def read():
+            raise AssertionError('シートが読み直されました')
+
+        sheet_cache = SheetCache(self.file_name, cache_file_name)
+        self.assertEqual(
+            sheet_cache.read_columns('sales', True, None, read), (['会計番号', '品目'], [[], []], 0)
+        )
+        with self.assertRaises(AssertionError):
+            sheet_cache.read_columns('fruit', True, None, read)
+
+class TestFromModel(unittest.TestCase):
+
+    '''
+    Qtのモデル→Excelのシートの書き戻しをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'fruit.xlsx')
+        px_worksheet = convert_index_value_pair_to_openpyxl(create_fruit_price_data())
+        px_worksheet.title = 'fruit'
+        px_worksheet.parent.save(self.file_name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_sheet(self, name):
+        px_workbook = load_workbook(self.file_name, read_only=True)
+        try:
+            return list(px_workbook[name].iter_rows(values_only=True))
+        finally:
+            px_workbook.close()
+
+    def test_only_changed_rows_are_written(self):
+        '''
+        to_model()で読み込んだモデルは、変更・追加された行だけが書き戻される。
+        '''
+        converter = ExcelQtConverter(self.file_name, read_only=True)
+        qt_model = converter.to_model('fruit')
+
+        qt_model.setItem(2, 0, QStandardItem('Cherry'))
+        qt_model.setItem(2, 1, QStandardItem('500'))
+
+        tracker = converter.trackers['fruit']
+        self.assertEqual(tracker.dirty_rows, {2})
+        self.assertFalse(tracker.needs_full_sync)
+
+        converter.from_model(qt_model, 'fruit')
+
+        self.assertFalse(tracker.has_changes())
+        self.assertEqual(
+            self.read_sheet('fruit'),
+            [('Fruit', 'Price'), ('Apple', '300'), ('Berry', '400'), ('Cherry', '500')]
+        )
+
+    def test_untracked_model_is_written_entirely(self):
+        '''
+        to_model()で読み込んでいないモデルは、初回にすべての行が書き込まれる。
+        '''
+        qt_model = QStandardItemModel()
+        qt_model.setHorizontalHeaderLabels(['会計番号', '品目'])
+        qt_model.setItem(0, 0, QStandardItem('1'))
+        qt_model.setItem(0, 1, QStandardItem('22072'))
+
+        converter = ExcelQtConverter(self.file_name, read_only=True)
+        converter.from_model(qt_model, '会計録')
+
+        self.assertEqual(self.read_sheet('会計録'), [('会計番号', '品目'), ('1', '22072')])
+        self.assertEqual(self.read_sheet('fruit')[1], ('Apple', '300'))
+
+    def test_removed_rows_are_deleted(self):
+        '''
+        モデルから削除された行は、シートからも削除される。
+        '''
+        converter = ExcelQtConverter(self.file_name, read_only=True)
+        qt_model = converter.to_model('fruit')
+
+        qt_model.removeRow(0)
+        converter.from_model(qt_model, 'fruit')
+
+        self.assertEqual(self.read_sheet('fruit'), [('Fruit', 'Price'), ('Berry', '400')])
+
+    def test_replaced_tracker_is_closed(self):
+        '''
+        シートに別のモデルを書き戻すと、古いモデルのModelChangeTrackerは切断されて破棄される。
+        '''
+        converter = ExcelQtConverter(self.file_name, read_only=True)
+        old_model = converter.to_model('fruit')
+        old_tracker = converter.trackers['fruit']
+        tracker_reference = weakref.ref(old_tracker)
+
+        new_model = QStandardItemModel()
+        new_model.setHorizontalHeaderLabels(['Fruit', 'Price'])
+        converter.from_model(new_model, 'fruit')
+        self.assertIs(converter.trackers['fruit'].qt_model, new_model)
+
+        old_model.setItem(0, 0, QStandardItem('Cherry'))
+        self.assertFalse(old_tracker.has_changes())
+
+        del old_tracker
+        gc.collect()
+        self.assertIsNone(tracker_reference())
+
+
 def convert_qtmodel_to_index_value_pair(qt_model, header=True):
     '''
     Qtのモデルをもとにindexとvalueのペアからなる辞書を作ります。
@@ -90,6 +326,27 @@ def convert_index_value_pair_to_openpyxl(data):
 
     return px_worksheet
 
+def create_item_data():
+    '''
+    ダミーデータを返します。
+
+    数値と空のセルを含む商品のテーブルを返します。
+    '''
+    data = {
+        (0,0): '商品番号',
+        (0,1): '商品名',
+        (0,2): '初期価格',
+        (0,3): '備考',
+        (1,0): 22072,
+        (1,1): '衣装ケース08',
+        (1,2): 200,
+        (1,3): '2点セット',
+        (2,0): 22024,
+        (2,1): 'マグカップ01',
+        (2,2): 300,
+    }
+    return data
+
 def create_fruit_price_data():
     '''
     ダミーデータを返します。
@@ -0,0 +1,169 @@
+'''
+instrumentation.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import gc
+import json
+import os
+import tempfile
+import unittest
+import weakref
+import excelio
+import instrumentation
+import loader
+import model
+import relation_proxy_model
+from PyQt5.QtCore import QSortFilterProxyModel
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+
+class TestInstrumentation(unittest.TestCase):
+
+    '''
+    計測用の関数の差し込みと取り外し、記録の内容をチェックします。
+    '''
+
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_enable_and_disable(self):
+        '''
+        enable()で差し込んだ計測用の関数は、disable()で元に戻る。
+        from ... import で取り込まれた関数も置き換えられる。
+        '''
+        original_function = excelio.load_workbook
+        original_method = relation_proxy_model.RelationProxyModel.data
+
+        instrumentation.enable()
+        self.assertIsNot(excelio.load_workbook, original_function)
+        self.assertIs(loader.load_workbook, excelio.load_workbook)
+        self.assertIsNot(relation_proxy_model.RelationProxyModel.data, original_method)
+
+        instrumentation.disable()
+        self.assertIs(excelio.load_workbook, original_function)
+        self.assertIs(loader.load_workbook, original_function)
+        self.assertIs(relation_proxy_model.RelationProxyModel.data, original_method)
+
+    def test_function_statistics(self):
+        '''
+        Qtから呼び出されるメソッドも含め、呼び出し回数と所要時間が記録される。
+        '''
+        proxy = create_relation_proxy_model()
+        instrumentation.enable()
+
+        # QSortFilterProxyModel 経由で、C++ 側から RelationProxyModel.data() を呼び出す
+        sort_filter_proxy = QSortFilterProxyModel()
+        sort_filter_proxy.setSourceModel(proxy)
+        values = [
+            sort_filter_proxy.index(row, 2).data() for row in range(sort_filter_proxy.rowCount())
+        ]
+        self.assertEqual(values, ['10', '20'])
+
+        statistics = instrumentation.function_statistics['RelationProxyModel.data']
+        self.assertGreaterEqual(statistics.calls, 2)
+        self.assertEqual(sum(statistics.buckets), statistics.calls)
+        self.assertLessEqual(statistics.max_seconds, statistics.total_seconds)
+        self.assertIn('RelationProxyModel.data', instrumentation.format_report())
+
+    def test_refresh_counts(self):
+        '''
+        作り直しは、シグナルごとに、記録が有効な間だけ数えられる。
+        '''
+        item_model = create_item_model()
+        catalog = model.ItemCatalog(item_model, 0, 1, 2)
+
+        item_model.removeRow(0)
+        self.assertEqual(instrumentation.refresh_counts, {})
+
+        instrumentation.enable()
+        item_model.insertRow(0, [QStandardItem('22001'), QStandardItem('りんご'), QStandardItem('10')])
+        item_model.removeRow(0)
+        self.assertEqual(dict(instrumentation.refresh_counts), {
+            'ItemCatalog.refresh <- rowsRemoved': 1,
+            'ItemCatalog.refresh <- rowsInserted': 1
+        })
+        # connectした後に差し込んだ計測用の関数も呼び出される
+        self.assertEqual(instrumentation.function_statistics['ItemCatalog.refresh'].calls, 2)
+        self.assertEqual(catalog.find_row('22002'), 0)
+
+    def test_counting_slot_does_not_keep_instance(self):
+        '''
+        counting_slot()でconnectしたオブジェクトは、シグナルを放出するモデルが残っていても破棄される。
+        '''
+        item_model = create_item_model()
+        catalog = model.ItemCatalog(item_model, 0, 1, 2)
+        catalog_reference = weakref.ref(catalog)
+
+        del catalog
+        gc.collect()
+        self.assertIsNone(catalog_reference())
+
+        # 破棄された後のシグナルは何もしない
+        instrumentation.enable()
+        item_model.removeRow(0)
+        self.assertEqual(dict(instrumentation.refresh_counts), {})
+
+    def test_record_and_reset(self):
+        '''
+        record()は記録が有効な間だけ記録し、reset()の後も差し込んだ計測用の関数は記録を続ける。
+        '''
+        instrumentation.record('スキャンから表示まで', 0.01)
+        self.assertNotIn('スキャンから表示まで', instrumentation.report()['functions'])
+
+        instrumentation.enable()
+        instrumentation.record('スキャンから表示まで', 0.01)
+        self.assertEqual(instrumentation.report()['functions']['スキャンから表示まで']['calls'], 1)
+
+        instrumentation.reset()
+        self.assertEqual(instrumentation.report()['functions'], {})
+        create_relation_proxy_model().index(0, 1).data()
+        self.assertEqual(instrumentation.report()['functions']['RelationProxyModel.data']['calls'], 1)
+
+    def test_write_report(self):
+        '''
+        記録をJSONファイルに書き出せる。プロファイリングしている場合は .prof ファイルも書き出される。
+        '''
+        instrumentation.enable(profile=True)
+        create_relation_proxy_model().index(0, 1).data()
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'instrumentation.json')
+            instrumentation.write_report(file_name)
+
+            with open(file_name, encoding='utf-8') as report_file:
+                report = json.load(report_file)
+            self.assertTrue(report['enabled'])
+            self.assertEqual(report['functions']['RelationProxyModel.data']['calls'], 1)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'instrumentation.prof')))
+
+        # 書き出した後もプロファイリングは続く
+        self.assertIn('function calls', instrumentation.format_profile())
+
+def create_item_model():
+    '''
+    商品番号・商品名・値段からなる全商品一覧のモデルを作ります。
+    '''
+    item_model = QStandardItemModel()
+    for row in [['22001', 'りんご', '10'], ['22002', 'みかん', '20']]:
+        item_model.appendRow([QStandardItem(value) for value in row])
+    return item_model
+
+def create_relation_proxy_model():
+    '''
+    購入済み商品一覧と全商品一覧を商品番号で結合したモデルを作ります。
+    '''
+    purchased_model = QStandardItemModel()
+    for item_id in ['22001', '22002']:
+        purchased_model.appendRow([QStandardItem(item_id)])
+    item_model = QStandardItemModel()
+    for item_id, price in [('22001', '10'), ('22002', '20')]:
+        item_model.appendRow([QStandardItem(item_id), QStandardItem(price)])
+    return relation_proxy_model.RelationProxyModel(purchased_model, 0, item_model, 0)
+
+if __name__ == '__main__':
+    unittest.main()
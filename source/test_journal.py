@@ -0,0 +1,87 @@
+'''
+journal.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import os
+import tempfile
+import unittest
+from journal import JournalException, SalesJournal
+
+class TestSalesJournal(unittest.TestCase):
+
+    '''
+    SalesJournalへの記録と読み出しをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'sales.journal')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_append_and_read(self):
+        '''
+        記録した追加は、記録した順に読み出せる。
+        '''
+        journal = SalesJournal(self.file_name)
+        journal.append(0, '1', '22072')
+        journal.append(1, '1', '顧客用')
+        journal.close()
+
+        self.assertEqual(
+            SalesJournal(self.file_name).read(),
+            [(0, '1', '22072'), (1, '1', '顧客用')]
+        )
+
+    def test_extend(self):
+        '''
+        extend()でまとめて記録した追加も、append()と同じように読み出せる。
+        '''
+        journal = SalesJournal(self.file_name)
+        journal.append(0, '1', '22072')
+        journal.extend([(1, '2', '22024'), (2, '2', '18022')])
+        journal.close()
+
+        self.assertEqual(
+            SalesJournal(self.file_name).read(),
+            [(0, '1', '22072'), (1, '2', '22024'), (2, '2', '18022')]
+        )
+
+    def test_broken_last_line_is_ignored(self):
+        '''
+        書き込みの途中で壊れた最後の行は無視される。
+        '''
+        journal = SalesJournal(self.file_name)
+        journal.append(0, '1', '22072')
+        journal.journal_file.write('{"row": 1, "custo')
+        journal.close()
+
+        self.assertEqual(SalesJournal(self.file_name).read(), [(0, '1', '22072')])
+
+    def test_broken_line_in_the_middle(self):
+        '''
+        最後以外の行が壊れている場合はJournalExceptionを送出する。
+        '''
+        with open(self.file_name, 'w', encoding='utf-8') as journal_file:
+            journal_file.write('broken\n{"row": 0, "customer_id": "1", "item_id": "2"}\n')
+
+        with self.assertRaises(JournalException):
+            SalesJournal(self.file_name).read()
+
+    def test_truncate(self):
+        '''
+        truncate()の後は、それ以降に記録した追加だけが読み出せる。
+        '''
+        journal = SalesJournal(self.file_name)
+        journal.append(0, '1', '22072')
+        journal.truncate()
+        journal.append(1, '2', '22024')
+
+        self.assertEqual(journal.read(), [(1, '2', '22024')])
+        journal.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+'''
+loader.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import os
+import tempfile
+import unittest
+from columnar_model import TYPED_VALUE_ROLE, ColumnarTableModel
+from excelio import ExcelIOException
+from loader import ModelFeeder, WorkbookLoader
+from openpyxl import Workbook, load_workbook
+from PyQt5.QtGui import QStandardItemModel
+
+class TestWorkbookLoader(unittest.TestCase):
+
+    '''
+    WorkbookLoaderとModelFeederによる、シートの行の少しずつの読み込みをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'test.xlsx')
+
+        px_workbook = Workbook()
+        px_worksheet = px_workbook.active
+        px_worksheet.title = 'raw'
+        px_worksheet.append(['商品番号', '商品名', '初期価格'])
+        for number in range(5):
+            px_worksheet.append([22070 + number, '商品{}'.format(number), 100 * number])
+        px_worksheet = px_workbook.create_sheet('会計録')
+        px_worksheet.append(['会計番号', '品目'])
+        px_worksheet.append([1, 22072])
+        px_workbook.save(self.file_name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_feed_models_in_chunks(self):
+        '''
+        行はchunk_size行ずつモデルに追加され、列の型はシート全体で揃えられる。
+        イベントループがない場合、読み込みはstart()の中で終わる。
+        '''
+        item_model = ColumnarTableModel()
+        purchased_model = QStandardItemModel()
+        loader = WorkbookLoader(
+            self.file_name, [('raw', {0: str}), ('会計録', {0: str, 1: str})], chunk_size=2
+        )
+        feeder = ModelFeeder(loader, {'raw': item_model, '会計録': purchased_model})
+
+        inserted = []
+        item_model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        events = []
+        feeder.sheet_loaded.connect(events.append)
+        feeder.loaded.connect(lambda: events.append(None))
+
+        feeder.start()
+
+        self.assertEqual(inserted, [(0, 1), (2, 3), (4, 4)])
+        self.assertEqual(events, ['raw', '会計録', None])
+
+        self.assertEqual(item_model.headerData(1, 1), '商品名')
+        self.assertEqual(item_model.column_values(0), [str(22070 + n) for n in range(5)])
+        self.assertEqual(item_model.data(item_model.index(4, 2), TYPED_VALUE_ROLE), 400)
+
+        self.assertEqual(purchased_model.headerData(1, 1), '品目')
+        self.assertEqual(purchased_model.item(0, 0).data(TYPED_VALUE_ROLE), '1')
+        self.assertEqual(purchased_model.item(0, 1).text(), '22072')
+
+    def test_rows_are_sent_while_reading(self):
+        '''
+        行はシートを読み進めながら送られ、読み終える前に失敗しても、それまでの行はモデルに入っている。
+        '''
+        px_workbook = load_workbook(self.file_name)
+        px_workbook['raw'].append(['A-1', '壊れた行', 0])
+        px_workbook.save(self.file_name)
+
+        item_model = ColumnarTableModel()
+        feeder = ModelFeeder(
+            WorkbookLoader(self.file_name, [('raw', {0: int})], chunk_size=2), {'raw': item_model}
+        )
+        feeder.start()
+
+        self.assertIsInstance(feeder.exception, ExcelIOException)
+        self.assertIn('5行目', str(feeder.exception))
+        self.assertEqual(item_model.column_values(0), [str(22070 + n) for n in range(4)])
+
+    def test_inferred_columns_are_retyped(self):
+        '''
+        推定した列の型が最初に送った行の値と違う場合、読み終えた後に列全体が推定した型に揃えられる。
+        '''
+        px_workbook = load_workbook(self.file_name)
+        px_workbook['raw'].append(['A-1', '型の違う行', 0.5])
+        px_workbook.save(self.file_name)
+
+        for item_model in (ColumnarTableModel(), QStandardItemModel()):
+            feeder = ModelFeeder(
+                WorkbookLoader(self.file_name, [('raw', None)], chunk_size=2), {'raw': item_model}
+            )
+            changed = []
+            item_model.dataChanged.connect(lambda topleft, bottomright: changed.append(
+                (topleft.row(), topleft.column(), bottomright.row(), bottomright.column())
+            ))
+            feeder.start()
+
+            # 送り直されるのは0列目だけで、全体で1回の dataChanged シグナルになる
+            self.assertEqual(changed[-1], (0, 0, 5, 0))
+            self.assertNotIn((0, 2, 5, 2), changed)
+            self.assertEqual(
+                [item_model.data(item_model.index(row, 0), TYPED_VALUE_ROLE) for row in range(6)],
+                [str(22070 + n) for n in range(5)] + ['A-1']
+            )
+            # int と float の列は、int の値をそのまま残すため送り直されない
+            self.assertEqual(item_model.data(item_model.index(4, 2), TYPED_VALUE_ROLE), 400)
+
+    def test_failed(self):
+        '''
+        壊れたファイルを読み込むと、例外は送出されずに failed シグナルで通知され、loaded シグナルは放出されない。
+        '''
+        with open(self.file_name, 'wb') as broken_file:
+            broken_file.write(b'not a workbook')
+
+        feeder = ModelFeeder(
+            WorkbookLoader(self.file_name, [('raw', {0: str})]), {'raw': ColumnarTableModel()}
+        )
+        events = []
+        feeder.loaded.connect(lambda: events.append('loaded'))
+        feeder.failed.connect(events.append)
+
+        feeder.start()
+
+        self.assertEqual(events, [feeder.exception])
+        self.assertIsInstance(feeder.exception, Exception)
+
+if __name__ == '__main__':
+    unittest.main()
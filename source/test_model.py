@@ -0,0 +1,306 @@
+'''
+model.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import os
+import tempfile
+import unittest
+import model
+from columnar_model import ColumnarTableModel
+from journal import SalesJournal
+from openpyxl import Workbook, load_workbook
+from PyQt5.QtGui import QStandardItemModel
+from relation_proxy_model import RelationProxyModel
+
+class TestPurchasedItemModelWrapper(unittest.TestCase):
+
+    '''
+    PurchasedItemModelWrapperによる購入済み商品の追加をチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.journal_file_name = os.path.join(self.temp_dir.name, 'sales.journal')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_add_item(self):
+        '''
+        add_item()で追加した商品はモデルの末尾に入り、ジャーナルにも記録される。
+        '''
+        journal = SalesJournal(self.journal_file_name)
+        wrapper = model.PurchasedItemModelWrapper(QStandardItemModel(), 0, 1, journal=journal)
+
+        wrapper.add_item('1', '22072')
+        wrapper.add_item('2', '22024')
+
+        self.assertEqual(convert_qtmodel_to_rows(wrapper.qt_model), [['1', '22072'], ['2', '22024']])
+        self.assertEqual(journal.read(), [(0, '1', '22072'), (1, '2', '22024')])
+        journal.close()
+
+    def test_add_item_with_invalid_type(self):
+        '''
+        顧客番号や商品番号がstr型でない場合はTypeErrorを送出する。
+        '''
+        wrapper = model.PurchasedItemModelWrapper(QStandardItemModel(), 0, 1)
+
+        with self.assertRaises(TypeError):
+            wrapper.add_item(1, '22072')
+
+    def test_replay_journal(self):
+        '''
+        replay_journal()は、ジャーナルに記録された追加のうちモデルにない行だけを追加する。
+        '''
+        journal = SalesJournal(self.journal_file_name)
+        journal.append(0, '1', '22072')
+        journal.append(1, '2', '22024')
+        journal.close()
+
+        # 1行目はExcelファイルに保存済みだったとする
+        qt_model = QStandardItemModel()
+        model.PurchasedItemModelWrapper(qt_model, 0, 1).add_item('1', '22072')
+
+        journal = SalesJournal(self.journal_file_name)
+        wrapper = model.PurchasedItemModelWrapper(qt_model, 0, 1, journal=journal)
+
+        self.assertEqual(wrapper.replay_journal(), 1)
+        self.assertEqual(convert_qtmodel_to_rows(qt_model), [['1', '22072'], ['2', '22024']])
+        journal.close()
+
+    def test_add_items(self):
+        '''
+        add_items()は、複数の商品を1回の rowsInserted シグナルで追加し、ジャーナルにも記録する。
+        '''
+        journal = SalesJournal(self.journal_file_name)
+        qt_model = QStandardItemModel()
+        wrapper = model.PurchasedItemModelWrapper(qt_model, 0, 1, journal=journal)
+        wrapper.add_item('1', '22072')
+
+        inserted = []
+        qt_model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+        wrapper.add_items([('2', '22024'), ('2', '18022')])
+
+        self.assertEqual(inserted, [(1, 2)])
+        self.assertEqual(
+            convert_qtmodel_to_rows(qt_model),
+            [['1', '22072'], ['2', '22024'], ['2', '18022']]
+        )
+        self.assertEqual(journal.read(), [(0, '1', '22072'), (1, '2', '22024'), (2, '2', '18022')])
+        journal.close()
+
+    def test_add_items_through_relation_proxy_model(self):
+        '''
+        RelationProxyModelを通してadd_items()で追加した行は、全商品一覧と結合される。
+        '''
+        item_model = create_item_model()
+        proxy = RelationProxyModel(QStandardItemModel(), 1, item_model, 0)
+        inserted = []
+        proxy.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+        wrapper = model.PurchasedItemModelWrapper(proxy, 0, 1)
+        wrapper.add_items([('1', '22072'), ('1', '22024'), ('2', '99999')])
+
+        self.assertEqual(inserted, [(0, 2)])
+        self.assertEqual(
+            [proxy.data(proxy.index(row, 3)) for row in range(proxy.rowCount())],
+            ['衣装ケース08', 'マグカップ01', None]
+        )
+
+    def test_add_items_rejects_whole_batch(self):
+        '''
+        catalogにない商品番号が1つでもあれば、add_items()はどの商品も追加しない。
+        '''
+        catalog = model.ItemCatalog(create_item_model(), 0, 1, 2)
+        wrapper = model.PurchasedItemModelWrapper(QStandardItemModel(), 0, 1, catalog=catalog)
+
+        with self.assertRaises(model.UnknownItemException):
+            wrapper.add_items([('1', '22072'), ('1', '99999')])
+        self.assertEqual(wrapper.qt_model.rowCount(), 0)
+
+    def test_add_item_with_catalog(self):
+        '''
+        catalogを指定すると、全商品一覧にない商品番号はジャーナルにもモデルにも入らない。
+        '''
+        journal = SalesJournal(self.journal_file_name)
+        catalog = model.ItemCatalog(create_item_model(), 0, 1, 2)
+        wrapper = model.PurchasedItemModelWrapper(
+            QStandardItemModel(), 0, 1, journal=journal, catalog=catalog
+        )
+
+        self.assertEqual(wrapper.add_item('1', '22072'), ('衣装ケース08', 200))
+        with self.assertRaises(model.UnknownItemException):
+            wrapper.add_item('1', '99999')
+
+        self.assertEqual(convert_qtmodel_to_rows(wrapper.qt_model), [['1', '22072']])
+        self.assertEqual(journal.read(), [(0, '1', '22072')])
+        journal.close()
+
+
+class TestItemCatalog(unittest.TestCase):
+
+    '''
+    ItemCatalogによる商品番号からの商品の検索をチェックします。
+    '''
+
+    def test_lookup(self):
+        '''
+        lookup()は商品名と型を保った値段を返し、ない商品番号にはUnknownItemExceptionを送出する。
+        '''
+        catalog = model.ItemCatalog(create_item_model(), 0, 1, 2)
+
+        self.assertEqual(catalog.lookup('22024'), ('マグカップ01', 300))
+        for item_id in ('99999', ''):
+            with self.assertRaises(model.UnknownItemException):
+                catalog.lookup(item_id)
+
+    def test_index_follows_model(self):
+        '''
+        モデルの商品番号が変わったり行が増えたりすると、索引も更新される。
+        '''
+        item_model = create_item_model()
+        catalog = model.ItemCatalog(item_model, 0, 1, 2)
+
+        # 22024 を 22099 に付け替えると、もう一方の 22024 の行が見つかるようになる
+        item_model.setData(item_model.index(1, 0), '22099')
+        self.assertEqual(catalog.lookup('22099'), ('マグカップ01', 300))
+        self.assertEqual(catalog.lookup('22024'), ('マグカップ02', 350))
+
+        item_model.append_rows([['22101', 'ハンガー02', 60]])
+        self.assertEqual(catalog.lookup('22101'), ('ハンガー02', 60))
+
+        item_model.set_rows(['商品番号', '商品名', '初期価格'], [('22100', 'ハンガー', 50)])
+        self.assertEqual(catalog.lookup('22100'), ('ハンガー', 50))
+        with self.assertRaises(model.UnknownItemException):
+            catalog.lookup('22072')
+
+
+class TestManager(unittest.TestCase):
+
+    '''
+    Managerによる全商品一覧と購入済み商品一覧の読み込みをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, '会計用.xlsx')
+
+        px_workbook = Workbook()
+        px_worksheet = px_workbook.active
+        px_worksheet.title = 'raw'
+        px_worksheet.append(['商品番号', '商品名', '初期価格'])
+        px_worksheet.append([22072, '衣装ケース08', 200])
+        px_worksheet.append([22024, 'マグカップ01', 300])
+        px_worksheet = px_workbook.create_sheet('会計録')
+        px_worksheet.append(['会計番号', '品目', '値段', '運び'])
+        px_worksheet.append([1, 22024])
+        px_workbook.save(self.file_name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_init_models_in_background(self):
+        '''
+        init_models_in_background()で読み込んだモデルは、init_all_item_model()と
+        init_purchased_item_model()で読み込んだものと同じように使える。
+        イベントループがない場合、読み込みはその場で終わる。
+        '''
+        manager = model.Manager(self.file_name, 'raw', '会計録')
+        manager.init_models_in_background(0, 1, column_for_sale_price=2)
+
+        self.assertEqual(manager.lookup_item('22072'), ('衣装ケース08', 200))
+        self.assertEqual(convert_qtmodel_to_rows(manager.get_purchased_item_model().qt_model), [
+            ['1', '22024', None, None, '22024', 'マグカップ01', '300']
+        ])
+
+        manager.get_purchased_item_model().add_item('2', '22072')
+        manager.storage.excel_handler.flush()
+        manager.journal.close()
+
+        px_worksheet = load_workbook(self.file_name)['会計録']
+        self.assertEqual(
+            [[cell.value for cell in cells][:3] for cells in px_worksheet.iter_rows(min_row=2)],
+            [[1, 22024, None], [2, 22072, 200]]
+        )
+        self.assertEqual(manager.get_sales_totals().total_for_customer('2'), 200)
+
+    def test_init_models_in_background_with_missing_file(self):
+        '''
+        ファイルを読み込めなかった場合、読み込み中の状態は解除され、商品は追加できず、シートも書き換えられない。
+        '''
+        file_name = os.path.join(self.temp_dir.name, 'ない.xlsx')
+        manager = model.Manager(file_name, 'raw', '会計録')
+        self.addCleanup(manager.journal.close)
+        manager.init_models_in_background(0, 1)
+
+        self.assertIsInstance(manager.load_error, FileNotFoundError)
+        self.assertFalse(manager.get_purchased_item_model().loading)
+        with self.assertRaises(model.ModelException):
+            manager.get_purchased_item_model().add_item('2', '22072')
+        self.assertFalse(os.path.exists(file_name))
+
+    def test_round_trip_keeps_cell_types(self):
+        '''
+        追加して保存した行は、シートにもとからある行と同じ型のセルになり、
+        読み込み直しても表示用の値と合計は変わらない。
+        '''
+        manager = model.Manager(self.file_name, 'raw', '会計録')
+        manager.init_all_item_model()
+        manager.init_purchased_item_model(0, 1, column_for_sale_price=2)
+        manager.get_purchased_item_model().add_items([('2', '22072'), ('007', '22024')])
+        manager.storage.excel_handler.flush()
+        manager.journal.close()
+
+        px_worksheet = load_workbook(self.file_name)['会計録']
+        self.assertEqual(
+            [[type(cell.value) for cell in cells][:3] for cells in px_worksheet.iter_rows(min_row=2)],
+            [[int, int, type(None)], [int, int, int], [str, int, int]]
+        )
+
+        manager = model.Manager(self.file_name, 'raw', '会計録')
+        self.addCleanup(manager.journal.close)
+        manager.init_all_item_model()
+        manager.init_purchased_item_model(0, 1)
+        self.assertEqual(
+            [row[:3] for row in convert_qtmodel_to_rows(manager.purchased_item_source_model)],
+            [['1', '22024', None], ['2', '22072', '200'], ['007', '22024', '300']]
+        )
+        self.assertEqual(manager.get_sales_totals().total_for_customer('2'), 200)
+
+    def test_add_item_while_loading(self):
+        '''
+        購入済み商品一覧を読み込み中の間は、商品を追加できない。
+        '''
+        wrapper = model.PurchasedItemModelWrapper(QStandardItemModel(), 0, 1)
+        wrapper.loading = True
+
+        with self.assertRaises(model.ModelException):
+            wrapper.add_item('1', '22072')
+        self.assertEqual(wrapper.qt_model.rowCount(), 0)
+
+def create_item_model():
+    '''
+    全商品一覧のダミーのモデルを返します。商品番号 22024 の商品が2つあります。
+    '''
+    item_model = ColumnarTableModel()
+    item_model.set_rows(['商品番号', '商品名', '初期価格'], [
+        ('22072', '衣装ケース08', 200),
+        ('22024', 'マグカップ01', 300),
+        ('22024', 'マグカップ02', 350),
+    ])
+    return item_model
+
+def convert_qtmodel_to_rows(qt_model):
+    '''
+    Qtのモデルを、行ごとのDisplayRoleの値のリストのリストに変換します。
+    '''
+    return [
+        [qt_model.data(qt_model.index(row, column)) for column in range(qt_model.columnCount())]
+        for row in range(qt_model.rowCount())
+    ]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,9 @@ from itertools import product
 import relation_proxy_model as model
 from excelio import convert_openpyxl_to_qtmodel
 from openpyxl import Workbook
+from columnar_model import ColumnarTableModel
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtGui import QStandardItem
 
 class TestRelationProxyModel(unittest.TestCase):
 
@@ -77,8 +80,436 @@ class TestMapper(unittest.TestCase):
 
         self.assertEqual(actual_map, expected_map)
 
+    def test_edit_outside_key_column(self):
+        '''
+        キー以外の列の変更では、対応表は作り直されない。
+        '''
+        proxy = create_fruit_proxy()
+        main_sub_map = proxy.mapper.main_sub_map
+        sub_keys = proxy.mapper.sub_keys
+
+        proxy.main_model.item(0, 1).setText('Purple')
+        proxy.sub_model.item(0, 1).setText('350')
+
+        self.assertIs(proxy.mapper.main_sub_map, main_sub_map)
+        self.assertIs(proxy.mapper.sub_keys, sub_keys)
+        self.assertEqual(proxy.mapper.main_sub_map, {0: 1, 1: 0})
+
+    def test_incremental_update_matches_refresh(self):
+        '''
+        キーの列を変更した後の対応表は、対応表をはじめから作り直した場合と一致する。
+        '''
+        proxy = create_fruit_proxy()
+        mapper = proxy.mapper
+
+        edits = [
+            (proxy.sub_model, 0, 'Cherry'),   # Apple がなくなる
+            (proxy.main_model, 0, 'Cherry'),  # Berry → Cherry
+            (proxy.sub_model, 1, 'Cherry'),   # Cherry が2行になる
+            (proxy.sub_model, 0, 'Berry'),    # 最初の Cherry が Berry に戻る
+            (proxy.main_model, 1, 'Berry'),   # Apple → Berry
+        ]
+
+        for source_model, row, value in edits:
+            source_model.item(row, 0).setText(value)
+
+            actual = (mapper.main_sub_map, mapper.sub_main_map)
+            mapper.refresh_map()
+            expected = (mapper.main_sub_map, mapper.sub_main_map)
+
+            self.assertEqual(actual, expected)
+
+        self.assertEqual(proxy.data(proxy.index(0, 3)), '400')
+        self.assertEqual(proxy.data(proxy.index(1, 3)), '300')
+
+
+    def test_bulk_read_from_columnar_model(self):
+        '''
+        ColumnarTableModelからは、data()を行ごとに呼ばずにキーの列をまとめて読み込む。
+        '''
+        fruit_color_model = ColumnarTableModel()
+        fruit_color_model.set_rows(['Fruit', 'Color'], [('Berry', 'Blue'), ('Apple', 'Red'), ('Berry', 'Navy')])
+        fruit_price_model = ColumnarTableModel()
+        fruit_price_model.set_rows(['Fruit', 'Price'], [('Apple', 300), ('Berry', 400)])
+
+        def fail(index, role=None):
+            raise AssertionError('data() should not be called')
+        fruit_color_model.data = fail
+        fruit_price_model.data = fail
+
+        self.assertEqual(model.map_value_to_row(fruit_color_model, 0), {'Berry': 0, 'Apple': 1})
+
+        proxy = model.RelationProxyModel(fruit_color_model, 0, fruit_price_model, 0)
+        self.assertEqual(proxy.mapper.main_sub_map, {0: 1, 1: 0, 2: 1})
+        self.assertEqual(proxy.mapper.sub_main_map, {0: {1}, 1: {0, 2}})
+
+    def test_bulk_join_matches_row_by_row_join(self):
+        '''
+        まとめて作った対応表は、行ごとに対応付けた場合と一致する。
+        '''
+        items = ColumnarTableModel()
+        items.set_rows(['商品番号'], [(str(row % 7),) for row in range(20)])
+        cart = ColumnarTableModel()
+        cart.set_rows(['商品番号'], [(str(row % 9),) for row in range(50)])
+
+        for duplicates in (model.DUPLICATES_FIRST, model.DUPLICATES_LAST, model.DUPLICATES_FAN_OUT):
+            mapper = model.RelationProxyModel(cart, 0, items, 0, duplicates=duplicates).mapper
+            actual = (mapper.main_sub_map, mapper.sub_main_map)
+
+            mapper.main_sub_map = {}
+            mapper.sub_main_map = {}
+            for main_row in range(len(mapper.main_keys)):
+                mapper.link_main_row(main_row)
+
+            self.assertEqual(actual, (mapper.main_sub_map, mapper.sub_main_map))
+
+
+class TestStructuralChanges(unittest.TestCase):
+
+    '''
+    ソースモデルの行・列の増減に対して、対応表が正しく更新されるかチェックします。
+    '''
+
+    def setUp(self):
+        self.proxy = create_fruit_proxy()
+        self.mapper = self.proxy.mapper
+
+        # 対応表の全体の作り直しが起きていないことを確かめるため、refresh_map()を置き換える
+        def fail():
+            raise AssertionError('refresh_map() should not be called')
+        self.mapper.refresh_map = fail
+
+    def assert_maps_are_consistent(self):
+        '''
+        対応表が、はじめから作り直した場合と一致することを確かめます。
+        '''
+        actual = (self.mapper.main_sub_map, self.mapper.sub_main_map)
+        vars(self.mapper).pop('refresh_map', None)
+        self.mapper.refresh_map()
+        self.assertEqual(actual, (self.mapper.main_sub_map, self.mapper.sub_main_map))
+
+    def test_append_main_row(self):
+        '''
+        メインモデルの末尾に追加された行は、その場で結合される。
+        '''
+        inserted = []
+        self.proxy.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+        self.proxy.main_model.appendRow([QStandardItem('Apple'), QStandardItem('Green')])
+
+        self.assertEqual(inserted, [(2, 2)])
+        self.assertEqual(self.proxy.data(self.proxy.index(2, 3)), '300')
+        self.assert_maps_are_consistent()
+
+    def test_insert_and_remove_main_rows(self):
+        '''
+        メインモデルの途中に行が挿入・削除されると、後ろの行の行番号がずれる。
+        '''
+        self.proxy.main_model.insertRow(0, [QStandardItem('Apple'), QStandardItem('Green')])
+        self.assertEqual(self.mapper.main_sub_map, {0: 0, 1: 1, 2: 0})
+
+        self.proxy.main_model.removeRows(0, 2)
+        self.assertEqual(self.proxy.rowCount(), 1)
+        self.assertEqual(self.proxy.data(self.proxy.index(0, 3)), '300')
+        self.assert_maps_are_consistent()
+
+    def test_move_main_rows(self):
+        '''
+        メインモデルの行が移動すると、結合先も一緒に移動する。
+        '''
+        # QStandardItemModelは行の移動に対応していないため、MovableTableModelを使う
+        fruit_model = MovableTableModel()
+        fruit_model.set_rows(['Fruit'], [('Berry',), ('Apple',), ('Cherry',)])
+        proxy = model.RelationProxyModel(fruit_model, 0, self.proxy.sub_model, 0)
+        self.mapper = proxy.mapper
+
+        fruit_model.moveRows(QModelIndex(), 1, 1, QModelIndex(), 0)
+
+        self.assertEqual(proxy.data(proxy.index(0, 0)), 'Apple')
+        self.assertEqual(proxy.data(proxy.index(0, 2)), '300')
+        self.assertEqual(self.mapper.main_sub_map, {0: 0, 1: 1})
+        self.assert_maps_are_consistent()
+
+    def test_insert_and_remove_sub_rows(self):
+        '''
+        サブモデルの行が挿入・削除されると、結合先が変わったメインの行の dataChanged が放出される。
+        '''
+        changed = []
+        self.proxy.dataChanged.connect(
+            lambda topleft, bottomright: changed.append((topleft.row(), bottomright.row()))
+        )
+
+        self.proxy.sub_model.insertRow(0, [QStandardItem('Berry'), QStandardItem('450')])
+        self.assertEqual(self.proxy.data(self.proxy.index(0, 3)), '450')
+        self.assertEqual(changed, [(0, 0)])
+
+        self.proxy.sub_model.removeRow(1)
+        self.assertEqual(self.proxy.data(self.proxy.index(1, 3)), None)
+        self.assertEqual(changed, [(0, 0), (1, 1)])
+        self.assert_maps_are_consistent()
+
+    def test_insert_columns(self):
+        '''
+        ソースモデルに列が挿入されると、キーの列の番号とプロキシモデルの列数が更新される。
+        '''
+        self.proxy.main_model.insertColumn(0, [QStandardItem('1'), QStandardItem('2')])
+        self.proxy.sub_model.insertColumn(0, [QStandardItem('x'), QStandardItem('y')])
+
+        self.assertEqual(self.mapper.main_column, 1)
+        self.assertEqual(self.mapper.sub_column, 1)
+        self.assertEqual(self.proxy.columnCount(), 6)
+        self.assertEqual(self.proxy.data(self.proxy.index(0, 5)), '400')
+        self.assert_maps_are_consistent()
+
+
+class TestCachedShape(unittest.TestCase):
+
+    '''
+    キャッシュされた行数・列数と列ごとの参照先をチェックします。
+    '''
+
+    def test_data_uses_column_routes(self):
+        '''
+        data()はMapper.to_source()を経由せず、キャッシュされた参照先を使う。
+        '''
+        proxy = create_fruit_proxy()
+
+        def fail(index):
+            raise AssertionError('to_source() should not be called')
+        proxy.mapper.to_source = fail
+
+        actual = convert_qtmodel_to_index_value_pair(proxy, header=False)
+        self.assertEqual(actual, remove_header(create_fruit_color_price_data()))
+
+    def test_shape_is_refreshed_on_structural_change(self):
+        '''
+        行・列が増えると、キャッシュされた行数・列数も更新される。
+        '''
+        proxy = create_fruit_proxy()
+        self.assertEqual((proxy.rowCount(), proxy.columnCount()), (2, 4))
+
+        proxy.main_model.appendRow([QStandardItem('Apple'), QStandardItem('Green')])
+        proxy.sub_model.setItem(0, 2, QStandardItem('Aomori'))
+
+        self.assertEqual((proxy.rowCount(), proxy.columnCount()), (3, 5))
+        self.assertEqual(proxy.column_routes[4], (True, 2))
+        self.assertEqual(proxy.data(proxy.index(2, 4)), 'Aomori')
+
+
+class TestJoinOptions(unittest.TestCase):
+
+    '''
+    複数の列の組によるキーと、キーの重複の扱いをチェックします。
+    '''
+
+    def setUp(self):
+        # 同じ商品番号の商品が2つの出品者から出ている
+        self.items = ColumnarTableModel()
+        self.items.set_rows(['出品者', '商品番号', '値段'], [
+            ('A', '1', '100'),
+            ('B', '1', '200'),
+            ('A', '2', '300'),
+        ])
+        self.cart = ColumnarTableModel()
+        self.cart.set_rows(['出品者', '商品番号'], [('B', '1'), ('A', '2'), ('A', '1')])
+
+    def test_composite_key(self):
+        '''
+        複数の列の組をキーにすると、すべての列の値が一致する行と結合される。
+        '''
+        proxy = model.RelationProxyModel(self.cart, (0, 1), self.items, (0, 1))
+
+        self.assertEqual(
+            [proxy.data(proxy.index(row, 4)) for row in range(proxy.rowCount())],
+            ['200', '300', '100']
+        )
+
+        # キーの片方の列を変更すると結合先が変わる
+        self.cart.setData(self.cart.index(0, 0), 'A')
+        self.assertEqual(proxy.data(proxy.index(0, 4)), '100')
+
+    def test_duplicates_first_and_last(self):
+        '''
+        DUPLICATES_FIRST では最初の行と、DUPLICATES_LAST では最後の行と結合される。
+        '''
+        first = model.RelationProxyModel(self.cart, 1, self.items, 1)
+        last = model.RelationProxyModel(
+            self.cart, 1, self.items, 1, duplicates=model.DUPLICATES_LAST
+        )
+
+        self.assertEqual(first.data(first.index(0, 4)), '100')
+        self.assertEqual(last.data(last.index(0, 4)), '200')
+
+    def test_duplicates_error(self):
+        '''
+        DUPLICATES_ERROR では、副モデルのキーが重複しているとRelationProxyModelExceptionを送出する。
+        '''
+        with self.assertRaises(model.RelationProxyModelException):
+            model.RelationProxyModel(
+                self.cart, 1, self.items, 1, duplicates=model.DUPLICATES_ERROR
+            )
+
+        proxy = model.RelationProxyModel(
+            self.cart, (0, 1), self.items, (0, 1), duplicates=model.DUPLICATES_ERROR
+        )
+        self.assertEqual(proxy.data(proxy.index(0, 4)), '200')
+
+    def test_duplicates_fan_out(self):
+        '''
+        DUPLICATES_FAN_OUT では、該当する副モデルの行ごとにプロキシモデルの行が作られる。
+        '''
+        proxy = model.RelationProxyModel(
+            self.cart, 1, self.items, 1, duplicates=model.DUPLICATES_FAN_OUT
+        )
+
+        self.assertEqual(proxy.rowCount(), 5)
+        self.assertEqual(
+            [(proxy.data(proxy.index(row, 0)), proxy.data(proxy.index(row, 4)))
+             for row in range(proxy.rowCount())],
+            [('B', '100'), ('B', '200'), ('A', '300'), ('A', '100'), ('A', '200')]
+        )
+
+        # 結合先のない行も1行として残る
+        self.cart.setData(self.cart.index(1, 1), '9')
+        self.assertEqual(proxy.rowCount(), 5)
+        self.assertIsNone(proxy.data(proxy.index(2, 4)))
+
+    def test_column_values(self):
+        '''
+        column_values()は、主モデルの列も副モデルの列も data() と同じ値をまとめて返す。
+        '''
+        self.cart.set_rows(['出品者', '商品番号'], [('B', '1'), ('A', '9'), ('A', '2')])
+        for duplicates in (model.DUPLICATES_FIRST, model.DUPLICATES_FAN_OUT):
+            proxy = model.RelationProxyModel(self.cart, 1, self.items, 1, duplicates=duplicates)
+            for column in range(proxy.columnCount()):
+                self.assertEqual(
+                    proxy.column_values(column),
+                    [proxy.data(proxy.index(row, column)) for row in range(proxy.rowCount())]
+                )
+            self.assertEqual(proxy.column_values(5), [None] * proxy.rowCount())
+
+    def test_unknown_duplicates_option(self):
+        '''
+        未知の重複の扱いを指定するとRelationProxyModelExceptionを送出する。
+        '''
+        with self.assertRaises(model.RelationProxyModelException):
+            model.RelationProxyModel(self.cart, 1, self.items, 1, duplicates='random')
+
+
+class TestDataChanged(unittest.TestCase):
+
+    '''
+    RelationProxyModelが放出するdataChangedシグナルの範囲をチェックします。
+    '''
+
+    def setUp(self):
+        # 商品番号'1'の商品が、カートの離れた行から参照されている
+        self.items = ColumnarTableModel()
+        self.items.set_rows(['商品番号', '値段'], [('1', '100'), ('2', '200')])
+        self.cart = ColumnarTableModel()
+        self.cart.set_rows(['顧客番号', '商品番号'], [
+            ('A', '1'), ('A', '2'), ('B', '2'), ('B', '1'), ('C', '1'),
+        ])
+
+    def connect_recorder(self, proxy):
+        '''
+        proxyのdataChangedシグナルを (最初の行, 最後の行, 最初の列, 最後の列) として記録するリストを返します。
+        '''
+        changed = []
+        proxy.dataChanged.connect(
+            lambda topleft, bottomright, roles=None: changed.append(
+                (topleft.row(), bottomright.row(), topleft.column(), bottomright.column())
+            )
+        )
+        return changed
+
+    def test_sub_change_reaches_every_referencing_row(self):
+        '''
+        副モデルの変更は、その行を参照するすべての行に、連続した範囲ごとに伝えられる。
+        '''
+        proxy = model.RelationProxyModel(self.cart, 1, self.items, 0)
+        changed = self.connect_recorder(proxy)
+
+        self.items.setData(self.items.index(0, 1), '150')
+
+        self.assertEqual(changed, [(0, 0, 3, 3), (3, 4, 3, 3)])
+
+    def test_sub_change_in_fan_out(self):
+        '''
+        DUPLICATES_FAN_OUT では、変更された副モデルの行と結合されたプロキシモデルの行だけが伝えられる。
+        '''
+        self.items.set_rows(['商品番号', '値段'], [('1', '100'), ('2', '200'), ('1', '300')])
+        proxy = model.RelationProxyModel(
+            self.cart, 1, self.items, 0, duplicates=model.DUPLICATES_FAN_OUT
+        )
+        changed = self.connect_recorder(proxy)
+
+        self.items.setData(self.items.index(2, 1), '350')
+
+        self.assertEqual(changed, [(1, 1, 3, 3), (5, 5, 3, 3), (7, 7, 3, 3)])
+        self.assertEqual(proxy.data(proxy.index(7, 3)), '350')
+
+    def test_coalesce(self):
+        '''
+        coalesce=True では、イベントループに戻るまでの変更がまとめて放出される。
+        '''
+        proxy = model.RelationProxyModel(self.cart, 1, self.items, 0, coalesce=True)
+        # イベントループに戻るまでを再現するため、予約を無効にする
+        proxy.schedule_data_changed = lambda: None
+        changed = self.connect_recorder(proxy)
+
+        self.cart.setData(self.cart.index(1, 0), 'X')
+        self.cart.setData(self.cart.index(2, 0), 'Y')
+        self.items.setData(self.items.index(0, 1), '150')
+        self.assertEqual(changed, [])
+
+        proxy.flush_data_changed()
+        self.assertEqual(changed, [(0, 4, 0, 3)])
+
+        proxy.flush_data_changed()
+        self.assertEqual(len(changed), 1)
+
+    def test_coalesce_flushes_before_structural_change(self):
+        '''
+        coalesce=True でも、列が挿入される前にまだ放出していない変更が放出される。
+        '''
+        proxy = model.RelationProxyModel(self.cart, 1, self.items, 0, coalesce=True)
+        proxy.schedule_data_changed = lambda: None
+        changed = self.connect_recorder(proxy)
+
+        self.cart.setData(self.cart.index(4, 0), 'Z')
+        self.cart.setHorizontalHeaderLabels(['顧客番号', '商品番号', '備考'])
+
+        self.assertEqual(changed, [(4, 4, 0, 0)])
+        self.assertEqual(proxy.columnCount(), 5)
+
+
+class MovableTableModel(ColumnarTableModel):
+
+    '''
+    行の移動に対応したColumnarTableModelです。テスト用です。
+    '''
+
+    def moveRows(self, parent, start, count, destination_parent, row):
+        if not self.beginMoveRows(parent, start, start + count - 1, destination_parent, row):
+            return False
+        self.columns = [
+            model.move_slice(column, start, start + count - 1, row) for column in self.columns
+        ]
+        self.endMoveRows()
+        return True
+
+def create_fruit_proxy():
+    '''
+    果物の色のモデルを主モデル、果物の値段のモデルを副モデルとしたRelationProxyModelを返します。
+    '''
+    fruit_color_worksheet = convert_index_value_pair_to_openpyxl(create_fruit_color_data())
+    fruit_price_worksheet = convert_index_value_pair_to_openpyxl(create_fruit_price_data())
 
+    fruit_color_model = convert_openpyxl_to_qtmodel(fruit_color_worksheet)
+    fruit_price_model = convert_openpyxl_to_qtmodel(fruit_price_worksheet)
 
+    return model.RelationProxyModel(fruit_color_model, 0, fruit_price_model, 0)
 
 def make_value_row_map_for_dummy_table(dummy_table, column, header=True):
 
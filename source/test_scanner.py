@@ -0,0 +1,99 @@
+'''
+scanner.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import unittest
+import model
+from columnar_model import ColumnarTableModel
+from PyQt5.QtGui import QStandardItemModel
+from scanner import CheckoutScanner
+
+class TestCheckoutScanner(unittest.TestCase):
+
+    '''
+    スキャナから読み取った文字列による会計の操作をチェックします。
+    '''
+
+    def setUp(self):
+        catalog = model.ItemCatalog(create_item_model(), 0, 1, 2)
+        self.cart = model.PurchasedItemModelWrapper(QStandardItemModel(), 0, 1, catalog=catalog)
+        self.scanner = CheckoutScanner(self.cart)
+
+        self.customers = []
+        self.added = []
+        self.rejected = []
+        self.scanner.customer_changed.connect(self.customers.append)
+        self.scanner.items_added.connect(self.added.extend)
+        self.scanner.rejected.connect(lambda code, reason: self.rejected.append(code))
+
+    def test_scan(self):
+        '''
+        最初に読み取った文字列は顧客番号、続く文字列は商品番号として扱われ、空の行で会計を終える。
+        '''
+        for code in ['1', '22072', '99999', ' 22024 ', '', '2', '22072']:
+            self.scanner.scan(code, 10.0)
+
+        self.assertEqual(self.customers, ['1', '', '2'])
+        self.assertEqual(self.rejected, ['99999'])
+        self.assertEqual(self.added, [
+            ('1', '22072', '衣装ケース08', 200, 10.0),
+            ('1', '22024', 'マグカップ01', 300, 10.0),
+            ('2', '22072', '衣装ケース08', 200, 10.0),
+        ])
+        self.assertEqual(convert_qtmodel_to_rows(self.cart.qt_model), [
+            ['1', '22072'], ['1', '22024'], ['2', '22072']
+        ])
+
+    def test_flush_adds_items_at_once(self):
+        '''
+        まとめて処理された商品は、全商品一覧にない商品番号があっても1回で追加される。
+        '''
+        inserted = []
+        self.cart.qt_model.rowsInserted.connect(
+            lambda parent, first, last: inserted.append((first, last))
+        )
+        # 処理される前の読み取りを貯めておく
+        self.scanner.pending_scans = [
+            ('1', 0.0), ('22072', 0.0), ('99999', 0.0), ('22024', 0.0), ('22072', 0.0)
+        ]
+        self.scanner.flush()
+
+        self.assertEqual(inserted, [(0, 2)])
+        self.assertEqual(self.rejected, ['99999'])
+
+    def test_scan_while_loading(self):
+        '''
+        購入済み商品一覧を読み込み中の場合、商品は追加されずに通知される。
+        '''
+        self.cart.loading = True
+        for code in ['1', '22072']:
+            self.scanner.scan(code)
+
+        self.assertEqual(self.added, [])
+        self.assertEqual(self.rejected, ['22072'])
+        self.assertEqual(self.cart.qt_model.rowCount(), 0)
+
+def create_item_model():
+    '''
+    全商品一覧のダミーのモデルを返します。
+    '''
+    item_model = ColumnarTableModel()
+    item_model.set_rows(['商品番号', '商品名', '初期価格'], [
+        ('22072', '衣装ケース08', 200),
+        ('22024', 'マグカップ01', 300),
+    ])
+    return item_model
+
+def convert_qtmodel_to_rows(qt_model):
+    '''
+    Qtのモデルを、行ごとのDisplayRoleの値のリストのリストに変換します。
+    '''
+    return [
+        [qt_model.data(qt_model.index(row, column)) for column in range(qt_model.columnCount())]
+        for row in range(qt_model.rowCount())
+    ]
+
+if __name__ == '__main__':
+    unittest.main()
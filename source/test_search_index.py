@@ -0,0 +1,173 @@
+'''
+search_index.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import unittest
+import search_index
+from columnar_model import ColumnarTableModel
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+
+class TestSearchIndex(unittest.TestCase):
+
+    '''
+    商品番号の前方一致と商品名の部分一致による検索、索引の更新をチェックします。
+    '''
+
+    def test_normalize(self):
+        '''
+        全角・半角、大文字・小文字、カタカナ・ひらがなは区別されない。
+        '''
+        self.assertEqual(search_index.normalize('ﾘﾝｺﾞＡ'), 'りんごa')
+        self.assertEqual(search_index.normalize('カラーボックス'), 'からーぼっくす')
+        self.assertEqual(search_index.normalize(None), '')
+
+    def test_search(self):
+        '''
+        商品番号は前方一致で、商品名は部分一致で検索され、空白で区切った語はすべてに一致する行が返される。
+        '''
+        index = search_index.SearchIndex(create_item_model(), (0,), (1,))
+
+        self.assertEqual(index.search('220'), [0, 1])
+        self.assertEqual(index.search('72'), [])
+        self.assertEqual(index.search('ケース'), [0, 3])
+        self.assertEqual(index.search('けーす'), [0, 3])
+        self.assertEqual(index.search('ｹｰｽ 08'), [0])
+        self.assertEqual(index.search('棚'), [2])
+        self.assertEqual(index.search('ｔシャツ'), [1])
+        self.assertEqual(index.search('存在しない'), [])
+        self.assertEqual(list(index.search('  ')), [0, 1, 2, 3])
+
+    def test_update(self):
+        '''
+        行の追加・値の変更・行の削除を受けて、索引が更新される。
+        '''
+        item_model = create_item_model()
+        index = search_index.SearchIndex(item_model, (0,), (1,))
+
+        item_model.appendRow([QStandardItem('24001'), QStandardItem('本棚')])
+        self.assertEqual(index.search('本棚'), [2, 4])
+        self.assertEqual(index.search('24'), [4])
+
+        item_model.setData(item_model.index(2, 1), 'ハンガー')
+        item_model.setData(item_model.index(2, 0), '22999')
+        self.assertEqual(index.search('本棚'), [4])
+        self.assertEqual(index.search('ハンガー'), [2])
+        self.assertEqual(index.search('23'), [3])
+        self.assertEqual(index.search('229'), [2])
+
+        item_model.removeRow(0)
+        self.assertEqual(index.search('ケース'), [2])
+
+    def test_changed_rows_leave_old_ngrams(self):
+        '''
+        値が変わった行は、含まれなくなったn-gramの行のリストから除かれ、変更を繰り返しても索引は大きくならない。
+        '''
+        item_model = create_item_model()
+        index = search_index.SearchIndex(item_model, (0,), (1,))
+        ngram_rows = {gram: list(rows) for gram, rows in index.ngram_rows.items()}
+
+        for name in ['ハンガー', 'カラーボックス 本棚'] * 3:
+            item_model.setData(item_model.index(2, 1), name)
+        self.assertEqual(index.ngram_rows, ngram_rows)
+        self.assertNotIn('はん', index.ngram_rows)
+        self.assertEqual(index.search('本棚'), [2])
+
+    def test_prefix_keys_stay_sorted(self):
+        '''
+        少しずつ追加した行も、まとめて追加した行も、前方一致の索引はソートされたまま保たれる。
+        '''
+        item_model = QStandardItemModel()
+        index = search_index.SearchIndex(item_model, (0,), (1,))
+
+        item_model.appendRow([QStandardItem('30000'), QStandardItem('棚')])
+        item_model.appendRow([QStandardItem('10000'), QStandardItem('鍋')])
+        item_model.insertRows(2, search_index.INSORT_LIMIT + 1)
+        for row in range(2, search_index.INSORT_LIMIT + 3):
+            item_model.setData(item_model.index(row, 0), str(20000 + row))
+        item_model.appendRow([QStandardItem('20001'), QStandardItem('皿')])
+
+        self.assertEqual(index.prefix_keys, sorted(index.prefix_keys))
+        self.assertEqual(index.search('1'), [1])
+        self.assertEqual(index.search('20001'), [item_model.rowCount() - 1])
+
+    def test_columnar_model(self):
+        '''
+        列ごとに値を取り出せるモデルでも、表示用の値で検索される。
+        '''
+        item_model = ColumnarTableModel()
+        item_model.set_rows(['商品番号', '商品名'], [[22072, '衣装ケース08'], [22073, '本棚']])
+        index = search_index.SearchIndex(item_model, (0,), (1,))
+
+        self.assertEqual(index.search('2207'), [0, 1])
+        self.assertEqual(index.search('本'), [1])
+
+class TestItemSearchProxyModel(unittest.TestCase):
+
+    '''
+    検索結果の行だけを表示するプロキシモデルをチェックします。
+    '''
+
+    def test_set_query(self):
+        '''
+        検索文字列に一致する行だけが、ソースモデルの順に表示される。
+        '''
+        item_model = create_item_model()
+        proxy = search_index.ItemSearchProxyModel(item_model, (0,), (1,))
+        self.assertEqual(proxy.rowCount(), 4)
+
+        proxy.set_query('ケース')
+        self.assertEqual(read_proxy_column(proxy, 0), ['22072', '23001'])
+        self.assertEqual(proxy.headerData(1, 1), '商品名')
+        self.assertEqual(proxy.mapToSource(proxy.index(1, 1)).row(), 3)
+        self.assertEqual(proxy.mapFromSource(item_model.index(3, 1)).row(), 1)
+        self.assertFalse(proxy.mapFromSource(item_model.index(1, 1)).isValid())
+
+        proxy.set_query('')
+        self.assertEqual(proxy.rowCount(), 4)
+
+    def test_source_changes(self):
+        '''
+        ソースモデルの変更を受けて、表示する行が更新される。
+        '''
+        item_model = create_item_model()
+        proxy = search_index.ItemSearchProxyModel(item_model, (0,), (1,))
+        proxy.set_query('ケース')
+
+        inserted = []
+        proxy.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        item_model.appendRow([QStandardItem('24001'), QStandardItem('収納ケース')])
+        item_model.appendRow([QStandardItem('24002'), QStandardItem('本棚')])
+        self.assertEqual(inserted, [(2, 2)])
+        self.assertEqual(read_proxy_column(proxy, 0), ['22072', '23001', '24001'])
+
+        item_model.setData(item_model.index(2, 1), '小物ケース')
+        self.assertEqual(read_proxy_column(proxy, 0), ['22072', '22201', '23001', '24001'])
+
+        item_model.removeRow(0)
+        self.assertEqual(read_proxy_column(proxy, 0), ['22201', '23001', '24001'])
+
+        item_model.insertRow(0, [QStandardItem('20001'), QStandardItem('ケース')])
+        self.assertEqual(read_proxy_column(proxy, 0), ['20001', '22201', '23001', '24001'])
+
+def create_item_model():
+    '''
+    商品番号と商品名からなる全商品一覧のモデルを作ります。
+    '''
+    item_model = QStandardItemModel()
+    item_model.setHorizontalHeaderLabels(['商品番号', '商品名'])
+    for row in [['22072', '衣装ケース08'], ['22073', 'Tシャツ'],
+                ['22201', 'カラーボックス 本棚'], ['23001', 'ｹｰｽ']]:
+        item_model.appendRow([QStandardItem(value) for value in row])
+    return item_model
+
+def read_proxy_column(proxy, column):
+    '''
+    プロキシモデルのcolumn列目の値をリストにして返します。
+    '''
+    return [proxy.index(row, column, QModelIndex()).data() for row in range(proxy.rowCount())]
+
+if __name__ == '__main__':
+    unittest.main()
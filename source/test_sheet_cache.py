@@ -0,0 +1,105 @@
+'''
+sheet_cache.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import os
+import tempfile
+import unittest
+from sheet_cache import SheetCache
+
+class TestSheetCache(unittest.TestCase):
+
+    '''
+    SheetCacheによる読み込んだシートの保存と、Excelファイルが変わったときの破棄をチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'test.xlsx')
+        self.cache_file_name = os.path.join(self.temp_dir.name, 'test.cache')
+        with open(self.file_name, 'wb') as xlsx_file:
+            xlsx_file.write(b'first')
+
+        # 読み込み（read）が呼び出された回数
+        self.number_of_reads = 0
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read(self):
+        self.number_of_reads += 1
+        return (['Fruit', 'Price'], [['Apple', 'Berry'], [300, 200]], 2)
+
+    def read_columns(self):
+        sheet_cache = SheetCache(self.file_name, self.cache_file_name)
+        return sheet_cache.read_columns('fruit', True, {0: str}, self.read)
+
+    def test_cache_is_used_next_time(self):
+        '''
+        一度読み込んだシートは、次にSheetCacheを作ったときにはファイルから読み込まれる。
+        '''
+        self.assertEqual(self.read_columns(), self.read())
+        self.number_of_reads = 0
+
+        self.assertEqual(self.read_columns(), self.read())
+        self.assertEqual(self.number_of_reads, 1)
+
+    def test_column_types_are_part_of_key(self):
+        '''
+        列の型の指定が違う読み込みには、キャッシュは使われない。
+        '''
+        sheet_cache = SheetCache(self.file_name, self.cache_file_name)
+        sheet_cache.read_columns('fruit', True, {0: str}, self.read)
+        sheet_cache.read_columns('fruit', True, None, self.read)
+        self.assertEqual(self.number_of_reads, 2)
+
+    def test_touched_file_keeps_cache(self):
+        '''
+        更新日時だけが変わり内容が同じ場合は、キャッシュが使われる。
+        '''
+        self.read_columns()
+        stat = os.stat(self.file_name)
+        os.utime(self.file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        self.read_columns()
+        self.assertEqual(self.number_of_reads, 1)
+
+    def test_changed_file_discards_cache(self):
+        '''
+        内容が変わった場合は、大きさが同じでもキャッシュは捨てられる。
+        '''
+        self.read_columns()
+        stat = os.stat(self.file_name)
+        with open(self.file_name, 'wb') as xlsx_file:
+            xlsx_file.write(b'other')
+        os.utime(self.file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        self.read_columns()
+        self.assertEqual(self.number_of_reads, 2)
+
+    def test_returned_lists_are_copies(self):
+        '''
+        返されたリストを変更しても、キャッシュは変わらない。
+        '''
+        sheet_cache = SheetCache(self.file_name, self.cache_file_name)
+        header_strings, columns, number_of_rows = sheet_cache.read_columns(
+            'fruit', True, None, self.read
+        )
+        columns[0].append('Cherry')
+
+        self.assertEqual(sheet_cache.read_columns('fruit', True, None, self.read), self.read())
+
+    def test_broken_cache_file_is_ignored(self):
+        '''
+        壊れたキャッシュファイルは無視され、シートが読み直される。
+        '''
+        with open(self.cache_file_name, 'wb') as cache_file:
+            cache_file.write(b'broken')
+
+        self.assertEqual(self.read_columns(), self.read())
+        self.assertEqual(self.number_of_reads, 2)
+
+if __name__ == '__main__':
+    unittest.main()
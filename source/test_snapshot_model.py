@@ -0,0 +1,97 @@
+'''
+snapshot_model.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import datetime
+import os
+import tempfile
+import unittest
+from columnar_model import TYPED_VALUE_ROLE
+from PyQt5.QtCore import Qt
+from snapshot_model import (
+    SnapshotException, SnapshotTableModel, read_snapshot_stamp, update_snapshot_stamp,
+    write_snapshot
+)
+
+class TestSnapshotTableModel(unittest.TestCase):
+
+    '''
+    write_snapshot()で書き出したファイルをSnapshotTableModelで読むことをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'items.snapshot')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_values_keep_their_types(self):
+        '''
+        値は型を保ったまま読み出され、DisplayRoleでは文字列になる。
+        '''
+        date = datetime.datetime(2018, 11, 3, 10, 30)
+        write_snapshot(self.file_name, ['商品番号', '商品名', '初期価格', '日付'], [
+            ['22072', '22024', '22072'],
+            ['衣装ケース08', 'マグカップ01'],
+            [200, 1.5, True],
+            [date, None, 'メモ']
+        ], 3)
+        qt_model = SnapshotTableModel(self.file_name)
+
+        self.assertEqual((qt_model.rowCount(), qt_model.columnCount()), (3, 4))
+        self.assertEqual(qt_model.headerData(1, Qt.Horizontal), '商品名')
+        self.assertEqual(qt_model.data(qt_model.index(1, 1)), 'マグカップ01')
+        self.assertEqual(qt_model.data(qt_model.index(0, 2)), '200')
+        self.assertEqual(qt_model.data(qt_model.index(0, 2), TYPED_VALUE_ROLE), 200)
+        self.assertEqual(qt_model.data(qt_model.index(1, 2), TYPED_VALUE_ROLE), 1.5)
+        self.assertIs(qt_model.data(qt_model.index(2, 2), TYPED_VALUE_ROLE), True)
+        self.assertEqual(qt_model.data(qt_model.index(0, 3), TYPED_VALUE_ROLE), date)
+
+        # 長さの足りない列はNoneで埋められる
+        self.assertIsNone(qt_model.data(qt_model.index(2, 1)))
+
+        self.assertEqual(qt_model.column_values(0), ['22072', '22024', '22072'])
+        self.assertEqual(
+            qt_model.column_values(3, TYPED_VALUE_ROLE), [date, None, 'メモ']
+        )
+        self.assertFalse(qt_model.flags(qt_model.index(0, 0)) & Qt.ItemIsEditable)
+        qt_model.close()
+
+    def test_source_stamp(self):
+        '''
+        元のファイルの大きさ・更新日時・ハッシュを保存し、read_snapshot_stamp()で読み出せる。
+        '''
+        stamp = (1234, 5678, 'ab' * 20)
+        write_snapshot(self.file_name, ['Fruit'], [['Apple']], 1, source_stamp=stamp)
+
+        self.assertEqual(read_snapshot_stamp(self.file_name), stamp)
+        self.assertIsNone(read_snapshot_stamp(self.file_name + '.missing'))
+
+    def test_update_source_stamp(self):
+        '''
+        元のファイルの記録だけを書き換えても、値はそのまま読める。
+        '''
+        write_snapshot(self.file_name, ['Fruit'], [['Apple']], 1, source_stamp=(1, 2, 'ab' * 20))
+        update_snapshot_stamp(self.file_name, (3, 4, 'cd' * 20))
+
+        self.assertEqual(read_snapshot_stamp(self.file_name), (3, 4, 'cd' * 20))
+        qt_model = SnapshotTableModel(self.file_name)
+        self.assertEqual(qt_model.column_values(0), ['Apple'])
+        qt_model.close()
+
+    def test_not_a_snapshot(self):
+        '''
+        スナップショットでないファイルを開くと、SnapshotExceptionが送出される。
+        '''
+        with open(self.file_name, 'wb') as snapshot_file:
+            snapshot_file.write(b'PK' * 100)
+
+        with self.assertRaises(SnapshotException):
+            SnapshotTableModel(self.file_name)
+        self.assertIsNone(read_snapshot_stamp(self.file_name))
+
+if __name__ == '__main__':
+    unittest.main()
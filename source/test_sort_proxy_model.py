@@ -0,0 +1,112 @@
+'''
+sort_proxy_model.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import unittest
+import model
+from columnar_model import ColumnarTableModel
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QStandardItemModel
+from relation_proxy_model import RelationProxyModel
+from sort_proxy_model import SortProxyModel, sort_key
+
+class TestSortKey(unittest.TestCase):
+
+    '''
+    型の違う値どうしを比べるためのソートキーをチェックします。
+    '''
+
+    def test_sort_key(self):
+        '''
+        数値と数値として読める文字列は数値として、それ以外は文字列として並び、空の値は最後になる。
+        '''
+        values = ['10', None, 'りんご', 9, '', '2.5', 'Apple']
+        self.assertEqual(
+            sorted(values, key=sort_key), ['2.5', 9, '10', 'Apple', 'りんご', None, '']
+        )
+
+class TestSortProxyModel(unittest.TestCase):
+
+    '''
+    全商品一覧と結合した購入済み商品一覧の並べ替えをチェックします。
+    '''
+
+    def setUp(self):
+        items = ColumnarTableModel()
+        items.set_rows(['商品番号', '商品名', '初期価格'], [
+            ('22072', '衣装ケース08', 200),
+            ('22024', 'マグカップ01', 300),
+            ('22001', '絵本', 50),
+        ])
+        catalog = model.ItemCatalog(items, 0, 1, 2)
+        self.items = items
+        self.cart = QStandardItemModel()
+        self.cart.setHorizontalHeaderLabels(['顧客番号', '商品番号'])
+        self.joined = RelationProxyModel(self.cart, 1, items, 0)
+        self.wrapper = model.PurchasedItemModelWrapper(self.joined, 0, 1, catalog=catalog)
+        self.wrapper.add_items([('10', '22072'), ('9', '22024'), ('10', '22001'), ('2', '22072')])
+        self.proxy = SortProxyModel(self.joined)
+
+    def read_column(self, column):
+        '''
+        プロキシモデルのcolumn列目の値をリストにして返します。
+        '''
+        return [
+            self.proxy.data(self.proxy.index(row, column)) for row in range(self.proxy.rowCount())
+        ]
+
+    def test_sort(self):
+        '''
+        指定した列の値の順に並び、同じ値の行は元の順に並ぶ。列が負の場合は元の順に戻る。
+        '''
+        self.assertEqual(self.read_column(0), ['10', '9', '10', '2'])
+
+        self.proxy.sort(0)
+        self.assertEqual(self.read_column(0), ['2', '9', '10', '10'])
+        self.assertEqual(self.read_column(1), ['22072', '22024', '22072', '22001'])
+
+        self.proxy.sort(4, Qt.DescendingOrder)
+        self.assertEqual(self.read_column(4), ['300', '200', '200', '50'])
+        self.assertEqual(self.read_column(0), ['9', '10', '2', '10'])
+        self.assertEqual(self.proxy.headerData(0, Qt.Vertical), 2)
+        self.assertEqual(self.proxy.mapFromSource(self.joined.index(3, 0)).row(), 2)
+
+        self.proxy.sort(-1)
+        self.assertEqual(self.read_column(0), ['10', '9', '10', '2'])
+
+    def test_append_keeps_order(self):
+        '''
+        並べ替えた後に追加した行は、全体を並べ直さずに並び順の中の位置に挿入される。
+        '''
+        self.proxy.sort(4)
+        inserted = []
+        self.proxy.rowsInserted.connect(lambda parent, first, last: inserted.append(first))
+        resets = []
+        self.proxy.modelReset.connect(lambda: resets.append(True))
+
+        self.wrapper.add_items([('5', '22024'), ('6', '22001')])
+
+        self.assertEqual(self.read_column(4), ['50', '50', '200', '200', '300', '300'])
+        self.assertEqual(self.read_column(0), ['10', '6', '10', '2', '9', '5'])
+        self.assertEqual(resets, [])
+        self.assertEqual(len(inserted), 2)
+
+    def test_data_changed_moves_row(self):
+        '''
+        並べ替えている列の値が変わった行は、新しい位置に移される。
+        '''
+        self.proxy.sort(0, Qt.DescendingOrder)
+        self.assertEqual(self.read_column(0), ['10', '10', '9', '2'])
+
+        self.cart.setData(self.cart.index(3, 0), '11')
+        self.assertEqual(self.read_column(0), ['11', '10', '10', '9'])
+
+        # 結合先の値段が変わった場合も、値段で並べ替えていれば移される
+        self.proxy.sort(4)
+        self.items.setData(self.items.index(2, 2), 1000)
+        self.assertEqual(self.read_column(4), ['200', '200', '300', '1000'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+'''
+sqlite_model.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import sqlite3
+import unittest
+import sqlite_model
+from columnar_model import TYPED_VALUE_ROLE
+from sqlite_model import SqliteModelException, SqliteTableModel, create_table
+from PyQt5.QtCore import Qt
+
+class TestSqliteTableModel(unittest.TestCase):
+
+    '''
+    SqliteTableModelがテーブルの内容を正しく表示・変更するかチェックします。
+    '''
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        create_table(
+            self.connection,
+            'items',
+            ['商品番号', '商品名', '初期価格'],
+            [['22072', '22024'], ['衣装ケース08', 'マグカップ01'], [200, None]],
+            2
+        )
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_data(self):
+        '''
+        DisplayRoleでは文字列を、TYPED_VALUE_ROLEでは保存された型のままの値を返す。
+        '''
+        qt_model = SqliteTableModel(self.connection, 'items')
+
+        self.assertEqual((qt_model.rowCount(), qt_model.columnCount()), (2, 3))
+        self.assertEqual(qt_model.headerData(1, Qt.Horizontal), '商品名')
+        self.assertEqual(qt_model.data(qt_model.index(1, 1)), 'マグカップ01')
+        self.assertEqual(qt_model.data(qt_model.index(0, 2)), '200')
+        self.assertEqual(qt_model.data(qt_model.index(0, 2), TYPED_VALUE_ROLE), 200)
+        self.assertIsNone(qt_model.data(qt_model.index(1, 2)))
+        self.assertEqual(qt_model.column_values(0), ['22072', '22024'])
+
+    def test_read_by_page(self):
+        '''
+        行はページ単位で読み込まれ、キャッシュされるページの数には上限がある。
+        '''
+        number_of_rows = sqlite_model.PAGE_SIZE * (sqlite_model.MAX_CACHED_PAGES + 2)
+        create_table(self.connection, 'sales', ['番号'], [list(range(number_of_rows))], number_of_rows)
+        qt_model = SqliteTableModel(self.connection, 'sales')
+
+        for row in range(0, number_of_rows, sqlite_model.PAGE_SIZE):
+            self.assertEqual(qt_model.data(qt_model.index(row, 0), Qt.EditRole), row)
+
+        self.assertEqual(qt_model.data(qt_model.index(number_of_rows - 1, 0)), str(number_of_rows - 1))
+        self.assertEqual(len(qt_model.pages), sqlite_model.MAX_CACHED_PAGES)
+
+    def test_append_row_and_set_data(self):
+        '''
+        append_row()とsetData()はその場でテーブルに書き込まれ、シグナルが放出される。
+        '''
+        qt_model = SqliteTableModel(self.connection, 'items')
+        inserted = []
+        changed = []
+        qt_model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        qt_model.dataChanged.connect(lambda topleft, bottomright, roles: changed.append(topleft.row()))
+
+        qt_model.data(qt_model.index(0, 0))
+        self.assertEqual(qt_model.append_row(['22009', 'ハンガー']), 2)
+        qt_model.setData(qt_model.index(0, 2), 250)
+
+        self.assertEqual(inserted, [(2, 2)])
+        self.assertEqual(changed, [0])
+        self.assertEqual(qt_model.data(qt_model.index(2, 1)), 'ハンガー')
+        self.assertIsNone(qt_model.data(qt_model.index(2, 2)))
+        self.assertEqual(qt_model.data(qt_model.index(0, 2)), '250')
+
+        # 別に開いたモデルからも同じ内容が見える
+        other_model = SqliteTableModel(self.connection, 'items')
+        self.assertEqual(other_model.rowCount(), 3)
+        self.assertEqual(other_model.data(other_model.index(0, 2)), '250')
+
+    def test_append_rows(self):
+        '''
+        append_rows()は複数の行を1回の rowsInserted シグナルで追加する。
+        '''
+        qt_model = SqliteTableModel(self.connection, 'items')
+        inserted = []
+        qt_model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+        self.assertEqual(qt_model.append_rows([['22009', 'ハンガー'], ['22010', 'タオル', 30]]), 2)
+
+        self.assertEqual(inserted, [(2, 3)])
+        self.assertEqual(qt_model.column_values(1), ['衣装ケース08', 'マグカップ01', 'ハンガー', 'タオル'])
+
+    def test_missing_table(self):
+        '''
+        create_table()で作られていないテーブルを開くとSqliteModelExceptionを送出する。
+        '''
+        with self.assertRaises(SqliteModelException):
+            SqliteTableModel(self.connection, 'sales')
+
+
+if __name__ == '__main__':
+    unittest.main()
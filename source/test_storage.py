@@ -0,0 +1,489 @@
+'''
+storage.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import gc
+import os
+import tempfile
+import threading
+import unittest
+import weakref
+import model
+from journal import SalesJournal
+from openpyxl import Workbook, load_workbook
+from PyQt5.QtCore import Qt
+from sheet_cache import hash_file
+from snapshot_model import SnapshotTableModel, read_snapshot_stamp
+from storage import (
+    ExcelStorage, SqliteStorage, Storage, StorageException, open_storage, partition_file_name
+)
+
+class TestStorage(unittest.TestCase):
+
+    '''
+    保存先の基底クラスをチェックします。
+    '''
+
+    def test_incomplete_storage_cannot_be_created(self):
+        '''
+        抽象メソッドを実装していない保存先は、作ろうとした時点で例外が送出される。
+        '''
+        class IncompleteStorage(Storage):
+            def load_all_item_model(self):
+                return None
+
+            def load_purchased_item_model(self, column_for_customer_id, column_for_item_id):
+                return None
+
+        with self.assertRaises(TypeError):
+            IncompleteStorage()
+        with self.assertRaises(TypeError):
+            Storage()
+
+class TestExcelStorage(unittest.TestCase):
+
+    '''
+    ExcelStorageによる全商品一覧のスナップショットの利用をチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.xlsx_file_name = os.path.join(self.temp_dir.name, '会計用.xlsx')
+        self.snapshot_file_name = os.path.join(self.temp_dir.name, '会計用.snapshot')
+
+        px_workbook = Workbook()
+        px_worksheet = px_workbook.active
+        px_worksheet.title = 'raw'
+        px_worksheet.append(['商品番号', '商品名', '初期価格'])
+        px_worksheet.append([22072, '衣装ケース08', 200])
+        px_workbook.create_sheet('会計録').append(['会計番号', '品目', '値段', '運び'])
+        px_workbook.save(self.xlsx_file_name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_storage(self):
+        return ExcelStorage(
+            self.xlsx_file_name, 'raw', '会計録', item_snapshot_file_name=self.snapshot_file_name
+        )
+
+    def test_item_snapshot(self):
+        '''
+        全商品一覧はスナップショットから読み込まれ、Excelファイルが変わると作り直される。
+        '''
+        manager = model.Manager(
+            self.xlsx_file_name, 'raw', '会計録', storage=self.open_storage()
+        )
+        manager.init_all_item_model()
+        self.assertIsInstance(manager.get_all_item_model(), SnapshotTableModel)
+        self.assertEqual(manager.lookup_item('22072'), ('衣装ケース08', 200))
+        manager.journal.close()
+        manager.get_all_item_model().close()
+
+        px_workbook = load_workbook(self.xlsx_file_name)
+        px_workbook['raw'].append([22024, 'マグカップ01', 300])
+        px_workbook.save(self.xlsx_file_name)
+
+        item_model = self.open_storage().load_all_item_model()
+        self.assertEqual(item_model.column_values(0), ['22072', '22024'])
+        item_model.close()
+
+    def test_item_snapshot_survives_sales(self):
+        '''
+        購入済み商品一覧を同じファイルに保存しても、スナップショットは作り直されずに次の起動で使われる。
+        '''
+        manager = model.Manager(
+            self.xlsx_file_name, 'raw', '会計録', storage=self.open_storage()
+        )
+        self.addCleanup(manager.journal.close)
+        manager.init_all_item_model()
+        manager.init_purchased_item_model(0, 1)
+        snapshot_inode = os.stat(self.snapshot_file_name).st_ino
+        manager.get_purchased_item_model().add_item('1', '22072')
+        manager.get_all_item_model().close()
+
+        stat = os.stat(self.xlsx_file_name)
+        self.assertEqual(
+            read_snapshot_stamp(self.snapshot_file_name),
+            (stat.st_size, stat.st_mtime_ns, hash_file(self.xlsx_file_name))
+        )
+        item_model = self.open_storage().load_all_item_model()
+        self.assertEqual(os.stat(self.snapshot_file_name).st_ino, snapshot_inode)
+        self.assertEqual(item_model.column_values(0), ['22072'])
+        item_model.close()
+
+    def test_item_snapshot_is_not_restamped_after_external_edit(self):
+        '''
+        ほかのプログラムで全商品一覧を編集した後に保存した場合は、次の起動でスナップショットが作り直される。
+        '''
+        manager = model.Manager(
+            self.xlsx_file_name, 'raw', '会計録', storage=self.open_storage()
+        )
+        self.addCleanup(manager.journal.close)
+        manager.init_all_item_model()
+        manager.init_purchased_item_model(0, 1)
+
+        px_workbook = load_workbook(self.xlsx_file_name)
+        px_workbook['raw'].append([22024, 'マグカップ01', 300])
+        px_workbook.save(self.xlsx_file_name)
+        manager.get_purchased_item_model().add_item('1', '22072')
+        manager.get_all_item_model().close()
+
+        item_model = self.open_storage().load_all_item_model()
+        self.assertEqual(item_model.column_values(0), ['22072', '22024'])
+        item_model.close()
+
+class TestExcelStoragePartitions(unittest.TestCase):
+
+    '''
+    日付などの区分ごとのファイルに分けた購入済み商品一覧の読み書きをチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.xlsx_file_name = os.path.join(self.temp_dir.name, '会計用.xlsx')
+
+        px_workbook = Workbook()
+        px_worksheet = px_workbook.active
+        px_worksheet.title = 'raw'
+        px_worksheet.append(['商品番号', '商品名', '初期価格'])
+        px_worksheet.append([22072, '衣装ケース08', 200])
+        px_worksheet.append([22024, 'マグカップ01', 300])
+        px_workbook.create_sheet('会計録').append(['会計番号', '品目', '値段', '運び'])
+        px_workbook.save(self.xlsx_file_name)
+
+        for partition, rows in (('2026-10-16', [[1, 22072], [1, 22024]]),
+                                ('2026-10-15', [[7, 22024]])):
+            px_workbook = Workbook()
+            px_worksheet = px_workbook.active
+            px_worksheet.title = '会計録'
+            px_worksheet.append(['会計番号', '品目'])
+            for row in rows:
+                px_worksheet.append(row)
+            px_workbook.save(partition_file_name(self.xlsx_file_name, partition))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_manager(self, partition):
+        manager = model.Manager(self.xlsx_file_name, 'raw', '会計録', partition=partition)
+        self.addCleanup(manager.journal.close)
+        manager.init_all_item_model()
+        return manager
+
+    def test_new_partition(self):
+        '''
+        まだファイルのない区分は空の一覧から始まり、最初の追加で最も新しい区分と同じヘッダのファイルが作られる。
+        ほかの区分のファイルと、全商品一覧のファイルは変わらない。
+        '''
+        stat = os.stat(self.xlsx_file_name)
+        older_stat = os.stat(partition_file_name(self.xlsx_file_name, '2026-10-16'))
+
+        manager = self.open_manager('2026-10-17')
+        manager.init_purchased_item_model(0, 1)
+        self.assertEqual(manager.purchased_item_source_model.rowCount(), 0)
+        self.assertTrue(manager.journal.file_name.endswith('会計用.2026-10-17.journal'))
+        self.assertEqual(manager.list_partitions(), ['2026-10-15', '2026-10-16'])
+
+        manager.get_purchased_item_model().add_item('3', '22072')
+
+        px_workbook = load_workbook(partition_file_name(self.xlsx_file_name, '2026-10-17'))
+        self.assertEqual(px_workbook.sheetnames, ['会計録'])
+        self.assertEqual(
+            [[cell.value for cell in row] for row in px_workbook['会計録'].iter_rows()],
+            [['会計番号', '品目'], [3, 22072]]
+        )
+        self.assertEqual(os.stat(self.xlsx_file_name).st_mtime_ns, stat.st_mtime_ns)
+        self.assertEqual(
+            os.stat(partition_file_name(self.xlsx_file_name, '2026-10-16')).st_mtime_ns,
+            older_stat.st_mtime_ns
+        )
+        self.assertEqual(
+            manager.list_partitions(), ['2026-10-15', '2026-10-16', '2026-10-17']
+        )
+
+    def test_closed_journals_are_recovered(self):
+        '''
+        ほかの区分のジャーナルに残っている保存されていない追加は、その区分のファイルに書き戻され、
+        ジャーナルは削除される。
+        '''
+        manager = self.open_manager('2026-10-15')
+        manager.init_purchased_item_model(0, 1)
+        manager.get_purchased_item_model().add_item('8', '22072')
+        manager.journal.close()
+
+        # 2026-10-16 は2行目まで保存済み、2026-10-14 はファイルを作る前に異常終了していた
+        for partition, entries in (('2026-10-16', [(1, '1', '22024'), (2, '1', '22072')]),
+                                   ('2026-10-14', [(0, '5', '22024')])):
+            unsaved_journal = SalesJournal(
+                os.path.join(self.temp_dir.name, '会計用.{}.journal'.format(partition))
+            )
+            unsaved_journal.extend(entries)
+            unsaved_journal.close()
+
+        manager = self.open_manager('2026-10-17')
+        manager.init_purchased_item_model(0, 1, column_for_sale_price=2)
+        self.assertEqual(manager.recovered_partitions, {'2026-10-14': 1, '2026-10-16': 1})
+        self.assertEqual(manager.recovery_errors, {})
+
+        for partition, rows in (('2026-10-16', [(1, 22072, None), (1, 22024, None), (1, 22072, 200)]),
+                                ('2026-10-14', [(5, 22024, 300)])):
+            px_worksheet = load_workbook(partition_file_name(self.xlsx_file_name, partition))['会計録']
+            self.assertEqual(list(px_worksheet.iter_rows(min_row=2, values_only=True)), rows)
+
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.temp_dir.name) if name.endswith('.journal')),
+            ['会計用.2026-10-17.journal']
+        )
+        self.assertEqual(manager.list_partitions(), ['2026-10-14', '2026-10-15', '2026-10-16'])
+
+    def test_unrecoverable_journal_is_kept(self):
+        '''
+        書き戻せなかった区分のジャーナルは、次の起動で書き戻せるよう残り、例外が保持される。
+        '''
+        with open(partition_file_name(self.xlsx_file_name, '2026-10-14'), 'wb') as broken_file:
+            broken_file.write(b'broken')
+        journal_file_name = os.path.join(self.temp_dir.name, '会計用.2026-10-14.journal')
+        unsaved_journal = SalesJournal(journal_file_name)
+        unsaved_journal.append(2, '1', '22072')
+        unsaved_journal.close()
+
+        manager = self.open_manager('2026-10-17')
+        manager.init_purchased_item_model(0, 1)
+        self.assertEqual(manager.recovered_partitions, {})
+        self.assertEqual(list(manager.recovery_errors), ['2026-10-14'])
+        self.assertEqual(SalesJournal(journal_file_name).read(), [(2, '1', '22072')])
+
+    def test_existing_partition(self):
+        '''
+        ファイルのある区分は読み込まれ、追加はそのファイルに書き戻される。
+        '''
+        manager = self.open_manager('2026-10-16')
+        manager.init_purchased_item_model(0, 1)
+        manager.get_purchased_item_model().add_item('2', '22024')
+
+        px_worksheet = load_workbook(partition_file_name(self.xlsx_file_name, '2026-10-16'))['会計録']
+        self.assertEqual(
+            [[cell.value for cell in row] for row in px_worksheet.iter_rows(min_row=2)],
+            [[1, 22072], [1, 22024], [2, 22024]]
+        )
+
+    def test_older_partitions_are_loaded_lazily(self):
+        '''
+        現在の区分だけが読み込まれ、ほかの区分は求められたときに読み取り専用で読み込まれる。
+        '''
+        manager = self.open_manager('2026-10-16')
+        manager.init_purchased_item_model(0, 1)
+        self.assertEqual(manager.purchased_item_source_model.rowCount(), 2)
+        self.assertEqual(manager.partition_models, {})
+
+        older_model = manager.get_partition_model('2026-10-15')
+        self.assertEqual(older_model.column_values(0), ['7'])
+        self.assertIs(manager.get_partition_model('2026-10-15'), older_model)
+        self.assertFalse(older_model.setData(older_model.index(0, 0), '8'))
+        self.assertFalse(older_model.flags(older_model.index(0, 0)) & Qt.ItemIsEditable)
+
+        self.assertEqual(manager.get_partition_totals('2026-10-15').total_for_customer('7'), 300)
+
+        with self.assertRaises(StorageException):
+            manager.get_partition_model('2026-10-14')
+
+        # 過去の区分はキャッシュに入らない
+        self.assertEqual(
+            [key[0] for key in manager.storage.excel_handler.sheet_cache.sheets], ['raw']
+        )
+
+        model_reference = weakref.ref(older_model)
+        totals_reference = weakref.ref(manager.get_partition_totals('2026-10-15'))
+        del older_model
+        manager.release_partitions()
+        gc.collect()
+        self.assertEqual(manager.partition_models, {})
+        self.assertIsNone(model_reference())
+        self.assertIsNone(totals_reference())
+
+    def test_load_in_background(self):
+        '''
+        別のスレッドで読み込む場合も、まだシートのない区分は空の一覧から始まる。
+        '''
+        manager = model.Manager(self.xlsx_file_name, 'raw', '会計録', partition='2026-10-17')
+        self.addCleanup(manager.journal.close)
+        manager.init_models_in_background(0, 1)
+        self.assertFalse(manager.get_purchased_item_model().loading)
+        self.assertEqual(manager.lookup_item('22024'), ('マグカップ01', 300))
+        self.assertEqual(manager.purchased_item_source_model.rowCount(), 0)
+        self.assertEqual(
+            manager.purchased_item_source_model.headerData(1, Qt.Horizontal), '品目'
+        )
+
+    def test_only_dated_files_are_partitions(self):
+        '''
+        区分は'YYYY-MM-DD'形式のものだけで、ファイルの複製などは区分とみなされない。それ以外の区分は指定できない。
+        '''
+        for name in ('会計用 コピー.xlsx', '会計用 (1).xlsx', '会計用.2026-10-16 (1).xlsx',
+                     '会計用.2026-13-01.xlsx', '会計用.2026-1-7.xlsx'):
+            Workbook().save(os.path.join(self.temp_dir.name, name))
+
+        manager = self.open_manager('2026-10-17')
+        self.assertEqual(manager.list_partitions(), ['2026-10-15', '2026-10-16'])
+        with self.assertRaises(StorageException):
+            manager.get_partition_model('2026-10-16 (1)')
+
+        for partition in ('コピー', '2026-10-17 (1)', '2026-1-7', '../2026-10-17'):
+            with self.assertRaises(StorageException):
+                model.Manager(self.xlsx_file_name, 'raw', '会計録', partition=partition)
+
+    def test_sqlite_storage_is_not_partitioned(self):
+        '''
+        SQLiteのデータベースに区分を指定すると例外が送出される。
+        '''
+        with self.assertRaises(StorageException):
+            open_storage(
+                os.path.join(self.temp_dir.name, '会計用.sqlite3'), 'raw', '会計録',
+                partition='2026-10-17'
+            )
+
+class TestSqliteStorage(unittest.TestCase):
+
+    '''
+    SqliteStorageとExcelファイルの間の読み書き、Managerからの利用をチェックします。
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.xlsx_file_name = os.path.join(self.temp_dir.name, '会計用.xlsx')
+        self.db_file_name = os.path.join(self.temp_dir.name, '会計用.sqlite3')
+
+        px_workbook = Workbook()
+        px_worksheet = px_workbook.active
+        px_worksheet.title = 'raw'
+        px_worksheet.append(['商品番号', '商品名', '初期価格'])
+        px_worksheet.append([22072, '衣装ケース08', 200])
+        px_worksheet.append([22024, 'マグカップ01', 300])
+        px_worksheet = px_workbook.create_sheet('会計録')
+        px_worksheet.append(['会計番号', '品目', '値段', '運び'])
+        px_worksheet.append(['1', '22024'])
+        px_workbook.save(self.xlsx_file_name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_open_storage(self):
+        '''
+        open_storage()はファイル名の拡張子から保存先を選ぶ。
+        '''
+        sqlite_storage = open_storage(self.db_file_name, 'raw', '会計録')
+        self.assertIsInstance(sqlite_storage, SqliteStorage)
+        sqlite_storage.close()
+
+        self.assertIsInstance(open_storage(self.xlsx_file_name, 'raw', '会計録'), ExcelStorage)
+
+    def test_manager_with_sqlite_storage(self):
+        '''
+        Managerは、Excelファイルから取り込んだデータベースを使って会計できる。
+        追加された商品はその場でデータベースに保存され、Excelファイルに書き出せる。
+        '''
+        sqlite_storage = SqliteStorage(self.db_file_name)
+        sqlite_storage.import_workbook(self.xlsx_file_name, 'raw', '会計録')
+
+        manager = model.Manager(self.db_file_name, 'raw', '会計録', storage=sqlite_storage)
+        manager.init_all_item_model()
+        manager.init_purchased_item_model(0, 1)
+        self.assertIsNone(manager.journal)
+
+        cart = manager.get_purchased_item_model().qt_model
+        self.assertEqual(cart.data(cart.index(0, 5)), 'マグカップ01')
+
+        manager.get_purchased_item_model().add_item('2', '22072')
+        self.assertEqual(cart.rowCount(), 2)
+        self.assertEqual(cart.data(cart.index(1, 5)), '衣装ケース08')
+        sqlite_storage.close()
+
+        # 開き直しても追加は残っている
+        sqlite_storage = SqliteStorage(self.db_file_name)
+        sqlite_storage.export_workbook(self.xlsx_file_name, 'raw', '会計録')
+        sqlite_storage.close()
+
+        px_workbook = load_workbook(self.xlsx_file_name)
+        self.assertEqual(
+            [[cell.value for cell in row] for row in px_workbook['会計録'].iter_rows()],
+            [['会計番号', '品目', '値段', '運び'], ['1', '22024', None, None], ['2', '22072', None, None]]
+        )
+        self.assertEqual(px_workbook['raw'].cell(row=3, column=3).value, 300)
+
+    def test_registers_share_ledger(self):
+        '''
+        同じデータベースを開いた2つのレジのうち、一方が追加した商品は、
+        もう一方のpoll()で rowsInserted シグナルとともに取り込まれる。
+        '''
+        sqlite_storage = SqliteStorage(self.db_file_name)
+        sqlite_storage.import_workbook(self.xlsx_file_name, 'raw', '会計録')
+        sqlite_storage.close()
+
+        registers = []
+        for _ in range(2):
+            manager = model.Manager(
+                self.db_file_name, 'raw', '会計録', storage=SqliteStorage(self.db_file_name)
+            )
+            manager.init_all_item_model()
+            manager.init_purchased_item_model(0, 1)
+            registers.append(manager)
+
+        inserted = []
+        cart = registers[1].get_purchased_item_model().qt_model
+        cart.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+        registers[0].get_purchased_item_model().add_item('2', '22072')
+        self.assertEqual(registers[1].purchased_item_source_model.poll(), 1)
+        self.assertEqual(inserted, [(1, 1)])
+        self.assertEqual(cart.data(cart.index(1, 5)), '衣装ケース08')
+
+        # 変更がなければ何も取り込まない
+        self.assertEqual(registers[1].purchased_item_source_model.poll(), 0)
+
+        # 自分の追加の前にほかのレジの追加があれば、それも一緒に取り込む
+        registers[0].get_purchased_item_model().add_item('3', '22024')
+        registers[1].get_purchased_item_model().add_item('4', '22072')
+        self.assertEqual(inserted, [(1, 1), (2, 3)])
+        self.assertEqual(
+            [cart.data(cart.index(row, 0)) for row in range(cart.rowCount())],
+            ['1', '2', '3', '4']
+        )
+
+        for manager in registers:
+            manager.storage.close()
+
+    def test_concurrent_inserts(self):
+        '''
+        複数のレジが同時に追加しても、すべての追加が別々の行として保存される。
+        '''
+        sqlite_storage = SqliteStorage(self.db_file_name)
+        sqlite_storage.import_workbook(self.xlsx_file_name, 'raw', '会計録')
+
+        def checkout(register):
+            register_storage = SqliteStorage(self.db_file_name, poll_interval=None)
+            cart = register_storage.load_purchased_item_model(0, 1)
+            for number in range(25):
+                cart.append_row([register, str(number)])
+            register_storage.close()
+
+        threads = [threading.Thread(target=checkout, args=(str(register),)) for register in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cart = sqlite_storage.load_purchased_item_model(0, 1)
+        rows = [(cart.data(cart.index(row, 0)), cart.data(cart.index(row, 1)))
+                for row in range(1, cart.rowCount())]
+        self.assertEqual(
+            sorted(rows),
+            sorted((str(register), str(number)) for register in range(4) for number in range(25))
+        )
+        sqlite_storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+'''
+totals.pyの機能をチェックするunit testです。
+'''
+
+# unit test については https://docs.python.jp/3/library/unittest.html
+
+import unittest
+import model
+from columnar_model import ColumnarTableModel
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from totals import SalesTotals, item_group, to_amount
+
+class TestSalesTotals(unittest.TestCase):
+
+    '''
+    SalesTotalsが購入済み商品一覧の変更に合わせて合計を更新するかチェックします。
+    '''
+
+    def setUp(self):
+        self.item_model = ColumnarTableModel()
+        self.item_model.set_rows(['商品番号', '商品名', '初期価格'], [
+            ('22072', '衣装ケース08', 200),
+            ('22024', 'マグカップ01', 300),
+            ('18022', 'テーブル09', 500),
+        ])
+        self.catalog = model.ItemCatalog(self.item_model, 0, 1, 2)
+
+        self.sale_model = QStandardItemModel()
+        self.sale_model.setHorizontalHeaderLabels(['会計番号', '品目'])
+        self.wrapper = model.PurchasedItemModelWrapper(self.sale_model, 0, 1, catalog=self.catalog)
+        self.wrapper.add_item('1', '22072')
+
+        self.totals = SalesTotals(self.sale_model, 0, 1, self.catalog)
+
+    def test_add_item(self):
+        '''
+        add_item()で追加された商品は、顧客ごと・商品ごと・グループごとの合計に足される。
+        '''
+        self.wrapper.add_item('1', '22024')
+        self.wrapper.add_item('2', '22072')
+        self.wrapper.add_item('2', '18022')
+
+        self.assertEqual(self.totals.total_for_customer('1'), 500)
+        self.assertEqual(self.totals.total_for_customer('2'), 700)
+        self.assertEqual(self.totals.total_for_customer('3'), 0)
+        self.assertEqual(self.totals.by_item.count('22072'), 2)
+        self.assertEqual(self.totals.by_group.total('22'), 700)
+        self.assertEqual(self.totals.by_group.total('18'), 500)
+
+        customers = self.totals.by_customer
+        self.assertEqual(
+            [[customers.data(customers.index(row, column)) for column in range(3)]
+             for row in range(customers.rowCount())],
+            [['1', '2', '500'], ['2', '2', '700']]
+        )
+
+    def test_edit_sale(self):
+        '''
+        購入済み商品の行が変更されると、古い値の分が差し引かれて新しい値の分が足される。
+        変わった合計の行についてだけ、1回のdataChangedシグナルが放出される。
+        '''
+        self.wrapper.add_item('2', '22024')
+        changed = []
+        self.totals.by_customer.dataChanged.connect(
+            lambda topleft, bottomright: changed.append(topleft.row())
+        )
+
+        self.sale_model.setItem(1, 1, QStandardItem('18022'))
+
+        self.assertEqual(self.totals.total_for_customer('1'), 200)
+        self.assertEqual(self.totals.total_for_customer('2'), 500)
+        self.assertEqual(self.totals.by_item.count('22024'), 0)
+        self.assertEqual(changed, [1])
+
+    def test_price_change(self):
+        '''
+        全商品一覧の値段が変わると、合計は計算し直される。
+        '''
+        self.item_model.setData(self.item_model.index(0, 2), 250)
+
+        self.assertEqual(self.totals.total_for_customer('1'), 250)
+
+    def test_rows_removed(self):
+        '''
+        購入済み商品の行が削除されると、合計は計算し直される。
+        '''
+        self.wrapper.add_item('2', '22024')
+        self.sale_model.removeRow(0)
+
+        self.assertEqual(self.totals.total_for_customer('1'), 0)
+        self.assertEqual(self.totals.total_for_customer('2'), 300)
+
+
+class TestHelpers(unittest.TestCase):
+
+    '''
+    集計に使う関数をチェックします。
+    '''
+
+    def test_item_group(self):
+        '''
+        item_group()は商品番号の上2桁を返す。
+        '''
+        self.assertEqual(item_group('22072'), '22')
+
+    def test_to_amount(self):
+        '''
+        to_amount()は数値をそのまま返し、数値として読めない値は0とする。
+        '''
+        self.assertEqual(to_amount(300), 300)
+        self.assertEqual(to_amount('300'), 300)
+        self.assertEqual(to_amount(None), 0)
+        self.assertEqual(to_amount('無料'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,352 @@
+'''
+購入済み商品一覧から、顧客・商品・グループごとの合計を集計するためのモジュールです。
+'''
+
+import instrumentation
+from columnar_model import TYPED_VALUE_ROLE
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+def item_group(item_id):
+    '''
+    商品番号の上2桁をグループとして返します。Excelファイルの「閲覧用データ」シートのグループと同じです。
+
+    e.g. item_group('22072') -> '22'
+    '''
+    return item_id[:2]
+
+def to_amount(value):
+    '''
+    値段のセルの値を金額（int型かfloat型）にします。数値として読めない値は0とみなします。
+    '''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+class TotalsTableModel(QAbstractTableModel):
+
+    '''
+    キー（顧客番号など）ごとの点数と合計金額を表示するモデルです。
+
+    行はキーが初めて現れた順に並び、キーの合計が変わるとその行だけのdataChangedシグナルが放出されます。
+
+    Parameters:
+    key_label -- str型 キーの列のヘッダ
+    parent -- QObject型 親オブジェクト（未指定の場合None）
+    '''
+
+    HEADER_LABELS = ('点数', '合計')
+
+    def __init__(self, key_label, parent=None):
+        super().__init__(parent)
+        self.key_label = key_label
+        self.keys = []
+        # {キー: 行} と {キー: [点数, 合計金額]} からなる辞書
+        self.key_rows = {}
+        self.totals = {}
+
+        # begin_reset()～end_reset() の間はシグナルを放出しない。
+        # begin_batch()～end_batch() の間は、変わった行を (最初の行, 最後の行) にまとめておく
+        self.resetting = False
+        self.batch_rows = None
+
+    def add(self, key, count, amount):
+        '''
+        keyの点数と合計金額にcountとamountを足します。取り消す場合は負の値を渡してください。
+        '''
+        total = self.totals.get(key)
+        if total is None:
+            row = len(self.keys)
+            if not self.resetting:
+                self.beginInsertRows(QModelIndex(), row, row)
+            self.keys.append(key)
+            self.key_rows[key] = row
+            self.totals[key] = [count, amount]
+            if not self.resetting:
+                self.endInsertRows()
+            return
+
+        total[0] += count
+        total[1] += amount
+        if self.resetting:
+            return
+
+        row = self.key_rows[key]
+        if self.batch_rows is None:
+            self.dataChanged.emit(self.index(row, 1), self.index(row, 2))
+        elif self.batch_rows:
+            self.batch_rows = (min(self.batch_rows[0], row), max(self.batch_rows[1], row))
+        else:
+            self.batch_rows = (row, row)
+
+    def begin_reset(self):
+        '''
+        すべての行を消去し、end_reset()までシグナルを放出せずに合計を足し直せるようにします。
+        '''
+        self.beginResetModel()
+        self.resetting = True
+        self.keys = []
+        self.key_rows = {}
+        self.totals = {}
+
+    def end_reset(self):
+        '''
+        begin_reset()からの足し直しを終え、modelResetシグナルを放出します。
+        '''
+        self.resetting = False
+        self.endResetModel()
+
+    def begin_batch(self):
+        '''
+        end_batch()まで、合計が変わった行の dataChanged シグナルをまとめます。
+        '''
+        self.batch_rows = ()
+
+    def end_batch(self):
+        '''
+        begin_batch()から合計が変わった行を、1回の dataChanged シグナルとして放出します。
+        '''
+        batch_rows = self.batch_rows
+        self.batch_rows = None
+        if batch_rows:
+            self.dataChanged.emit(self.index(batch_rows[0], 1), self.index(batch_rows[1], 2))
+
+    def total(self, key):
+        '''
+        keyの合計金額を返します。keyの行がない場合は0を返します。
+        '''
+        total = self.totals.get(key)
+        return 0 if total is None else total[1]
+
+    def count(self, key):
+        '''
+        keyの点数を返します。keyの行がない場合は0を返します。
+        '''
+        total = self.totals.get(key)
+        return 0 if total is None else total[0]
+
+    def rowCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.rowCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return len(self.keys)
+
+    def columnCount(self, parent=QModelIndex()):
+        '''
+        QAbstractItemModel.columnCount()の実装です。
+        '''
+        if parent.isValid():
+            return 0
+        return 1 + len(self.HEADER_LABELS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.data()の実装です。
+
+        DisplayRoleでは値を文字列にして返し、TYPED_VALUE_ROLEでは値をそのまま返します。
+        '''
+        if not index.isValid():
+            return None
+
+        key = self.keys[index.row()]
+        if index.column() == 0:
+            value = key
+        else:
+            value = self.totals[key][index.column() - 1]
+
+        if role == Qt.DisplayRole:
+            return str(value)
+        if role == TYPED_VALUE_ROLE:
+            return value
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        '''
+        QAbstractItemModel.headerData()の実装です。
+        '''
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ((self.key_label,) + self.HEADER_LABELS)[section]
+        return super().headerData(section, orientation, role)
+
+class SalesTotals:
+
+    '''
+    購入済み商品一覧のモデルを監視し、顧客ごと・商品ごと・グループごとの合計を更新し続けます。
+
+    購入済み商品が1行追加・変更されるたびに、その行の分だけ合計を増減させるため、
+    更新にかかる時間は一覧の長さによりません。合計はそれぞれTotalsTableModelとして表示できます。
+    値段はcatalogから引き、全商品一覧にない商品は0円として数えます。
+
+    Parameters:
+    qt_model -- QAbstractItemModel型 購入済み商品のモデル（RelationProxyModelで結合する前のもの）
+    column_for_customer_id -- int型 顧客番号を格納する列
+    column_for_item_id -- int型 商品番号を格納する列
+    catalog -- model.ItemCatalog型 値段を引く全商品一覧の索引
+    group_function -- 商品番号からグループを返す関数（未指定の場合item_group）
+    '''
+
+    def __init__(self, qt_model, column_for_customer_id, column_for_item_id, catalog,
+                 group_function=item_group):
+        self.qt_model = qt_model
+        self.column_for_customer_id = column_for_customer_id
+        self.column_for_item_id = column_for_item_id
+        self.catalog = catalog
+        self.group_function = group_function
+
+        self.by_customer = TotalsTableModel('顧客番号')
+        self.by_item = TotalsTableModel('商品番号')
+        self.by_group = TotalsTableModel('グループ')
+
+        # 行ごとに、合計に足した (顧客番号, 商品番号, 金額)。変更されたときに差し引くために使う
+        self.sales = []
+        self.refresh()
+
+        # close()で切断するための (シグナル, スロット) のリスト
+        self.connections = [
+            (self.qt_model.rowsInserted, self.on_rows_inserted),
+            (self.qt_model.dataChanged, self.on_data_changed),
+            (self.qt_model.rowsRemoved, instrumentation.counting_slot('rowsRemoved', self.refresh)),
+            (self.qt_model.rowsMoved, instrumentation.counting_slot('rowsMoved', self.refresh)),
+            (self.qt_model.modelReset, instrumentation.counting_slot('modelReset', self.refresh)),
+
+            # 値段が変わった場合は、すべての合計を計算し直す
+            (self.catalog.qt_model.dataChanged, self.on_item_data_changed),
+            (self.catalog.qt_model.rowsInserted, self.on_item_rows_inserted),
+            (
+                self.catalog.qt_model.modelReset,
+                instrumentation.counting_slot('全商品一覧のmodelReset', self.refresh)
+            ),
+        ]
+        for signal, slot in self.connections:
+            signal.connect(slot)
+
+    def close(self):
+        '''
+        購入済み商品一覧と全商品一覧のシグナルから切断し、以後は合計を更新しないようにします。
+
+        全商品一覧より先に不要になる合計（過去の区分の合計など）を手放すときに呼び出してください。
+        '''
+        for signal, slot in self.connections:
+            signal.disconnect(slot)
+        self.connections = []
+
+    def refresh(self, *args):
+        '''
+        すべての合計を計算し直します。行の構造が変わるシグナルにconnectされます。
+        '''
+        totals_models = (self.by_customer, self.by_item, self.by_group)
+        for totals_model in totals_models:
+            totals_model.begin_reset()
+
+        self.sales = []
+        for row in range(self.qt_model.rowCount()):
+            self.sales.append(self.read_sale(row))
+            self.apply(self.sales[row], 1)
+
+        for totals_model in totals_models:
+            totals_model.end_reset()
+
+    def on_rows_inserted(self, parent, first, last):
+        '''
+        qt_modelのrowsInsertedシグナルにconnectされます。追加された行の分だけ合計を増やします。
+        '''
+        if first != len(self.sales):
+            instrumentation.count_refresh('SalesTotals.refresh', 'rowsInserted')
+            self.refresh()
+            return
+
+        totals_models = (self.by_customer, self.by_item, self.by_group)
+        for totals_model in totals_models:
+            totals_model.begin_batch()
+
+        for row in range(first, last + 1):
+            self.sales.append(self.read_sale(row))
+            self.apply(self.sales[row], 1)
+
+        for totals_model in totals_models:
+            totals_model.end_batch()
+
+    def on_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        qt_modelのdataChangedシグナルにconnectされます。変更された行の古い値を差し引き、新しい値を足します。
+        '''
+        if not topleft.isValid() or not bottomright.isValid():
+            return
+
+        # 複数の行がまとめて変更された場合は、合計の表の dataChanged シグナルもまとめる
+        totals_models = (self.by_customer, self.by_item, self.by_group)
+        for totals_model in totals_models:
+            totals_model.begin_batch()
+
+        for row in range(topleft.row(), min(bottomright.row() + 1, len(self.sales))):
+            sale = self.read_sale(row)
+            if sale == self.sales[row]:
+                continue
+            self.apply(self.sales[row], -1)
+            self.sales[row] = sale
+            self.apply(sale, 1)
+
+        for totals_model in totals_models:
+            totals_model.end_batch()
+
+    def on_item_data_changed(self, topleft, bottomright, roles=()):
+        '''
+        全商品一覧のdataChangedシグナルにconnectされます。商品番号か値段が変わった場合は計算し直します。
+        '''
+        columns = (self.catalog.column_for_item_id, self.catalog.column_for_item_price)
+        if any(topleft.column() <= column <= bottomright.column() for column in columns):
+            instrumentation.count_refresh('SalesTotals.refresh', '全商品一覧のdataChanged')
+            self.refresh()
+
+    def on_item_rows_inserted(self, parent, first, last):
+        '''
+        全商品一覧のrowsInsertedシグナルにconnectされます。
+
+        追加された商品を0円として数えていた購入済み商品があるかもしれないため、購入済み商品がある場合は計算し直します。
+        全商品一覧を読み込み中で購入済み商品がまだない場合は、何もしません。
+        '''
+        if self.sales:
+            instrumentation.count_refresh('SalesTotals.refresh', '全商品一覧のrowsInserted')
+            self.refresh()
+
+    def read_sale(self, row):
+        '''
+        row行目の (顧客番号, 商品番号, 金額) を返します。
+        '''
+        customer_id = self.qt_model.data(self.qt_model.index(row, self.column_for_customer_id))
+        item_id = self.qt_model.data(self.qt_model.index(row, self.column_for_item_id))
+
+        item_row = self.catalog.find_row(item_id)
+        if item_row is None:
+            return (customer_id, item_id, 0)
+
+        catalog_model = self.catalog.qt_model
+        price = catalog_model.data(
+            catalog_model.index(item_row, self.catalog.column_for_item_price), TYPED_VALUE_ROLE
+        )
+        return (customer_id, item_id, to_amount(price))
+
+    def apply(self, sale, sign):
+        '''
+        1行分の (顧客番号, 商品番号, 金額) を合計に足します（sign=-1の場合は差し引きます）。
+
+        商品番号が空の行は数えません。顧客番号が空の場合は顧客ごとの合計にだけ数えません。
+        '''
+        customer_id, item_id, amount = sale
+        if not item_id:
+            return
+
+        if customer_id:
+            self.by_customer.add(customer_id, sign, sign * amount)
+        self.by_item.add(item_id, sign, sign * amount)
+        self.by_group.add(self.group_function(item_id), sign, sign * amount)
+
+    def total_for_customer(self, customer_id):
+        '''
+        顧客の合計金額を返します。
+        '''
+        return self.by_customer.total(customer_id)
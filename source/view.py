@@ -1,9 +1,15 @@
 import sys
-
-from PyQt5.QtWidgets import (QAbstractItemView, QApplication, QFrame, 
-    QGridLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QStyleFactory,
-    QTableView, QTreeView, QWidget)
-from PyQt5.QtGui import QIcon
+import time
+
+import instrumentation
+from PyQt5.QtWidgets import (QAbstractItemView, QApplication, QCheckBox, QFrame, 
+    QGridLayout, QHBoxLayout, QLabel, QLineEdit, QMessageBox, QPlainTextEdit, QPushButton,
+    QShortcut, QStyleFactory, QTableView, QTreeView, QVBoxLayout, QWidget)
+from PyQt5.QtCore import QEvent, Qt
+from PyQt5.QtGui import QFont, QIcon, QKeySequence
+from model import ModelException, UnknownItemException
+from scanner import CheckoutScanner
+from sort_proxy_model import SortProxyModel
 
 class AbstractWindow(QWidget):
 
@@ -30,15 +36,21 @@ class MainWindow(AbstractWindow):
     Parameters:
     items -- type: model.Items 全商品リスト
     cart  -- type: model.DataframeAsModel 購入済み商品リスト
+    totals -- type: totals.TotalsTableModel 顧客ごとの合計（未指定の場合None）
+    item_search -- type: search_index.ItemSearchProxyModel 全商品一覧を検索するモデル。
+                   指定した場合は検索欄を表示し、全商品一覧の代わりにこのモデルを表示する（未指定の場合None）
     '''
 
-    def __init__(self, items, cart):
+    def __init__(self, items, cart, totals=None, item_search=None):
         super().__init__()
         # super()についての参考：
         # http://www.lifewithpython.com/2014/01/python-super-function.html
         self.accounting_window = None
+        self.instrumentation_window = None
         self.items_model = items
         self.cart_model = cart
+        self.totals_model = totals
+        self.item_search_model = item_search
 
         self.setWindowTitle('Gomipy Accounting')
         self.setGeometry(100, 100, 500, 500)
@@ -58,12 +70,41 @@ class MainWindow(AbstractWindow):
         # wrapperの中に入れる
         wrapper.addWidget(button_start_accounting)
 
-        # 全商品一覧のリストを作る
-        items_list = QTreeView(self)
-        items_list.setModel(self.items_model)
-        # wrapperの中に入れる
-        wrapper.addWidget(items_list)
-
+        if self.item_search_model is None:
+            # 全商品一覧のリストを作る
+            items_list = QTreeView(self)
+            items_list.setModel(self.items_model)
+            # wrapperの中に入れる
+            wrapper.addWidget(items_list)
+        else:
+            # 検索欄と、検索結果の全商品一覧を縦に並べる
+            items_wrapper = QVBoxLayout()
+            wrapper.addLayout(items_wrapper)
+
+            # 検索欄。1文字入力するたびに絞り込む
+            self.item_search_input = QLineEdit(self)
+            self.item_search_input.setPlaceholderText('商品番号・商品名で検索')
+            self.item_search_input.setClearButtonEnabled(True)
+            self.item_search_input.textChanged.connect(self.item_search_model.set_query)
+            items_wrapper.addWidget(self.item_search_input)
+
+            # 検索結果の全商品一覧。QTreeViewは絞り込むたびに全行を配置し直すため、
+            # 表示されている行だけを問い合わせるQTableViewを使う
+            self.items_list = QTableView(self)
+            self.items_list.setModel(self.item_search_model)
+            self.items_list.verticalHeader().hide()
+            items_wrapper.addWidget(self.items_list)
+
+        # 顧客ごとの合計の表を作る
+        if self.totals_model is not None:
+            totals_list = QTableView(self)
+            totals_list.setModel(self.totals_model)
+            # wrapperの中に入れる
+            wrapper.addWidget(totals_list)
+
+        # Ctrl+Shift+D で計測結果のウィンドウを開く
+        self.instrumentation_shortcut = QShortcut(QKeySequence('Ctrl+Shift+D'), self)
+        self.instrumentation_shortcut.activated.connect(self.show_instrumentation_window)
 
         # ウィンドウを表示します。
         self.show()
@@ -74,6 +115,22 @@ class MainWindow(AbstractWindow):
         '''
         self.accounting_window = AccountingWindow(self.items_model, self.cart_model)
 
+    def show_load_error(self, exception):
+        '''
+        Excelファイルを読み込めなかったことを表示します。loader.ModelFeeder.failed シグナルにconnectされます。
+        '''
+        QMessageBox.critical(
+            self,
+            '読み込みエラー',
+            'Excelファイルを読み込めませんでした。会計はできません。\n\n{}'.format(exception)
+        )
+
+    def show_instrumentation_window(self):
+        '''
+        計測結果のウィンドウを開きます。
+        '''
+        self.instrumentation_window = InstrumentationWindow()
+
 class AccountingWindow(AbstractWindow):
 
     '''
@@ -93,6 +150,15 @@ class AccountingWindow(AbstractWindow):
         self.height = 300
         self.items_model = items
         self.cart_model = cart
+
+        # スキャナで読み取った文字列を処理するオブジェクト
+        self.scanner = CheckoutScanner(cart)
+        self.scanner.customer_changed.connect(self.on_scanned_customer_changed)
+        self.scanner.items_added.connect(self.on_scanned_items_added)
+        self.scanner.rejected.connect(self.on_scan_rejected)
+
+        # 追加したがまだ表示されていない商品の、読み取った時刻のリスト
+        self.scanned_at_not_shown = []
         self.init_ui()
 
     def init_ui(self):
@@ -147,35 +213,246 @@ class AccountingWindow(AbstractWindow):
         # GridLayout に入れます。
         self.item_request_wrapper.addWidget(self.item_request_id_search, 2, 1)
 
+        # 追加した商品、または追加できなかった理由を表示するラベル
+        self.item_request_status = QLabel(self)
+        # GridLayout に入れます。
+        self.item_request_wrapper.addWidget(self.item_request_status, 3, 0, 1, 2)
+
+        # 「スキャナで入力」チェックボックス。F2キーでも切り替えられる
+        self.scanner_mode_check = QCheckBox('スキャナで入力 (F2)', self)
+        self.scanner_mode_check.toggled.connect(self.set_scanner_mode)
+        self.item_request_wrapper.addWidget(self.scanner_mode_check, 4, 0, 1, 2)
+        self.scanner_mode_shortcut = QShortcut(QKeySequence('F2'), self)
+        self.scanner_mode_shortcut.activated.connect(self.scanner_mode_check.toggle)
+
+        # 「スキャン」ラベル
+        self.scan_label = QLabel(self)
+        self.scan_label.setText('スキャン')
+        self.item_request_wrapper.addWidget(self.scan_label, 5, 0)
+
+        # スキャナの入力欄。顧客番号、商品番号…の順に読み取り、空のままEnterで会計を終える
+        self.scan_input = QLineEdit(self)
+        self.scan_input.setPlaceholderText('顧客番号 → 商品番号… → 空のままEnter')
+        self.scan_input.returnPressed.connect(self.on_scan_return_pressed)
+        self.item_request_wrapper.addWidget(self.scan_input, 5, 1)
+
         # wrapper の左から2番目の箱に入れる予定のウィジェットを作ります。
-        # カートの中身をあらわす表
+        # カートの中身をあらわす表。列のヘッダをクリックすると、その列の値で並べ替えます。
+        self.cart_sort_model = SortProxyModel(self.cart_model.qt_model, self)
         self.right = QTableView(self)
-        self.right.setModel(self.cart_model.qt_model)
+        self.right.setModel(self.cart_sort_model)
+        # 最初はソースモデルの順に表示する
+        self.right.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.right.setSortingEnabled(True)
+        # 追加した行が表示されるまでの時間を測るため、表の描画を監視します。
+        self.right.viewport().installEventFilter(self)
         # wrapper の左から2番目の箱に入れます。
         self.wrapper.addWidget(self.right)
 
+        self.set_scanner_mode(False)
+
         # ウィンドウを表示します。
         self.show()
 
+    def set_scanner_mode(self, scanner_mode):
+        '''
+        スキャナで入力するかどうかを切り替えます。
+
+        スキャナで入力する場合は、商品番号の入力欄と追加ボタンの代わりにスキャナの入力欄を表示します。
+        顧客番号の入力欄に入力済みの顧客番号があれば、その顧客の会計として続けます。
+        '''
+        for widget in (self.item_request_id_label, self.item_request_id_input,
+                       self.item_request_id_search):
+            widget.setVisible(not scanner_mode)
+        for widget in (self.scan_label, self.scan_input):
+            widget.setVisible(scanner_mode)
+        self.customer_id_input.setReadOnly(scanner_mode)
+
+        if scanner_mode:
+            self.scanner.customer_id = self.customer_id_input.text().strip() or None
+            self.scan_input.setFocus()
+
+    def on_scan_return_pressed(self):
+        '''
+        スキャナの入力欄でEnterキーが押されたときに呼び出されます。
+
+        処理はイベントループの次の周回で行われるため、続けて読み取った文字列はすぐに入力欄で受け取れます。
+        '''
+        scanned_at = time.perf_counter()
+        code = self.scan_input.text()
+        self.scan_input.clear()
+        self.scanner.scan(code, scanned_at)
+
+    def on_scanned_customer_changed(self, customer_id):
+        '''
+        スキャナで顧客番号を読み取ったとき、または会計を終えたときに呼び出されます。
+        '''
+        self.customer_id_input.setText(customer_id)
+        if customer_id:
+            self.item_request_status.setText('顧客番号 {} の会計を始めました'.format(customer_id))
+        else:
+            self.item_request_status.setText('会計を終えました。次の顧客番号を読み取ってください')
+
+    def on_scanned_items_added(self, sales):
+        '''
+        スキャナで読み取った商品が購入済み商品一覧に追加されたときに呼び出されます。
+        '''
+        customer_id, item_id, item_name, item_price, scanned_at = sales[-1]
+        if item_name is not None:
+            self.item_request_status.setText('{}（{}円）を追加しました'.format(item_name, item_price))
+
+        # 追加した行（購入済み商品一覧の末尾の行）が見えるようにし、
+        # 次に表が描画されたときに読み取りからの時間を測る
+        self.scanned_at_not_shown.extend(sale[-1] for sale in sales)
+        cart_model = self.cart_model.qt_model
+        self.right.scrollTo(self.cart_sort_model.mapFromSource(
+            cart_model.index(cart_model.rowCount() - 1, 0)
+        ))
+        self.right.viewport().update()
+
+    def on_scan_rejected(self, code, reason):
+        '''
+        スキャナで読み取った商品を追加できなかったときに呼び出されます。
+        '''
+        self.item_request_status.setText(reason)
+
+    def eventFilter(self, watched, event):
+        '''
+        カートの表の描画を監視し、スキャナで読み取ってから追加した行が描画されるまでの時間を記録します。
+
+        時間は instrumentation に「スキャンから表示まで」として記録され、最後の時間は状態の表示に添えられます。
+        '''
+        if event.type() == QEvent.Paint and self.scanned_at_not_shown:
+            shown_at = time.perf_counter()
+            for scanned_at in self.scanned_at_not_shown:
+                instrumentation.record('スキャンから表示まで', shown_at - scanned_at)
+            latency = shown_at - self.scanned_at_not_shown[0]
+            self.scanned_at_not_shown = []
+            self.item_request_status.setText('{}（表示まで{:.0f}ms）'.format(
+                self.item_request_status.text(), latency * 1000
+            ))
+        return super().eventFilter(watched, event)
+
     def put_item_in_cart(self):
         '''
         購入済み商品一覧に追加します。
         '''
         customer_id = self.customer_id_input.text()
         item_id = self.item_request_id_input.text()
-        self.cart_model.add_item(customer_id, item_id)
 
+        # 全商品一覧にない商品番号はカートに入れない
+        try:
+            item = self.cart_model.add_item(customer_id, item_id)
+        except UnknownItemException:
+            self.item_request_status.setText('商品番号 {} は登録されていません'.format(item_id))
+            self.item_request_id_input.selectAll()
+            return
+        except ModelException as exception:
+            # 読み込み中など、いまは追加できない
+            self.item_request_status.setText(str(exception))
+            return
+
+        if item is not None:
+            item_name, item_price = item
+            self.item_request_status.setText('{}（{}円）を追加しました'.format(item_name, item_price))
+        self.item_request_id_input.clear()
+
+class InstrumentationWindow(AbstractWindow):
+
+    '''
+    計測結果（instrumentation.format_report()）を表示するデバッグ用のウィンドウです。
 
-def main(items, cart):
+    計測の有効・無効を切り替えたり、それまでの記録を消去したりできます。
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle('計測')
+        self.setGeometry(140, 140, 900, 500)
+        self.init_ui()
+
+    def init_ui(self):
+        '''
+        ウィンドウ内部にGUIウィジェットを配置します。
+        '''
+        wrapper = QVBoxLayout(self)
+
+        # 上段にボタンを並べる
+        buttons = QHBoxLayout()
+        wrapper.addLayout(buttons)
+
+        # 「計測する」チェックボックス
+        self.enabled_check = QCheckBox('計測する', self)
+        self.enabled_check.setChecked(instrumentation.enabled)
+        self.enabled_check.toggled.connect(self.on_enabled_toggled)
+        buttons.addWidget(self.enabled_check)
+
+        # 「更新」ボタン
+        self.refresh_button = QPushButton('更新', self)
+        self.refresh_button.clicked.connect(self.refresh_report)
+        buttons.addWidget(self.refresh_button)
+
+        # 「リセット」ボタン
+        self.reset_button = QPushButton('リセット', self)
+        self.reset_button.clicked.connect(self.on_reset)
+        buttons.addWidget(self.reset_button)
+        buttons.addStretch()
+
+        # 計測結果。列を揃えるため等幅のフォントで表示する
+        self.report_text = QPlainTextEdit(self)
+        self.report_text.setReadOnly(True)
+        self.report_text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.report_text.setFont(QFont('Monospace'))
+        wrapper.addWidget(self.report_text)
+
+        self.refresh_report()
+
+        # ウィンドウを表示します。
+        self.show()
+
+    def refresh_report(self):
+        '''
+        計測結果を表示し直します。
+        '''
+        self.report_text.setPlainText(instrumentation.format_report())
+
+    def on_enabled_toggled(self, checked):
+        '''
+        「計測する」チェックボックスが切り替えられたときに呼び出されます。
+        '''
+        if checked:
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+        self.refresh_report()
+
+    def on_reset(self):
+        '''
+        「リセット」ボタンが押されたときに呼び出されます。
+        '''
+        instrumentation.reset()
+        self.refresh_report()
+
+
+def main(items, cart, totals=None):
     '''
     GUI を起動します。
 
     Parameters:
     items -- type: model.Items 全商品リスト
     cart  -- type: model.DataframeAsModel 購入済み商品リスト
+    totals -- type: totals.TotalsTableModel 顧客ごとの合計（未指定の場合None）
     '''
 
-    app = QApplication(sys.argv)
-    main_window = MainWindow(items, cart)
+    app = create_application()
+    main_window = MainWindow(items, cart, totals)
     sys.exit(app.exec_())
 
+def create_application():
+    '''
+    QApplication を作ります。
+
+    モデルを別のスレッドで読み込む場合は、読み込みを始める前に作ってください。
+    '''
+    return QApplication(sys.argv)
+